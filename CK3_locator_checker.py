@@ -1,628 +1,4602 @@
-import csv
-import os
-import sys
-import re
-import shutil
-
-from PIL import Image
-
-
-def get_folder_path(prompt):
-    while True:
-        path = input(prompt)
-        if os.path.isdir(path):
-            definition_path = os.path.join(path, "map_data", "definition.csv")
-            if os.path.isfile(definition_path):
-                print(f"Found definition.csv at: {definition_path}")
-                return path
-            else:
-                print(
-                    f"Error: 'definition.csv' not found in {os.path.join(path, 'map_data')}"
-                )
-        else:
-            print("Error: Invalid directory. Please enter a valid path.")
-
-
-def get_folder_paths():
-    print("Enter the paths to the base game folder and the mod folder:")
-    base_game_folder = get_folder_path("Reference folder path (e.g. G:\Steam\steamapps\common\Crusader Kings III\game): ")
-    mod_folder = get_folder_path("Mod folder path: ")
-    return base_game_folder, mod_folder
-
-
-def should_ignore_line(parts):
-    # Ensure there are enough parts to prevent IndexError
-    if len(parts) < 5:
-        return True  # Skip malformed lines
-    province_name = parts[4]  # provinceName is the 5th value (index 4)
-    # Check if province_name contains 'river' or 'impassable' (case-insensitive)
-    if re.search(r"(river|impassable)", province_name, re.IGNORECASE):
-        return True
-    return False  # Do not exclude lines based on capital letters
-
-
-def read_definition_file(folder):
-    province_dict = {}
-    file_path = os.path.join(folder, "map_data", "definition.csv")
-    print(f"Reading file: {file_path}")
-    with open(file_path, "r", encoding="utf-8-sig") as file:
-        for line_num, line in enumerate(file, 1):
-            original_line = line.rstrip("\n")  # Keep the original line for storage
-            line_stripped = line.strip()
-            if not line_stripped or line_stripped.startswith("#"):
-                continue  # Skip empty lines and comments
-            parts = line_stripped.split(";")
-            if len(parts) < 6:
-                print(f"Warning: Skipping malformed line {line_num}: {line_stripped}")
-                continue  # Skip malformed lines
-            # Check if line should be ignored
-            if should_ignore_line(parts):
-                continue
-            province_id = parts[0]
-            province_dict[province_id] = original_line
-    print(f"Total provinces read from {file_path}: {len(province_dict)}")
-    return province_dict
-
-
-def compare_definitions(base_def, mod_def):
-    differing_lines = {}
-    all_province_ids = set(base_def.keys()) | set(mod_def.keys())
-    print(f"Total unique province IDs to compare: {len(all_province_ids)}")
-    for province_id in all_province_ids:
-        base_line = base_def.get(province_id)
-        mod_line = mod_def.get(province_id)
-        if base_line != mod_line:
-            # Use the mod line if available; otherwise, use the base line
-            if mod_line is not None:
-                differing_lines[province_id] = mod_line
-            elif base_line is not None:
-                differing_lines[province_id] = base_line
-    print(f"Total differences found: {len(differing_lines)}")
-    return differing_lines
-
-
-# 1) Script first compares definition.csv of base game and mod folder
-# and creates new_definition.csv containing only the mismatching lines.
-def compare_definition(base_game_folder, mod_folder):
-    base_definition = read_definition_file(base_game_folder)
-    mod_definition = read_definition_file(mod_folder)
-
-    differing_lines = compare_definitions(base_definition, mod_definition)
-
-    if not differing_lines:
-        print("No differences found between the definition.csv files.")
-    else:
-        output_file = "new_definition.csv"
-        with open(output_file, "w", encoding="utf-8") as f:
-            # Sort by ProvinceID for consistency
-            def sort_key(pid):
-                pid_clean = pid.lstrip("#")
-                return int(pid_clean) if pid_clean.isdigit() else pid_clean
-
-            sorted_ids = sorted(differing_lines.keys(), key=sort_key)
-            for province_id in sorted_ids:
-                f.write(differing_lines[province_id] + "\n")
-        print(f"Differences have been written to {output_file}")
-
-
-# Function to get the definition data for easy lookup
-def read_definition_csv(definition_path):
-    province_data = {}
-    with open(definition_path, "r") as file:
-        reader = csv.reader(file, delimiter=";")
-        for row in reader:
-            if len(row) < 5 or row[0].startswith("#"):
-                continue
-            province_id = row[0]
-            province_data[province_id] = row
-    return province_data
-
-
-# Function to read locator files and gather province IDs with coordinates
-def read_locator_file(locator_path, image_height):
-    province_info = {}
-    with open(locator_path, "r") as file:
-        current_id = None
-        for line in file:
-            line = line.strip()
-            if line.startswith("id="):
-                current_id = line.split("=")[1].strip()
-            elif line.startswith("position={") and current_id:
-                position_data = line.split("{")[1].split("}")[0].strip().split()
-                if len(position_data) == 3:
-                    x = int(float(position_data[0]))
-                    y = image_height - int(float(position_data[2]))
-                    province_info[current_id] = (x, y)
-                current_id = None
-    return province_info
-
-
-# Function to write data to output CSV
-def write_output_csv(output_path, province_data, province_info, locator_file_name):
-    with open(output_path, "a", newline="") as csvfile:
-        csv_writer = csv.writer(csvfile, delimiter=";")
-        csv_writer.writerow([f"Locator File: {locator_file_name}"])
-        csv_writer.writerow(["ProvinceID", "R", "G", "B", "X", "Y", "ProvinceName"])
-        for province_id, (x, y) in province_info.items():
-            if province_id in province_data:
-                csv_writer.writerow(
-                    province_data[province_id][:4]
-                    + [x, y]
-                    + [province_data[province_id][4]]
-                )
-        csv_writer.writerow([])  # Add an empty line for better readability
-
-
-# 2) Iterate through locator files both in base game and mod folder and
-# create big data files mapdata_base.csv and mapdata_modded.csv which
-# contain ProvinceID;R;G;B;X;Y;ProvinceName for every locator ID (sorted
-# for each file). the X Y coordinates are extracted from the ID and the
-# mathematical inversion for the Y-coordinate based on province.png
-# height applied. The R;G;B values are read directly from the province
-# map using these coordinates, since they do not always match the ones
-# provided in definition.csv file
-# Main script to read paths and process data
-def get_rgb(base_game_folder, mod_folder):
-    base_definition_path = os.path.join(base_game_folder, "map_data", "definition.csv")
-    mod_definition_path = os.path.join(mod_folder, "map_data", "definition.csv")
-    province_image_path = os.path.join(base_game_folder, "map_data", "provinces.png")
-
-    base_locator_files = [
-        "building_locators.txt",
-        "combat_locators.txt",
-        "other_stack_locators.txt",
-        "player_stack_locators.txt",
-        "siege_locators.txt",
-        "special_building_locators.txt",
-    ]
-
-    base_locator_folder = os.path.join(
-        base_game_folder, "gfx", "map", "map_object_data"
-    )
-    mod_locator_folder = os.path.join(mod_folder, "gfx", "map", "map_object_data")
-
-    # Read the definition CSVs
-    base_province_data = read_definition_csv(base_definition_path)
-    mod_province_data = read_definition_csv(mod_definition_path)
-
-    # Get the height of the provinces.png image
-    with Image.open(province_image_path) as img:
-        image_height = img.height
-
-    # Read locator files and gather province IDs with coordinates
-    base_province_info = {}
-    mod_province_info = {}
-
-    for locator_file in base_locator_files:
-        base_locator_path = os.path.join(base_locator_folder, locator_file)
-        mod_locator_path = os.path.join(mod_locator_folder, locator_file)
-
-        if os.path.exists(base_locator_path):
-            base_province_info[locator_file] = read_locator_file(
-                base_locator_path, image_height
-            )
-        if os.path.exists(mod_locator_path):
-            mod_province_info[locator_file] = read_locator_file(
-                mod_locator_path, image_height
-            )
-
-    # Create output folder if it doesn't exist
-    output_folder = "output"
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    # Write output CSVs
-    base_output_path = os.path.join(output_folder, "mapdata_base.csv")
-    mod_output_path = os.path.join(output_folder, "mapdata_modded.csv")
-
-    # Clear the output files if they already exist
-    open(base_output_path, "w").close()
-    open(mod_output_path, "w").close()
-
-    for locator_file, province_info in base_province_info.items():
-        write_output_csv(
-            base_output_path, base_province_data, province_info, locator_file
-        )
-    for locator_file, province_info in mod_province_info.items():
-        write_output_csv(
-            mod_output_path, mod_province_data, province_info, locator_file
-        )
-
-    print(f"Output files created in '{output_folder}' folder.")
-
-
-def get_province_ids(definition_file):
-    province_ids = set()
-    with open(definition_file, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            parts = line.split(";")
-            if parts:
-                province_id = parts[0].strip().lstrip("#")
-                if province_id.isdigit():
-                    province_ids.add(int(province_id))
-    return province_ids
-
-
-def create_updated_locator_files(
-    base_game_path, mod_folder_path, province_ids, locator_files
-):
-    # Create the output directory
-    output_dir = os.path.join(os.getcwd(), "updated_locators")
-    os.makedirs(output_dir, exist_ok=True)
-    print(f"Created output directory: {output_dir}")
-
-    base_locator_dir = os.path.join(base_game_path, "gfx", "map", "map_object_data")
-    mod_locator_dir = os.path.join(mod_folder_path, "gfx", "map", "map_object_data")
-
-    for locator_file in locator_files:
-        base_file_path = os.path.join(base_locator_dir, locator_file)
-        mod_file_path = os.path.join(mod_locator_dir, locator_file)
-        output_file_path = os.path.join(output_dir, locator_file)
-
-        # Copy the base game locator file to the output directory
-        if not os.path.isfile(base_file_path):
-            print(f"Base locator file not found: {base_file_path}")
-            continue
-        shutil.copy(base_file_path, output_file_path)
-        print(f"Copied {locator_file} to {output_file_path}")
-
-        # If the mod locator file doesn't exist, skip processing
-        if not os.path.isfile(mod_file_path):
-            print(f"Mod locator file not found: {mod_file_path}. Skipping.")
-            continue
-
-        # Read the mod locator file and extract the id blocks for the specified province IDs
-        mod_id_blocks = extract_id_blocks(mod_file_path, province_ids)
-
-        # Replace the corresponding id blocks in the output file
-        update_locator_file(output_file_path, mod_id_blocks)
-
-
-def extract_id_blocks(locator_file_path, province_ids):
-    id_blocks = {}
-    with open(locator_file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # Regular expression to match id blocks
-    id_block_pattern = re.compile(r"\{\s*id=(\d+)(.*?)\}", re.DOTALL)
-
-    for match in id_block_pattern.finditer(content):
-        id_num = int(match.group(1))
-        if id_num in province_ids:
-            block = match.group(0)
-            # Add " #Modded" after id=xxx line
-            modded_block = re.sub(r"(id=\d+)", r"\1 #Modded", block, count=1)
-            id_blocks[id_num] = modded_block
-    return id_blocks
-
-
-def update_locator_file(locator_file_path, mod_id_blocks):
-    with open(locator_file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # Function to replace id blocks in the content
-    def replace_id_block(match):
-        id_num = int(match.group(1))
-        if id_num in mod_id_blocks:
-            print(f"Updating id block {id_num}")
-            return mod_id_blocks[id_num]
-        else:
-            return match.group(0)
-
-    # Regular expression to match id blocks
-    id_block_pattern = re.compile(r"\{\s*id=(\d+)(.*?)\}", re.DOTALL)
-
-    # Replace id blocks
-    updated_content = id_block_pattern.sub(replace_id_block, content)
-
-    # Write the updated content back to the file
-    with open(locator_file_path, "w", encoding="utf-8") as f:
-        f.write(updated_content)
-    print(f"Updated locator file: {locator_file_path}")
-
-
-# 3) Copy all locator files from base folder and replace/add locator IDs
-# from mod file, based on the differences from step 1)
-def locator_files(base_game_path, mod_folder_path):
-    # Locator files to process
-    locator_files = [
-        "building_locators.txt",
-        "combat_locators.txt",
-        "other_stack_locators.txt",
-        "player_stack_locators.txt",
-        "siege_locators.txt",
-        "special_building_locators.txt",
-    ]
-
-    # Get province IDs from new_definition.csv
-    definition_file = os.path.join(os.getcwd(), "new_definition.csv")
-    if not os.path.isfile(definition_file):
-        print("'new_definition.csv' not found in the current directory.")
-        return
-
-    province_ids = get_province_ids(definition_file)
-    print(f"Total province IDs to process: {len(province_ids)}")
-
-    # Process locator files
-    create_updated_locator_files(
-        base_game_path, mod_folder_path, province_ids, locator_files
-    )
-
-
-# Function to parse mapdata CSV files
-def parse_mapdata(file_path):
-    print(f"Parsing mapdata from '{file_path}'")
-    mapdata = {}
-    current_section = None
-    with open(file_path, "r", newline="", encoding="utf-8") as csvfile:
-        reader = csv.reader(csvfile, delimiter=";")
-        for row in reader:
-            if not row:
-                continue
-            if row[0].startswith("Locator File:"):
-                current_section = row[0].split(":", 1)[1].strip()
-                current_section = current_section.strip().lower()
-                print(f"Found section '{current_section}'")
-                mapdata[current_section] = {}
-                continue
-            if row[0] == "ProvinceID":
-                continue  # Skip header
-            if current_section:
-                province_id = row[0]
-                try:
-                    mapdata[current_section][province_id] = {
-                        "R": int(row[1]),
-                        "G": int(row[2]),
-                        "B": int(row[3]),
-                        "X": int(row[4]),
-                        "Y": int(row[5]),
-                        "ProvinceName": row[6],
-                    }
-                except Exception as e:
-                    print(
-                        f"Error parsing row {row} in section '{current_section}': {e}"
-                    )
-    return mapdata
-
-
-# Function to remove id blocks from locator content
-def remove_blocks(content, blocks_to_remove):
-    new_content = ""
-    last_index = 0
-    for start, end in sorted(blocks_to_remove):
-        new_content += content[last_index:start]
-        last_index = end
-    new_content += content[last_index:]
-    return new_content
-
-
-# Helper function to parse id blocks
-def parse_id_blocks(content, instances_start, instances_end):
-    id_blocks = []
-    index = instances_start
-    content_length = instances_end
-    while index < content_length:
-        # Skip any whitespace
-        while index < content_length and content[index].isspace():
-            index += 1
-        if index >= content_length or content[index] != "{":
-            break  # No more blocks
-        block_start = index
-        brace_count = 1
-        index += 1
-        while index < content_length and brace_count > 0:
-            if content[index] == "{":
-                brace_count += 1
-            elif content[index] == "}":
-                brace_count -= 1
-            index += 1
-        block_end = index
-        block_text = content[block_start:block_end]
-        # Extract province_id and is_modded
-        id_match = re.search(r"id\s*=\s*(\d+)", block_text)
-        if not id_match:
-            print(f"No id found in block starting at position {block_start}")
-            continue
-        province_id = id_match.group(1)
-        is_modded = "#Modded" in block_text
-        id_blocks.append(
-            {
-                "text": block_text,
-                "province_id": province_id,
-                "start": block_start,
-                "end": block_end,
-                "is_modded": is_modded,
-            }
-        )
-    return id_blocks
-
-
-# 4) Iterate through the updated locator files, assign each ID their
-# R;G;B;X;Y value from the files from step 2), differentiating if the id
-# block is from base or from mod (latter is marked with a #Modded in the
-# updated locator file). Do another RGB check against the
-# provinces_modded.png map in the script directory. If the RGB matches
-# the expectations, do nothing. If there is a mismatch, write it in a
-# new output file and remove the ID block from the locator file, so it
-# can be re-generated by elvain using the map tool
-def final():
-    # Paths (adjust if necessary)
-    # Check if running as a PyInstaller executable
-    if getattr(sys, 'frozen', False):
-        script_dir = os.path.dirname(sys.executable)
-    else:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-    locator_dir = os.path.join(script_dir, "updated_locators")
-    mapdata_base_path = os.path.join(script_dir, "output", "mapdata_base.csv")
-    mapdata_modded_path = os.path.join(script_dir, "output", "mapdata_modded.csv")
-    image_path = os.path.join(script_dir, "provinces_modded.png")
-    output_file_path = os.path.join(script_dir, "output.txt")
-
-    # Load the image
-    try:
-        image = Image.open(image_path)
-        image_width, image_height = image.size
-        print(f"Loaded image '{image_path}' with size {image_width}x{image_height}")
-    except Exception:
-        print("Error loading image")
-        raise
-
-    # Load mapdata files
-    mapdata_base = parse_mapdata(mapdata_base_path)
-    mapdata_modded = parse_mapdata(mapdata_modded_path)
-
-    # Prepare output file
-    output_file = open(output_file_path, "w", encoding="utf-8")
-
-    # Iterate through locator files
-    for locator_filename in os.listdir(locator_dir):
-        if not locator_filename.endswith(".txt"):
-            continue
-        locator_path = os.path.join(locator_dir, locator_filename)
-        print(f"Processing locator file '{locator_filename}'")
-        with open(locator_path, "r", encoding="utf-8") as file:
-            content = file.read()
-
-        # Find the instances block
-        instances_match = re.search(r"instances\s*=\s*{", content)
-        if not instances_match:
-            print(f"No instances block found in '{locator_filename}'")
-            continue  # No instances block found
-        instances_start = instances_match.end()
-        brace_count = 1
-        index = instances_start
-        content_length = len(content)
-
-        # Find the end of the instances block
-        while index < content_length and brace_count > 0:
-            if content[index] == "{":
-                brace_count += 1
-            elif content[index] == "}":
-                brace_count -= 1
-            index += 1
-        instances_end = index
-        print(
-            f"Instances block found from {instances_start} to {instances_end} in '{locator_filename}'"
-        )
-
-        # Parse id blocks
-        id_blocks = parse_id_blocks(content, instances_start, instances_end)
-
-        if not id_blocks:
-            print(f"No id blocks found in '{locator_filename}'")
-            continue
-
-        print(f"Found {len(id_blocks)} id blocks in '{locator_filename}'")
-
-        # Process each id block
-        blocks_to_remove = []
-        for block in id_blocks:
-            province_id = block["province_id"]
-            is_modded = block["is_modded"]
-            mapdata = mapdata_modded if is_modded else mapdata_base
-
-            # Normalize locator filename
-            locator_key = os.path.basename(locator_filename).strip().lower()
-            print(
-                f"Processing ProvinceID {province_id} in '{locator_key}' (Modded: {is_modded})"
-            )
-
-            if locator_key not in mapdata:
-                output_file.write(f"Locator key '{locator_key}' not found in mapdata\n")
-                print(f"Locator key '{locator_key}' not found in mapdata")
-                continue
-
-            if province_id not in mapdata[locator_key]:
-                output_file.write(
-                    f"ProvinceID {province_id} not found in mapdata for '{locator_key}'\n"
-                )
-                print(
-                    f"ProvinceID {province_id} not found in mapdata for '{locator_key}'"
-                )
-                blocks_to_remove.append((block["start"], block["end"]))
-                continue
-
-            province_data = mapdata[locator_key][province_id]
-            expected_rgb = (province_data["R"], province_data["G"], province_data["B"])
-            x, y = province_data["X"], province_data["Y"]
-            province_name = province_data["ProvinceName"]
-
-            # Check if coordinates are within image bounds
-            if not (0 <= x < image_width and 0 <= y < image_height):
-                output_file.write(
-                    f"Coordinates out of bounds for ProvinceID {province_id} ({province_name}) in '{locator_key}'\n"
-                )
-                print(
-                    f"Coordinates out of bounds for ProvinceID {province_id} ({province_name}) in '{locator_key}'"
-                )
-                blocks_to_remove.append((block["start"], block["end"]))
-                continue
-
-            # Get the actual RGB value from the image
-            try:
-                actual_rgb = image.getpixel((x, y))
-                if isinstance(actual_rgb, int):
-                    # Grayscale image, replicate value across RGB channels
-                    actual_rgb = (actual_rgb, actual_rgb, actual_rgb)
-                elif len(actual_rgb) == 4:
-                    actual_rgb = actual_rgb[:3]  # Ignore alpha channel
-                elif len(actual_rgb) == 1:
-                    actual_rgb = (actual_rgb[0], actual_rgb[0], actual_rgb[0])
-            except Exception as e:
-                output_file.write(
-                    f"Error getting pixel for ProvinceID {province_id} ({province_name}): {e}\n"
-                )
-                print(
-                    f"Error getting pixel for ProvinceID {province_id} ({province_name}): {e}"
-                )
-                blocks_to_remove.append((block["start"], block["end"]))
-                continue
-
-            # Compare RGB values
-            if actual_rgb != expected_rgb:
-                output_file.write(
-                    f"Mismatch in '{locator_key}' for ProvinceID {province_id} ({province_name}): Expected RGB {expected_rgb}, got {actual_rgb}\n"
-                )
-                print(
-                    f"Mismatch for ProvinceID {province_id} ({province_name}): Expected RGB {expected_rgb}, got {actual_rgb}"
-                )
-                blocks_to_remove.append((block["start"], block["end"]))
-            else:
-                print(
-                    f"ProvinceID {province_id} ({province_name}) matches expected RGB {expected_rgb}"
-                )
-
-        # Remove the blocks from content
-        if blocks_to_remove:
-            print(
-                f"Removing {len(blocks_to_remove)} id blocks from '{locator_filename}'"
-            )
-            content = remove_blocks(content, blocks_to_remove)
-            # Write the updated content back to the locator file
-            with open(locator_path, "w", encoding="utf-8") as file:
-                file.write(content)
-        else:
-            print(f"No id blocks to remove from '{locator_filename}'")
-
-    output_file.close()
-    print("Processing complete. Check 'output.txt' for details.")
-
-
-def main():
-    try:
-        base_game_folder, mod_folder = get_folder_paths()
-        compare_definition(base_game_folder, mod_folder)
-        get_rgb(base_game_folder, mod_folder)
-        locator_files(base_game_folder, mod_folder)
-        final()
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        input("\nPress Enter to exit...")
-
-
-if __name__ == "__main__":
-    main()
+import array
+import contextlib
+import cProfile
+import csv
+import functools
+import hashlib
+import io
+import json
+import os
+import sys
+import re
+import shutil
+import struct
+import time
+import tracemalloc
+import zlib
+from collections import namedtuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Profile of the current run: one record per profiled stage with wall
+# time, CPU time, peak memory and the number of items it processed
+PROFILE_FILE = "profile.json"
+profile_records = []
+profile_stack = []
+# trace_memory: measure the peak of every stage with tracemalloc (slower)
+# cprofile_path: dump a cProfile of the locator check loop to this file
+profile_settings = {"trace_memory": False, "cprofile_path": None}
+
+
+# Console output: VERBOSITY_STEPS prints the steps, warnings and the
+# summary, VERBOSITY_FILES adds the progress of every locator file and
+# VERBOSITY_BLOCKS a line for every id block
+VERBOSITY_STEPS = 0
+VERBOSITY_FILES = 1
+VERBOSITY_BLOCKS = 2
+console_settings = {"verbosity": VERBOSITY_BLOCKS}
+# Console lines collected before they are printed in one write
+CONSOLE_BATCH_SIZE = 10000
+# Write buffer of output.txt
+REPORT_BUFFER_SIZE = 1 << 20
+
+
+# Function to check if console lines of the given verbosity are printed
+def verbose(level):
+    return console_settings["verbosity"] >= level
+
+
+# Function to print collected console lines with a single write and
+# clear them
+def print_lines(lines):
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        del lines[:]
+
+
+# Function to get the peak resident memory of this process in bytes
+def get_peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in kilobytes on Linux, in bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+# Context manager to profile a stage, optionally for one locator file.
+# Set record["items"] inside the block to the number of items processed
+@contextlib.contextmanager
+def profile_stage(stage, locator_file=None):
+    record = {
+        "stage": stage,
+        "locator_file": locator_file,
+        "depth": len(profile_stack),
+        "items": None,
+        "process": os.getpid(),
+        "start": time.time(),
+    }
+    trace_memory = profile_settings["trace_memory"] and tracemalloc.is_tracing()
+    if trace_memory:
+        # The peak so far belongs to every enclosing stage
+        peak = tracemalloc.get_traced_memory()[1]
+        for parent in profile_stack:
+            parent["tracemalloc_peak"] = max(parent["tracemalloc_peak"], peak)
+        tracemalloc.reset_peak()
+        record["tracemalloc_peak"] = 0
+    profile_stack.append(record)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_time"] = time.perf_counter() - wall_start
+        record["cpu_time"] = time.process_time() - cpu_start
+        record["peak_rss"] = get_peak_rss()
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            record["tracemalloc_peak"] = max(record["tracemalloc_peak"], peak)
+        profile_stack.pop()
+        profile_records.append(record)
+
+
+# Decorator to profile every call of a function. count_items gets the
+# result and returns the number of items processed, locator_file_arg is
+# the index of the argument holding the locator file path
+def profiled(stage, count_items=len, locator_file_arg=None):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            locator_file = None
+            if locator_file_arg is not None:
+                locator_file = os.path.basename(args[locator_file_arg])
+            with profile_stage(stage, locator_file) as record:
+                result = function(*args, **kwargs)
+                if count_items is not None and result is not None:
+                    record["items"] = count_items(result)
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+# Context manager to run the hot loop under cProfile when requested
+@contextlib.contextmanager
+def profile_hot_loop():
+    cprofile_path = profile_settings["cprofile_path"]
+    if not cprofile_path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(cprofile_path)
+        print(f"cProfile of the locator check written to '{cprofile_path}'")
+
+
+# Function to write the profile of the run as JSON
+def write_profile(profile_path, total_wall_time):
+    records = sorted(profile_records, key=lambda record: record["start"])
+    with open(profile_path, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "command": sys.argv,
+                "total_wall_time": total_wall_time,
+                "peak_rss": get_peak_rss(),
+                "stages": records,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Profile written to '{profile_path}'")
+
+
+# Function to print the profile, summed up per stage in the order the
+# stages started
+def print_profile_summary(total_wall_time):
+    totals = {}
+    for record in sorted(profile_records, key=lambda record: record["start"]):
+        total = totals.setdefault(
+            record["stage"],
+            {"depth": record["depth"], "calls": 0, "wall_time": 0.0, "cpu_time": 0.0, "items": None},
+        )
+        total["depth"] = min(total["depth"], record["depth"])
+        total["calls"] += 1
+        total["wall_time"] += record["wall_time"]
+        total["cpu_time"] += record["cpu_time"]
+        if record["items"] is not None:
+            total["items"] = (total["items"] or 0) + record["items"]
+
+    print("\nProfile:")
+    print(f"{'Stage':<34}{'Calls':>6}{'Wall':>10}{'CPU':>10}{'Items':>10}")
+    for stage, total in totals.items():
+        name = "  " * total["depth"] + stage
+        items = "" if total["items"] is None else total["items"]
+        print(
+            f"{name:<34}{total['calls']:>6}{total['wall_time']:>9.3f}s"
+            f"{total['cpu_time']:>9.3f}s{items:>10}"
+        )
+    peak_rss = get_peak_rss()
+    peak = f", peak RSS {peak_rss / (1 << 20):.1f} MB" if peak_rss else ""
+    print(f"Total {total_wall_time:.3f}s{peak}")
+
+
+def get_folder_path(prompt):
+    while True:
+        path = input(prompt)
+        if os.path.isdir(path):
+            definition_path = os.path.join(path, "map_data", "definition.csv")
+            if os.path.isfile(definition_path):
+                print(f"Found definition.csv at: {definition_path}")
+                return path
+            else:
+                print(
+                    f"Error: 'definition.csv' not found in {os.path.join(path, 'map_data')}"
+                )
+        else:
+            print("Error: Invalid directory. Please enter a valid path.")
+
+
+def get_folder_paths():
+    print("Enter the paths to the base game folder and the mod folder:")
+    base_game_folder = get_folder_path("Reference folder path (e.g. G:\Steam\steamapps\common\Crusader Kings III\game): ")
+    mod_folder = get_folder_path("Mod folder path: ")
+    return base_game_folder, mod_folder
+
+
+# Words in the names of provinces that are left out of the definition
+# comparison (case-insensitive)
+IGNORED_PROVINCE_WORDS = ("river", "impassable")
+
+
+# Function to check if a province is left out of the comparison by its name
+def should_ignore_province(province_name):
+    province_name = province_name.lower()
+    return any(word in province_name for word in IGNORED_PROVINCE_WORDS)
+
+
+# Function to read definition.csv of a folder for the comparison. Fields
+# are compared without surrounding whitespace and without the trailing
+# fields after the name. Returns ((R, G, B), name, original line) per
+# ProvinceID (int)
+@profiled("read_definition_file")
+def read_definition_file(folder):
+    province_dict = {}
+    file_path = os.path.join(folder, "map_data", "definition.csv")
+    print(f"Reading file: {file_path}")
+    with open(file_path, "r", encoding="utf-8-sig") as file:
+        for line_num, line in enumerate(file, 1):
+            original_line = line.rstrip("\n")  # Keep the original line for storage
+            line_stripped = line.strip()
+            if not line_stripped or line_stripped.startswith("#"):
+                continue  # Skip empty lines and comments
+            parts = line_stripped.split(";")
+            try:
+                province_id = int(parts[0])
+                rgb = (int(parts[1]), int(parts[2]), int(parts[3]))
+                province_name = parts[4].strip()
+            except (ValueError, IndexError):
+                print(f"Warning: Skipping malformed line {line_num}: {line_stripped}")
+                continue  # Skip malformed lines
+            # Check if line should be ignored
+            if should_ignore_province(province_name):
+                continue
+            province_dict[province_id] = (rgb, province_name, original_line)
+    print(f"Total provinces read from {file_path}: {len(province_dict)}")
+    return province_dict
+
+
+# Differences between the definition.csv of a mod and the one of the
+# layer before it, as sets of ProvinceIDs (ints): added and removed
+# provinces, provinces with a new color and provinces with a new name
+# (both, if both changed). province_ids holds all of them, lines the line
+# of every changed ProvinceID for new_definition.csv: the one of the mod,
+# or the one before for removed provinces
+DefinitionDiff = namedtuple(
+    "DefinitionDiff", ["added", "removed", "recolored", "renamed", "province_ids", "lines"]
+)
+EMPTY_DEFINITION_DIFF = DefinitionDiff(set(), set(), set(), set(), set(), {})
+
+
+# Function to compare two definitions read by read_definition_file by
+# their parsed fields
+def compare_definitions(base_def, mod_def):
+    print(f"Total unique province IDs to compare: {len(base_def.keys() | mod_def.keys())}")
+    added = mod_def.keys() - base_def.keys()
+    removed = base_def.keys() - mod_def.keys()
+    recolored = set()
+    renamed = set()
+    for province_id in base_def.keys() & mod_def.keys():
+        base_rgb, base_name, _ = base_def[province_id]
+        mod_rgb, mod_name, _ = mod_def[province_id]
+        if base_rgb != mod_rgb:
+            recolored.add(province_id)
+        if base_name != mod_name:
+            renamed.add(province_id)
+    province_ids = added | removed | recolored | renamed
+    lines = {
+        province_id: (mod_def.get(province_id) or base_def[province_id])[2]
+        for province_id in province_ids
+    }
+    print(
+        f"Total differences found: {len(province_ids)} ({len(added)} added, "
+        f"{len(removed)} removed, {len(recolored)} recolored, {len(renamed)} renamed)"
+    )
+    return DefinitionDiff(added, removed, recolored, renamed, province_ids, lines)
+
+
+# One folder of the load order. index is 0 for the base game and counts
+# up along the mods, name is the folder name findings are attributed to.
+# A mod without its own definition.csv or provinces.png uses the one of
+# the nearest layer before it: definition_folder and map_folder are the
+# folders the files are read from
+Layer = namedtuple("Layer", ["index", "folder", "name", "definition_folder", "map_folder"])
+
+
+# Function to get the layers of a load order: the base game followed by
+# one mod folder, or a list of mod folders where every mod overrides the
+# ones before it
+def load_order_layers(base_game_folder, mod_folders):
+    if isinstance(mod_folders, str):
+        mod_folders = [mod_folders]
+    layers = []
+    definition_folder = map_folder = base_game_folder
+    for index, folder in enumerate([base_game_folder] + list(mod_folders or [])):
+        if os.path.isfile(os.path.join(folder, "map_data", "definition.csv")):
+            definition_folder = folder
+        if os.path.isfile(os.path.join(folder, "map_data", "provinces.png")):
+            map_folder = folder
+        name = os.path.basename(os.path.normpath(folder))
+        layers.append(Layer(index, folder, name, definition_folder, map_folder))
+    return layers
+
+
+# Function to get the name of an output file of a mod layer: file_name
+# for the first mod, with the layer appended for the mods after it
+def layer_file_name(file_name, layer_index):
+    if layer_index <= 1:
+        return file_name
+    stem, extension = os.path.splitext(file_name)
+    return f"{stem}_{layer_index}{extension}"
+
+
+# Function to get the name of the mapdata CSV of a layer
+def mapdata_file_name(layer_index):
+    if layer_index == 0:
+        return "mapdata_base.csv"
+    return layer_file_name("mapdata_modded.csv", layer_index)
+
+
+# 1) Script first compares definition.csv of base game and mod folder
+# and creates new_definition.csv containing only the mismatching lines.
+# With several mods, every mod is compared with the effective
+# definition.csv of the layer before it, and the mismatching lines of the
+# mods after the first go to new_definition_<layer>.csv. A definition.csv
+# identical to the one before is not parsed at all. The differences are
+# also returned, as a DefinitionDiff per mod
+@profiled(
+    "1 compare_definition",
+    count_items=lambda definition_diffs: sum(len(diff.province_ids) for diff in definition_diffs),
+)
+def compare_definition(base_game_folder, mod_folders, write_output=True, output_dir=None):
+    layers = load_order_layers(base_game_folder, mod_folders)
+    previous_folder = base_game_folder
+    previous_hash = hash_file(os.path.join(base_game_folder, "map_data", "definition.csv"))
+    previous_definition = None
+
+    definition_diffs = []
+    for layer in layers[1:]:
+        if layer.definition_folder != layer.folder:
+            print(f"No definition.csv in '{layer.folder}', it keeps the one of the layer before")
+            definition_diff = EMPTY_DEFINITION_DIFF
+        else:
+            mod_hash = hash_file(os.path.join(layer.folder, "map_data", "definition.csv"))
+            if mod_hash == previous_hash:
+                print(f"definition.csv of '{layer.name}' is identical to the one before")
+                definition_diff = EMPTY_DEFINITION_DIFF
+            else:
+                if previous_definition is None:
+                    previous_definition = read_definition_file(previous_folder)
+                mod_definition = read_definition_file(layer.folder)
+                definition_diff = compare_definitions(previous_definition, mod_definition)
+                previous_definition = mod_definition
+            previous_folder = layer.folder
+            previous_hash = mod_hash
+            if not definition_diff.province_ids:
+                print("No differences found between the definition.csv files.")
+        definition_diffs.append(definition_diff)
+
+        if write_output:
+            output_file = os.path.join(
+                output_dir or "", layer_file_name("new_definition.csv", layer.index)
+            )
+            with open(output_file, "w", encoding="utf-8") as f:
+                # Sort by ProvinceID for consistency
+                for province_id in sorted(definition_diff.lines):
+                    f.write(definition_diff.lines[province_id] + "\n")
+            print(f"Differences have been written to {output_file}")
+    return definition_diffs
+
+
+# Columnar table of provinces: ProvinceIDs in ids (int32) and their
+# colors in rgb (uint8, shape (n, 3)). Province names are interned in the
+# names list, name_indices (int32) points into it. Tables of
+# definition.csv are sorted by ProvinceID and leave x, y and sampled
+# None. Mapdata tables keep the order of their locator file, with the
+# locator coordinates in x and y (int32) and, once sampled, the color of
+# the province map at every locator in sampled (int16, -1 outside the
+# map). order sorts ids, None when they are sorted already
+ProvinceTable = namedtuple(
+    "ProvinceTable", ["ids", "rgb", "x", "y", "name_indices", "names", "sampled", "order"]
+)
+
+
+# Function to intern names into a pool ({name: index}), returns the index
+# of every name
+def intern_names(names, pool):
+    import numpy as np
+
+    return np.fromiter(
+        (pool.setdefault(name, len(pool)) for name in names), dtype=np.int32, count=len(names)
+    )
+
+
+# Function to build a table of definition.csv from its columns. Of
+# several lines of one ProvinceID the last one is kept
+def definition_table(province_ids, rgbs, names):
+    import numpy as np
+
+    province_ids = np.asarray(province_ids, dtype=np.int64)
+    pool = {}
+    name_indices = intern_names(names, pool)
+    # Unique over the reversed ids finds the last line of every ProvinceID
+    _, reverse_index = np.unique(province_ids[::-1], return_index=True)
+    keep = len(province_ids) - 1 - reverse_index
+    return ProvinceTable(
+        province_ids[keep].astype(np.int32),
+        np.asarray(rgbs, dtype=np.uint8).reshape(-1, 3)[keep],
+        None,
+        None,
+        name_indices[keep],
+        list(pool),
+        None,
+        None,
+    )
+
+
+# Function to build a mapdata table from its columns, in locator file order
+def mapdata_table(province_ids, rgb, x, y, name_indices, names, sampled=None):
+    import numpy as np
+
+    province_ids = np.asarray(province_ids, dtype=np.int32)
+    order = None
+    if len(province_ids) and np.any(province_ids[1:] < province_ids[:-1]):
+        order = np.argsort(province_ids, kind="stable")
+    return ProvinceTable(
+        province_ids,
+        np.asarray(rgb, dtype=np.uint8).reshape(-1, 3),
+        np.asarray(x, dtype=np.int32),
+        np.asarray(y, dtype=np.int32),
+        np.asarray(name_indices, dtype=np.int32),
+        names,
+        None if sampled is None else np.asarray(sampled, dtype=np.int16).reshape(-1, 3),
+        order,
+    )
+
+
+# Function to find the rows of the given ProvinceIDs in a province table
+# with a single sorted search. Returns -1 for ProvinceIDs not in the table
+def find_province_rows(table, province_ids):
+    import numpy as np
+
+    province_ids = np.asarray(province_ids, dtype=np.int64)
+    if len(table.ids) == 0:
+        return np.full(len(province_ids), -1, dtype=np.int64)
+    positions = np.searchsorted(table.ids, province_ids, sorter=table.order)
+    positions = np.minimum(positions, len(table.ids) - 1)
+    rows = positions if table.order is None else table.order[positions]
+    return np.where(table.ids[rows] == province_ids, rows, -1)
+
+
+# Function to read definition.csv into a province table. Lines without a
+# numeric ProvinceID and color are skipped
+def read_definition_csv(definition_path):
+    province_ids = []
+    rgbs = []
+    names = []
+    with open(definition_path, "r") as file:
+        reader = csv.reader(file, delimiter=";")
+        for row in reader:
+            if len(row) < 5 or row[0].startswith("#"):
+                continue
+            try:
+                province_id = int(row[0])
+                rgb = tuple(int(value) for value in row[1:4])
+            except ValueError:
+                rgb = ()
+            if len(rgb) != 3 or not all(0 <= value <= 255 for value in rgb):
+                print(f"Warning: Skipping malformed line of '{definition_path}': {';'.join(row)}")
+                continue
+            province_ids.append(province_id)
+            rgbs.append(rgb)
+            names.append(row[4])
+    return definition_table(province_ids, rgbs, names)
+
+
+# Locator files of the base game. The files to process are found in the
+# folders of the load order instead, see discover_locator_files
+LOCATOR_FILES = [
+    "building_locators.txt",
+    "combat_locators.txt",
+    "other_stack_locators.txt",
+    "player_stack_locators.txt",
+    "siege_locators.txt",
+    "special_building_locators.txt",
+]
+
+# End of the names of the locator files in gfx/map/map_object_data
+LOCATOR_FILE_SUFFIX = "_locators.txt"
+
+
+# Function to get the folder of the locator files of a game or mod folder
+def locator_folder(folder):
+    return os.path.join(folder, "gfx", "map", "map_object_data")
+
+
+# Function to find the locator files of a folder, sorted by name
+def find_locator_files(folder):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(
+        entry.name
+        for entry in os.scandir(folder)
+        if entry.name.lower().endswith(LOCATOR_FILE_SUFFIX) and entry.is_file()
+    )
+
+
+# Function to find the locator files of a load order: every
+# *_locators.txt in the locator folder of the base game or of a mod,
+# sorted by name
+def discover_locator_files(layers):
+    locator_files = set()
+    for layer in layers:
+        locator_files.update(find_locator_files(locator_folder(layer.folder)))
+    return sorted(locator_files)
+
+
+# Index of the id blocks of the instances list of a locator file, as
+# NumPy arrays with one entry per block in file order. starts and ends are
+# byte offsets of the block's braces in the file, is_modded is set when
+# the block carries a #Modded comment and layers holds the layer of the
+# load order the block was taken from (see modded_layer), 0 for the base
+# game. The numbers of the position, rotation and scale of all blocks are
+# concatenated, those of block i are positions[position_offsets[i]:
+# position_offsets[i + 1]] and so on, empty if the block has none
+LocatorIndex = namedtuple(
+    "LocatorIndex",
+    [
+        "province_ids",
+        "starts",
+        "ends",
+        "is_modded",
+        "layers",
+        "positions",
+        "position_offsets",
+        "rotations",
+        "rotation_offsets",
+        "scales",
+        "scale_offsets",
+    ],
+)
+
+# Tokens of the locator file format: comments, braces, "=" and bare words
+LOCATOR_TOKEN_PATTERN = re.compile(rb"#[^\r\n]*|[{}=]|[^\s{}=#]+")
+# Lines holding a single brace, "key=value" or "key={ numbers }", which is
+# how nearly every line of a locator file looks. Anything else falls back
+# to the token pattern
+LOCATOR_LINE_PATTERN = re.compile(
+    rb"\s*(?:(\{)|(\})|([^\s{}=#]+)\s*=\s*(?:\{([^{}#]*)\}|([^\s{}=#]+)))"
+    rb"\s*(#[^\r\n]*)?\s*"
+)
+LOCATOR_VECTOR_KEYS = {b"position": 0, b"rotation": 1, b"scale": 2}
+# Comment marking the id blocks taken from a mod: "#Modded" for the first
+# mod of the load order, "#Modded:<layer>" for the mods after it
+MODDED_LAYER_PATTERN = re.compile(rb"#Modded(?::(\d+))?")
+
+
+# Function to get the comment marking the id blocks of a mod layer
+def modded_marker(layer):
+    return b" #Modded" if layer == 1 else b" #Modded:%d" % layer
+
+
+# Function to get the layer of a block from its #Modded comment, 0 if it
+# has none
+def modded_layer(comment):
+    match = MODDED_LAYER_PATTERN.search(comment)
+    if match is None:
+        return 0
+    return int(match.group(1) or 1)
+
+
+# Function to index the id blocks of a locator file in a single pass over
+# an open binary file handle. The file is read line by line, so the whole
+# file never has to be in memory, and the fields of the blocks are
+# collected in typed arrays. Returns a LocatorIndex
+def index_locator_stream(file):
+    import numpy as np
+
+    province_ids = array.array("q")
+    starts = array.array("q")
+    ends = array.array("q")
+    is_modded = array.array("b")
+    layers = array.array("q")
+    # Numbers and offsets of the positions, rotations and scales
+    vector_values = [array.array("d") for _ in LOCATOR_VECTOR_KEYS]
+    vector_offsets = [array.array("q", [0]) for _ in LOCATOR_VECTOR_KEYS]
+    keys = []  # key of every open brace, None for anonymous braces
+    # id, start, is_modded, layer and vectors of the block being parsed
+    block = None
+    block_level = 0
+    vector = None  # numbers of the position/rotation/scale being parsed
+
+    def open_brace(key, position):
+        nonlocal block, block_level, vector
+        keys.append(key)
+        if block is None:
+            if key is None and len(keys) >= 2 and keys[-2] == b"instances":
+                block = [None, position, False, 0, [(), (), ()]]
+                block_level = len(keys)
+        elif len(keys) == block_level + 1 and key in LOCATOR_VECTOR_KEYS:
+            vector = []
+
+    def close_brace(position):
+        nonlocal block, vector
+        if vector is not None:
+            block[4][LOCATOR_VECTOR_KEYS[keys[-1]]] = vector
+            vector = None
+        if keys:
+            keys.pop()
+        if block is not None and len(keys) < block_level:
+            if block[0] is None:
+                print(f"No id found in block starting at position {block[1]}")
+            else:
+                province_ids.append(block[0])
+                starts.append(block[1])
+                ends.append(position)
+                is_modded.append(block[2])
+                layers.append(block[3])
+                for values, offsets, numbers in zip(vector_values, vector_offsets, block[4]):
+                    values.extend(numbers)
+                    offsets.append(len(values))
+            block = None
+
+    def assign(key, value):
+        if block is not None and key == b"id" and len(keys) == block_level:
+            block[0] = int(value)
+
+    word = None  # last bare word, the key if an "=" follows
+    assigning = False
+    offset = 0
+    for line in file:
+        # Fast path for whole lines, unless a token from a previous line is
+        # pending
+        match = None
+        if vector is None and word is None:
+            match = LOCATOR_LINE_PATTERN.fullmatch(line)
+        if match is not None:
+            opening, closing, key, numbers, value, comment = match.groups()
+            if opening:
+                open_brace(None, offset + match.start(1))
+            elif closing:
+                close_brace(offset + match.end(2))
+            elif numbers is not None:
+                if block is not None and len(keys) == block_level and key in LOCATOR_VECTOR_KEYS:
+                    block[4][LOCATOR_VECTOR_KEYS[key]] = list(map(float, numbers.split()))
+            elif key is not None:
+                assign(key, value)
+            if comment and block is not None and b"#Modded" in comment:
+                block[2] = True
+                block[3] = modded_layer(comment)
+            offset += len(line)
+            continue
+
+        for match in LOCATOR_TOKEN_PATTERN.finditer(line):
+            token = match.group()
+            if token[:1] == b"#":
+                if block is not None and b"#Modded" in token:
+                    block[2] = True
+                    block[3] = modded_layer(token)
+            elif token == b"=":
+                assigning = word is not None
+            elif token == b"{":
+                open_brace(word if assigning else None, offset + match.start())
+                word = None
+                assigning = False
+            elif token == b"}":
+                close_brace(offset + match.end())
+                word = None
+                assigning = False
+            elif vector is not None:
+                vector.append(float(token))
+            elif assigning:
+                assign(word, token)
+                word = None
+                assigning = False
+            else:
+                word = token
+        offset += len(line)
+
+    vectors = []
+    for values, offsets in zip(vector_values, vector_offsets):
+        vectors += [np.frombuffer(values, dtype=np.float64), np.frombuffer(offsets, dtype=np.int64)]
+    return LocatorIndex(
+        np.frombuffer(province_ids, dtype=np.int64),
+        np.frombuffer(starts, dtype=np.int64),
+        np.frombuffer(ends, dtype=np.int64),
+        np.frombuffer(is_modded, dtype=np.int8).astype(bool),
+        np.frombuffer(layers, dtype=np.int64),
+        *vectors,
+    )
+
+
+# Block indexes of the locator files read in the current run, keyed by
+# path (see locator_index_scope). None outside of a run, every file is
+# then indexed again whenever it is read
+locator_index_settings = {"indexes": None}
+
+
+# Context manager to share the block indexes of the locator files between
+# the steps of a run, so each file is only parsed once. The indexes are
+# dropped when the run ends. indexes continues the ones of an earlier
+# scope, e.g. of a locator checker. Can also decorate a function
+@contextlib.contextmanager
+def locator_index_scope(indexes=None):
+    previous_indexes = locator_index_settings["indexes"]
+    locator_index_settings["indexes"] = {} if indexes is None else indexes
+    try:
+        yield locator_index_settings["indexes"]
+    finally:
+        locator_index_settings["indexes"] = previous_indexes
+
+
+# Function to index the id blocks of a locator file. Within a
+# locator_index_scope, the index is reused as long as the file's size and
+# modification time are unchanged
+def index_locator_file(locator_path):
+    locator_path = os.path.abspath(locator_path)
+    indexes = locator_index_settings["indexes"]
+    stat = os.stat(locator_path)
+    file_key = (stat.st_size, stat.st_mtime_ns)
+    cached = indexes.get(locator_path) if indexes is not None else None
+    if cached is not None and cached[0] == file_key:
+        return cached[1]
+    with profile_stage("index_locator_file", os.path.basename(locator_path)) as record:
+        with open(locator_path, "rb") as file:
+            index = index_locator_stream(file)
+        record["items"] = len(index.province_ids)
+    if indexes is not None:
+        indexes[locator_path] = (file_key, index)
+    return index
+
+
+# Function to read the bytes of the blocks with the given block indexes
+# from a locator file
+def read_block_bytes(locator_path, index, block_indexes):
+    block_bytes = []
+    with open(locator_path, "rb") as file:
+        for start, end in zip(
+            index.starts[block_indexes].tolist(), index.ends[block_indexes].tolist()
+        ):
+            file.seek(start)
+            block_bytes.append(file.read(end - start))
+    return block_bytes
+
+
+# Function to get the height the Y-coordinates of the locator files are
+# inverted with: the height of provinces.png of the base game
+def locator_image_height(base_game_folder):
+    return read_image_size(os.path.join(base_game_folder, "map_data", "provinces.png"))[1]
+
+
+# Function to read locator files and gather province IDs (ints) with
+# coordinates
+@profiled("read_locator_file", locator_file_arg=0)
+def read_locator_file(locator_path, image_height):
+    import numpy as np
+
+    index = index_locator_file(locator_path)
+    position_starts = index.position_offsets[:-1]
+    has_position = np.diff(index.position_offsets) == 3
+    xs = index.positions[position_starts[has_position]].astype(np.int64)
+    ys = image_height - index.positions[position_starts[has_position] + 2].astype(np.int64)
+    return dict(zip(index.province_ids[has_position].tolist(), zip(xs.tolist(), ys.tolist())))
+
+
+# Function to write the mapdata table of one locator file to the output
+# CSV, with the sampled colors if the table has them
+def write_output_csv(output_path, table, locator_file_name):
+    with open(output_path, "a", newline="") as csvfile:
+        csv_writer = csv.writer(csvfile, delimiter=";")
+        csv_writer.writerow([f"Locator File: {locator_file_name}"])
+        csv_writer.writerow(
+            ["ProvinceID", "R", "G", "B", "X", "Y", "ProvinceName"]
+            + ["SampledR", "SampledG", "SampledB", "Match"]
+        )
+        sampled = table.sampled.tolist() if table.sampled is not None else None
+        for row, (province_id, rgb, x, y, name_index) in enumerate(
+            zip(
+                table.ids.tolist(),
+                table.rgb.tolist(),
+                table.x.tolist(),
+                table.y.tolist(),
+                table.name_indices.tolist(),
+            )
+        ):
+            if sampled is None or sampled[row][0] < 0:
+                sample_columns = ["", "", "", ""]
+            else:
+                match = "yes" if sampled[row] == rgb else "no"
+                sample_columns = sampled[row] + [match]
+            csv_writer.writerow(
+                [province_id] + rgb + [x, y, table.names[name_index]] + sample_columns
+            )
+        csv_writer.writerow([])  # Add an empty line for better readability
+
+
+# Function to sample a province map, a MapSource, at the coordinates of
+# every locator of a folder's mapdata, with a single gather for all
+# locator files.
+# Returns the mapdata with the sampled colors filled in. Disagreements
+# with definition.csv are counted on the console
+@profiled(
+    "sample_locator_colors",
+    count_items=lambda mapdata: sum(len(table.ids) for table in mapdata.values()),
+)
+def sample_locator_colors(map_source, mapdata, image_name):
+    import numpy as np
+
+    tables = list(mapdata.values())
+    coordinates = np.concatenate(
+        [np.stack([table.x, table.y], axis=1) for table in tables]
+        + [np.zeros((0, 2), dtype=np.int32)]
+    )
+    expected_rgbs = np.concatenate(
+        [table.rgb for table in tables] + [np.zeros((0, 3), dtype=np.uint8)]
+    )
+
+    status, actual_rgbs = map_source.read_pixels(coordinates, expected_rgbs)
+    sampled = actual_rgbs.astype(np.int16)
+    sampled[status == PIXEL_OUT_OF_BOUNDS] = -1
+    lengths = [len(table.ids) for table in tables]
+    mismatch_count = int(np.count_nonzero(status == PIXEL_MISMATCH))
+    if mismatch_count:
+        print(
+            f"Warning: {mismatch_count} of {len(status)} locators are on a different color "
+            f"in '{image_name}' than in definition.csv"
+        )
+    return {
+        locator_key: table._replace(sampled=table_sampled)
+        for (locator_key, table), table_sampled in zip(
+            mapdata.items(), np.split(sampled, np.cumsum(lengths)[:-1])
+        )
+    }
+
+
+# Function to join the definition table with the locator coordinates of
+# every locator file into the mapdata of one folder: a mapdata table per
+# lowercase locator file name. Locators of ProvinceIDs missing from the
+# definition are left out
+def build_mapdata(definition, province_info_by_file):
+    import numpy as np
+
+    mapdata = {}
+    for locator_file, province_info in province_info_by_file.items():
+        province_ids = np.fromiter(province_info, dtype=np.int64, count=len(province_info))
+        coordinates = np.asarray(list(province_info.values()), dtype=np.int64).reshape(-1, 2)
+        rows = find_province_rows(definition, province_ids)
+        found = rows >= 0
+        rows = rows[found]
+        mapdata[locator_file.strip().lower()] = mapdata_table(
+            province_ids[found],
+            definition.rgb[rows],
+            coordinates[found, 0],
+            coordinates[found, 1],
+            definition.name_indices[rows],
+            definition.names,
+        )
+    return mapdata
+
+
+# 2) Iterate through locator files both in base game and mod folder and
+# create big data files mapdata_base.csv and mapdata_modded.csv which
+# contain ProvinceID;R;G;B;X;Y;ProvinceName for every locator ID (sorted
+# for each file). the X Y coordinates are extracted from the ID and the
+# mathematical inversion for the Y-coordinate based on province.png
+# height applied. The R;G;B values are read directly from the province
+# map using these coordinates, since they do not always match the ones
+# provided in definition.csv file
+# With several mods, the mods after the first get their own
+# mapdata_modded_<layer>.csv. The data of every layer is also returned,
+# in a list in load order and in the same form as parse_mapdata reads it.
+# With strip_rows, the maps are read in strips of that many rows
+@profiled(
+    "2 get_rgb",
+    count_items=lambda mapdata_layers: sum(
+        len(table.ids) for mapdata in mapdata_layers for table in mapdata.values()
+    ),
+)
+def get_rgb(base_game_folder, mod_folders, write_output=True, output_dir=None, strip_rows=None):
+    layers = load_order_layers(base_game_folder, mod_folders)
+    province_image_path = os.path.join(base_game_folder, "map_data", "provinces.png")
+
+    # Read the definition CSVs
+    province_data_by_layer = read_layer_definitions(layers)
+
+    # Load the provinces.png image, its height inverts the Y-coordinates
+    base_map = open_map_source(province_image_path, strip_rows)
+    image_height = locator_image_height(base_game_folder)
+
+    # Read locator files and gather province IDs with coordinates
+    province_info_by_layer = []
+    locator_files = discover_locator_files(layers)
+    for layer in layers:
+        province_info = {}
+        for locator_file in locator_files:
+            locator_path = os.path.join(locator_folder(layer.folder), locator_file)
+            if os.path.exists(locator_path):
+                province_info[locator_file] = read_locator_file(locator_path, image_height)
+        province_info_by_layer.append(province_info)
+
+    mapdata_layers = sample_layer_maps(
+        layers,
+        base_map,
+        [
+            build_mapdata(province_data, province_info)
+            for province_data, province_info in zip(province_data_by_layer, province_info_by_layer)
+        ],
+    )
+    if write_output:
+        write_mapdata_csvs(mapdata_layers, output_dir)
+    return mapdata_layers
+
+
+# Function to read the effective definition.csv of every layer into a
+# province table. A file shared by several layers is only read once
+def read_layer_definitions(layers):
+    province_data = {}
+    for layer in layers:
+        if layer.definition_folder not in province_data:
+            province_data[layer.definition_folder] = read_definition_csv(
+                os.path.join(layer.definition_folder, "map_data", "definition.csv")
+            )
+    return [province_data[layer.definition_folder] for layer in layers]
+
+
+# Function to sample the locators of every layer on the provinces.png it
+# uses: its own, or the one of the nearest layer before it. Only one map
+# is open at a time, read like base_map, the MapSource of the base game.
+# Returns the mapdata of every layer with the sampled colors filled in
+def sample_layer_maps(layers, base_map, mapdata_layers):
+    map_source = base_map
+    map_folder = layers[0].map_folder
+    sampled_layers = []
+    for layer, mapdata in zip(layers, mapdata_layers):
+        if layer.map_folder != map_folder:
+            map_folder = layer.map_folder
+            map_source = open_map_source(
+                os.path.join(map_folder, "map_data", "provinces.png"), base_map.strip_rows
+            )
+        if map_folder == layers[0].map_folder:
+            image_name = "provinces.png of the base game"
+        elif len(layers) == 2:
+            image_name = "provinces.png of the mod"
+        else:
+            image_name = f"provinces.png of {os.path.basename(os.path.normpath(map_folder))}"
+        sampled_layers.append(sample_locator_colors(map_source, mapdata, image_name))
+    return sampled_layers
+
+
+# Function to write the mapdata CSV of every layer to the output folder.
+# Files of further layers left over from an earlier run are removed
+def write_mapdata_csvs(mapdata_layers, output_dir=None):
+    # Create output folder if it doesn't exist
+    output_folder = os.path.join(output_dir or "", "output")
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    for layer_index, mapdata in enumerate(mapdata_layers):
+        output_path = os.path.join(output_folder, mapdata_file_name(layer_index))
+        # Clear the output file if it already exists
+        open(output_path, "w").close()
+        for locator_file, table in mapdata.items():
+            write_output_csv(output_path, table, locator_file)
+
+    layer_index = len(mapdata_layers)
+    while os.path.isfile(os.path.join(output_folder, mapdata_file_name(layer_index))):
+        os.remove(os.path.join(output_folder, mapdata_file_name(layer_index)))
+        layer_index += 1
+
+    print(f"Output files created in '{output_folder}' folder.")
+
+
+# Function to get the province IDs of definition lines
+def parse_province_ids(lines):
+    province_ids = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(";")
+        if parts:
+            province_id = parts[0].strip().lstrip("#")
+            if province_id.isdigit():
+                province_ids.add(int(province_id))
+    return province_ids
+
+
+def get_province_ids(definition_file):
+    with open(definition_file, "r", encoding="utf-8") as f:
+        return parse_province_ids(f)
+
+
+# Function to merge the locator files of the base game and the mods. The
+# merged files are written to the updated_locators folder unless
+# write_output is off, and are returned in any case. province_ids_by_layer
+# holds the ProvinceIDs to take from every layer, None for the base game.
+# The repainted_province_ids are taken from every layer that has them, see
+# extract_layer_id_blocks
+def create_updated_locator_files(
+    layers,
+    province_ids_by_layer,
+    locator_files,
+    write_output=True,
+    output_dir=None,
+    repainted_province_ids=frozenset(),
+):
+    # Create the output directory
+    output_dir = os.path.join(output_dir or os.getcwd(), "updated_locators")
+    if write_output:
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Created output directory: {output_dir}")
+
+    merged_files = []
+    for locator_file in locator_files:
+        layer_file_paths = [
+            os.path.join(locator_folder(layer.folder), locator_file) for layer in layers
+        ]
+        base_file_path = layer_file_paths[0]
+        output_file_path = os.path.join(output_dir, locator_file)
+
+        if not os.path.isfile(base_file_path):
+            print(f"Base locator file not found: {base_file_path}")
+            continue
+
+        # Collect the id blocks of the mods and replace the corresponding
+        # id blocks of the base game locator file in one pass
+        mod_id_blocks, mod_layers = extract_layer_id_blocks(
+            layer_file_paths, province_ids_by_layer, repainted_province_ids
+        )
+        merged = merge_locator_file(base_file_path, mod_id_blocks, mod_layers)
+        merged_files.append(merged)
+        if write_output:
+            write_merged_locator_file(merged, output_file_path)
+            print(f"Updated locator file: {output_file_path}")
+    return merged_files
+
+
+# Function to collect the id blocks of one locator file from the mods of
+# the load order, for the ProvinceIDs of every layer (see
+# create_updated_locator_files). A block of a later mod replaces the block
+# of an earlier one, so every block comes from the last layer that changed
+# its province. ProvinceIDs of a layer that its locator file leaves out
+# were deleted by the mod and get None as their block. The
+# repainted_province_ids are only taken from the layers whose locator
+# file has their block, and are never deleted. Returns the id blocks and
+# the layer of every block
+def extract_layer_id_blocks(
+    layer_file_paths, province_ids_by_layer, repainted_province_ids=frozenset()
+):
+    mod_id_blocks = {}
+    mod_layers = {}
+    for layer_index in range(1, len(layer_file_paths)):
+        mod_file_path = layer_file_paths[layer_index]
+        if not os.path.isfile(mod_file_path):
+            print(f"Mod locator file not found: {mod_file_path}. Skipping.")
+            continue
+        # Read the mod locator file and extract the id blocks for the specified province IDs
+        province_ids = province_ids_by_layer[layer_index]
+        id_blocks = extract_id_blocks(
+            mod_file_path, province_ids | repainted_province_ids, layer_index
+        )
+        for province_id in province_ids - id_blocks.keys():
+            mod_id_blocks[province_id] = None
+            mod_layers[province_id] = layer_index
+        for province_id, id_block in id_blocks.items():
+            mod_id_blocks[province_id] = id_block
+            mod_layers[province_id] = layer_index
+    return mod_id_blocks, mod_layers
+
+
+# Pattern of the id line that gets marked with " #Modded"
+MODDED_ID_PATTERN = re.compile(rb"(id\s*=\s*\d+)")
+
+
+# Function to extract the id blocks of the given ProvinceIDs from a mod
+# locator file, marked with the comment of the mod's layer
+@profiled("extract_id_blocks", locator_file_arg=0)
+def extract_id_blocks(locator_file_path, province_ids, layer=1):
+    import numpy as np
+
+    marker = rb"\1" + modded_marker(layer)
+    id_blocks = {}
+    index = index_locator_file(locator_file_path)
+    block_indexes = np.flatnonzero(
+        np.isin(index.province_ids, np.fromiter(province_ids, dtype=np.int64))
+    )
+    for province_id, block_bytes in zip(
+        index.province_ids[block_indexes].tolist(),
+        read_block_bytes(locator_file_path, index, block_indexes),
+    ):
+        # Add " #Modded" after id=xxx line
+        modded_block = MODDED_ID_PATTERN.sub(marker, block_bytes, count=1)
+        id_blocks[province_id] = modded_block
+    return id_blocks
+
+
+# A locator file merged from the base game and the mod, kept in memory
+# until it is written. segments are the pieces of the merged file in
+# order: (start, end) byte ranges of the base file (end None for the rest
+# of the file) or the bytes of mod id blocks. blocks lists every id block
+# of the merged file with the index of its segment and the layer of the
+# load order it was last taken from
+MergedLocatorFile = namedtuple(
+    "MergedLocatorFile", ["file_name", "base_path", "segments", "blocks"]
+)
+MergedBlock = namedtuple(
+    "MergedBlock", ["province_id", "is_modded", "segment_index", "layer"]
+)
+
+
+# Bytes put between inserted id blocks when the base file has no two
+# blocks to take them from
+DEFAULT_BLOCK_SEPARATOR = b"\n\t\t"
+
+
+# Function to get the bytes between the first two id blocks of a locator
+# file, to separate inserted blocks the same way
+def read_block_separator(locator_path, index):
+    if len(index.province_ids) >= 2:
+        first_end = int(index.ends[0])
+        with open(locator_path, "rb") as file:
+            file.seek(first_end)
+            separator = file.read(int(index.starts[1]) - first_end)
+        if separator and not separator.strip():
+            return separator
+    return DEFAULT_BLOCK_SEPARATOR
+
+
+# Function to merge the mod id blocks into a base game locator file in one
+# linear pass over its blocks: a mod block replaces the base block of its
+# ProvinceID, a None block deletes it (see extract_layer_id_blocks), and
+# the blocks of ProvinceIDs missing from the base file are inserted in
+# ascending order before the first base block with a higher ProvinceID.
+# mod_layers holds the layer of every mod id block, all blocks are from
+# the first mod without it
+@profiled(
+    "merge_locator_file",
+    count_items=lambda merged: len(merged.blocks),
+    locator_file_arg=0,
+)
+def merge_locator_file(base_file_path, mod_id_blocks, mod_layers=None):
+    log_blocks = verbose(VERBOSITY_BLOCKS)
+    console = []
+    segments = []
+    blocks = []
+    base_index = index_locator_file(base_file_path)
+    base_ids = set(base_index.province_ids.tolist())
+    inserts = sorted(
+        province_id
+        for province_id, mod_block in mod_id_blocks.items()
+        if mod_block is not None and province_id not in base_ids
+    )
+    if inserts and not base_ids:
+        print(f"Cannot insert id blocks into '{base_file_path}', it has no id blocks")
+        inserts = []
+    separator = read_block_separator(base_file_path, base_index) if inserts else b""
+
+    def insert_block(province_id):
+        if log_blocks:
+            console.append(f"Inserting id block {province_id}")
+        layer = mod_layers.get(province_id, 1) if mod_layers else 1
+        blocks.append(MergedBlock(province_id, True, len(segments), layer))
+        segments.append(mod_id_blocks[province_id])
+
+    position = 0
+    insert_index = 0
+    deleted_count = 0
+    # Set while the segments end with a separator of their own, after
+    # inserted blocks or after the file header when the first block was
+    # deleted. The bytes before the next block are then left out
+    ends_with_separator = False
+    for province_id, start, end, is_modded, layer in zip(
+        base_index.province_ids.tolist(),
+        base_index.starts.tolist(),
+        base_index.ends.tolist(),
+        base_index.is_modded.tolist(),
+        base_index.layers.tolist(),
+    ):
+        if insert_index < len(inserts) and inserts[insert_index] < province_id:
+            if not ends_with_separator:
+                segments.append((position, start))
+            while insert_index < len(inserts) and inserts[insert_index] < province_id:
+                insert_block(inserts[insert_index])
+                segments.append(separator)
+                insert_index += 1
+            ends_with_separator = True
+
+        mod_block = mod_id_blocks.get(province_id, False)
+        if mod_block is None:
+            if log_blocks:
+                console.append(f"Deleting id block {province_id}")
+            deleted_count += 1
+            if position == 0 and not ends_with_separator:
+                segments.append((0, start))
+                ends_with_separator = True
+            position = end
+            continue
+        if not ends_with_separator:
+            segments.append((position, start))
+        ends_with_separator = False
+        if mod_block is False:
+            blocks.append(MergedBlock(province_id, is_modded, len(segments), layer))
+            segments.append((start, end))
+        else:
+            if log_blocks:
+                console.append(f"Updating id block {province_id}")
+            layer = mod_layers.get(province_id, 1) if mod_layers else 1
+            blocks.append(MergedBlock(province_id, True, len(segments), layer))
+            segments.append(mod_block)
+        position = end
+
+    for province_id in inserts[insert_index:]:
+        if not ends_with_separator:
+            segments.append(separator)
+        insert_block(province_id)
+        ends_with_separator = False
+    if ends_with_separator and isinstance(segments[-1], bytes):
+        segments.pop()
+    segments.append((position, None))
+    if verbose(VERBOSITY_FILES) and (inserts or deleted_count):
+        console.append(
+            f"Inserted {len(inserts)} and deleted {deleted_count} id blocks "
+            f"in '{os.path.basename(base_file_path)}'"
+        )
+    print_lines(console)
+    return MergedLocatorFile(
+        os.path.basename(base_file_path), base_file_path, segments, blocks
+    )
+
+
+# Function to copy the bytes between two offsets of one file into another
+def copy_byte_range(source, target, start, end, chunk_size=1 << 20):
+    source.seek(start)
+    if end is None:
+        shutil.copyfileobj(source, target, chunk_size)
+        return
+    remaining = end - start
+    while remaining > 0:
+        chunk = source.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        target.write(chunk)
+        remaining -= len(chunk)
+
+
+# Function to write a file through a temporary file next to it, which is
+# renamed into place when it is complete. An interrupted run never
+# leaves a partly written file, and the file may be read while it is
+# being rewritten
+@contextlib.contextmanager
+def replace_file(path):
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            yield file
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# Function to write a merged locator file, leaving out the segments in
+# removed_segments. Adjacent base file ranges are copied in one go, so
+# only the mod blocks are ever held in memory. The output file may be
+# the base file itself
+@profiled("write_merged_locator_file", count_items=None, locator_file_arg=1)
+def write_merged_locator_file(merged, output_file_path, removed_segments=()):
+    with replace_file(output_file_path) as target, open(merged.base_path, "rb") as source:
+        pending = None  # base file range waiting to be copied
+        for index, segment in enumerate(merged.segments):
+            if index in removed_segments:
+                continue
+            if isinstance(segment, bytes):
+                if pending is not None:
+                    copy_byte_range(source, target, *pending)
+                    pending = None
+                target.write(segment)
+            elif pending is not None and pending[1] == segment[0]:
+                pending = (pending[0], segment[1])
+            else:
+                if pending is not None:
+                    copy_byte_range(source, target, *pending)
+                pending = segment
+        if pending is not None:
+            copy_byte_range(source, target, *pending)
+
+
+# Function to move id blocks of a merged locator file to new (x, y) image
+# coordinates, keyed by block index. image_height is the one the
+# coordinates were read with, see locator_image_height. The moved blocks
+# are kept in memory
+def move_merged_blocks(merged, blocks_to_move, image_height):
+    if not blocks_to_move:
+        return
+    with open(merged.base_path, "rb") as source:
+        for block_index, (x, y) in blocks_to_move.items():
+            segment_index = merged.blocks[block_index].segment_index
+            segment = merged.segments[segment_index]
+            if not isinstance(segment, bytes):
+                source.seek(segment[0])
+                segment = source.read(segment[1] - segment[0])
+            merged.segments[segment_index] = move_locator_block(segment, x, y, image_height)
+
+
+# Function to get the ProvinceIDs (ints) whose definition every mod of the
+# load order changed, from the definition diffs of step 1) or else from
+# new_definition.csv in output_dir. The list starts with None for the
+# base game. Returns None if a new_definition.csv is missing
+def read_layer_province_ids(layers, definition_diffs=None, output_dir=None):
+    province_ids_by_layer = [None]
+    for layer in layers[1:]:
+        if definition_diffs is not None:
+            province_ids = definition_diffs[layer.index - 1].province_ids
+        else:
+            # Get province IDs from new_definition.csv
+            definition_file = os.path.join(
+                output_dir or os.getcwd(), layer_file_name("new_definition.csv", layer.index)
+            )
+            if not os.path.isfile(definition_file):
+                print(f"'{definition_file}' not found.")
+                return None
+            province_ids = get_province_ids(definition_file)
+        province_ids_by_layer.append(province_ids)
+    return province_ids_by_layer
+
+
+# 3) Copy all locator files from base folder and replace/add locator IDs
+# from mod file, based on the differences from step 1). The ProvinceIDs
+# are read from new_definition.csv unless the definition diffs are
+# given. A missing new_definition.csv raises FileNotFoundError. With
+# several mods, the blocks of every mod are taken for the differences of
+# its layer, and a later mod overrides an earlier one. The blocks of the
+# repainted_province_ids (ints) are taken from every mod that has them
+# as well, for provinces the mods repainted without changing their
+# definition
+@profiled(
+    "3 locator_files",
+    count_items=lambda merged_files: sum(len(merged.blocks) for merged in merged_files),
+)
+def locator_files(
+    base_game_path,
+    mod_folders,
+    definition_diffs=None,
+    write_output=True,
+    output_dir=None,
+    repainted_province_ids=None,
+):
+    layers = load_order_layers(base_game_path, mod_folders)
+    province_ids_by_layer = read_layer_province_ids(layers, definition_diffs, output_dir)
+    if province_ids_by_layer is None:
+        raise FileNotFoundError("Step 3) needs new_definition.csv of step 1), run step 1) first")
+    repainted_province_ids = frozenset(repainted_province_ids or ())
+    for layer in layers[1:]:
+        province_ids = province_ids_by_layer[layer.index] | repainted_province_ids
+        print(f"Total province IDs to process from '{layer.name}': {len(province_ids)}")
+
+    # Process locator files
+    return create_updated_locator_files(
+        layers,
+        province_ids_by_layer,
+        discover_locator_files(layers),
+        write_output,
+        output_dir,
+        repainted_province_ids,
+    )
+
+
+# Function to parse mapdata CSV files
+def parse_mapdata(file_path):
+    import numpy as np
+
+    print(f"Parsing mapdata from '{file_path}'")
+    sections = {}
+    current_section = None
+    with open(file_path, "r", newline="", encoding="utf-8") as csvfile:
+        reader = csv.reader(csvfile, delimiter=";")
+        for row in reader:
+            if not row:
+                continue
+            if row[0].startswith("Locator File:"):
+                current_section = row[0].split(":", 1)[1].strip()
+                current_section = current_section.strip().lower()
+                if verbose(VERBOSITY_FILES):
+                    print(f"Found section '{current_section}'")
+                sections[current_section] = []
+                continue
+            if row[0] == "ProvinceID":
+                continue  # Skip header
+            if current_section:
+                try:
+                    values = [int(value) for value in row[:6]]
+                    # Sampled colors, missing in files of older versions
+                    sampled = None
+                    if len(row) >= 10:
+                        sampled = [int(value) for value in row[7:10]] if row[7] else [-1] * 3
+                    sections[current_section].append((values, row[6], sampled))
+                except Exception as e:
+                    print(
+                        f"Error parsing row {row} in section '{current_section}': {e}"
+                    )
+
+    # Build the tables, with the names of all sections in one pool
+    pool = {}
+    mapdata = {}
+    for section, rows in sections.items():
+        values = np.asarray([row[0] for row in rows], dtype=np.int64).reshape(-1, 6)
+        sampled = [row[2] for row in rows]
+        mapdata[section] = mapdata_table(
+            values[:, 0],
+            values[:, 1:4],
+            values[:, 4],
+            values[:, 5],
+            intern_names([row[1] for row in rows], pool),
+            None,
+            sampled if rows and None not in sampled else None,
+        )
+    names = list(pool)
+    return {section: table._replace(names=names) for section, table in mapdata.items()}
+
+
+# Status codes returned by verify_pixels
+PIXEL_MATCH = 0
+PIXEL_MISMATCH = 1
+PIXEL_OUT_OF_BOUNDS = 2
+
+
+# Decoded maps are cached as raw RGB .npy files in this folder, if set,
+# and memory-mapped instead of decoded again while the PNG is unchanged.
+# The .npy files take up to max_bytes together, the least recently used
+# entries are removed to make room for new ones
+MAP_CACHE_FOLDER = "map_cache"
+MAP_CACHE_MAX_MB = 1024
+map_cache_settings = {"folder": None, "max_bytes": MAP_CACHE_MAX_MB << 20}
+MAP_CACHE_VERSION = 1
+
+
+# Function to load an image as an RGB array of shape (height, width, 3),
+# memory-mapped from the map cache when it is enabled
+@profiled(
+    "load_image_array",
+    count_items=lambda image_array: image_array.shape[0] * image_array.shape[1],
+)
+def load_image_array(image_path):
+    if map_cache_settings["folder"] is not None:
+        return load_cached_map(image_path, map_cache_settings["folder"])
+    return decode_image(image_path)
+
+
+def decode_image(image_path):
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        if image.mode != "RGB":
+            # Grayscale, palette and alpha images are all compared as plain RGB
+            return np.asarray(image.convert("RGB"))
+        return np.asarray(image)
+
+
+# Function to get the (width, height) of an image without decoding it,
+# from the IHDR chunk at the start of a PNG file
+def read_image_size(image_path):
+    with open(image_path, "rb") as file:
+        header = file.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        return image.size
+
+
+# Function to get the paths of the .npy file and of the metadata of the
+# map cache entry of a PNG. An entry is keyed by the path of the PNG
+def map_cache_paths(image_path, cache_folder):
+    image_path = os.path.abspath(image_path)
+    path_hash = hashlib.blake2b(image_path.encode("utf-8"), digest_size=8).hexdigest()
+    entry_name = f"{os.path.splitext(os.path.basename(image_path))[0]}-{path_hash}"
+    return (
+        os.path.join(cache_folder, entry_name + ".npy"),
+        os.path.join(cache_folder, entry_name + ".json"),
+    )
+
+
+# Function to check if the map cache entry of a PNG is up to date. The
+# entry holds the size, modification time and hash of the PNG. It is used
+# as is while size and modification time are unchanged, and after
+# checking the hash when only those changed. The modification time of the
+# metadata marks when a valid entry was last used
+def is_map_cache_valid(image_path, array_path, meta_path):
+    stat = os.stat(image_path)
+    meta = None
+    if os.path.isfile(meta_path) and os.path.isfile(array_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            meta = None
+    if meta is None or meta.get("version") != MAP_CACHE_VERSION:
+        return False
+    valid = meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns
+    if not valid and meta["size"] == stat.st_size:
+        # Touched or copied, but maybe not changed
+        valid = meta["hash"] == hash_file(image_path)
+        if valid:
+            meta["mtime_ns"] = stat.st_mtime_ns
+            with open(meta_path, "w", encoding="utf-8") as file:
+                json.dump(meta, file)
+    if valid:
+        os.utime(meta_path)
+    return valid
+
+
+# Function to make room for a new map cache entry of entry_bytes: removes
+# the least recently used entries until all .npy files and the new one
+# fit into map_cache_settings["max_bytes"]. Entries that cannot be removed,
+# e.g. while they are memory-mapped on Windows, are left. Returns whether
+# the new entry fits
+def make_map_cache_room(cache_folder, entry_bytes):
+    max_bytes = map_cache_settings["max_bytes"]
+    if entry_bytes > max_bytes:
+        return False
+    entries = []
+    if os.path.isdir(cache_folder):
+        for entry in os.scandir(cache_folder):
+            if entry.name.endswith(".npy") and entry.is_file():
+                meta_path = os.path.splitext(entry.path)[0] + ".json"
+                last_used = os.stat(meta_path).st_mtime_ns if os.path.isfile(meta_path) else 0
+                entries.append((last_used, entry.path, entry.stat().st_size))
+    total_bytes = sum(size for _, _, size in entries) + entry_bytes
+    for _, array_path, size in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(array_path)
+        except OSError:
+            continue
+        meta_path = os.path.splitext(array_path)[0] + ".json"
+        if os.path.isfile(meta_path):
+            os.remove(meta_path)
+        total_bytes -= size
+        print(f"Removed least recently used map cache entry '{array_path}'")
+    return total_bytes <= max_bytes
+
+
+def write_map_cache_meta(image_path, meta_path):
+    stat = os.stat(image_path)
+    with open(meta_path, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "version": MAP_CACHE_VERSION,
+                "path": os.path.abspath(image_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "hash": hash_file(image_path),
+            },
+            file,
+        )
+
+
+# Function to load a map from the map cache, decoding the PNG and writing
+# the entry again when it is not up to date. The returned array is a
+# read-only memory map of the .npy file, so repeated runs and worker
+# processes share the pages of the operating system's file cache instead
+# of decoding a copy. A map that does not fit into the cache is returned
+# as decoded
+def load_cached_map(image_path, cache_folder):
+    import numpy as np
+
+    array_path, meta_path = map_cache_paths(image_path, cache_folder)
+    if is_map_cache_valid(image_path, array_path, meta_path):
+        try:
+            return np.load(array_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable map cache '{array_path}': {e}")
+
+    image_array = decode_image(image_path)
+    if not make_map_cache_room(cache_folder, image_array.nbytes):
+        return image_array
+    os.makedirs(cache_folder, exist_ok=True)
+    with replace_file(array_path) as file:
+        np.save(file, image_array)
+    write_map_cache_meta(image_path, meta_path)
+    print(f"Cached decoded map '{os.path.abspath(image_path)}' in '{array_path}'")
+    return np.load(array_path, mmap_mode="r")
+
+
+# A province map as the steps read it: its path (None for a map given
+# as an array), size and strip_rows, the rows of a strip or None for a map
+# decoded as a whole, with functions to read it. iter_strips(wanted=None)
+# yields the top row and the RGB array of every strip in wanted (strip
+# indexes, all if None), a map decoded as a whole being a single strip.
+# read_pixels(coordinates, expected_rgb) checks locator pixels like
+# verify_pixels. load_array() returns the whole RGB array, decoding it on
+# first use in strip mode
+MapSource = namedtuple(
+    "MapSource",
+    ["path", "width", "height", "strip_rows", "iter_strips", "read_pixels", "load_array"],
+)
+
+
+# Function to open a map for the steps that read its pixels. With
+# strip_rows, the map is not decoded as a whole but read one strip of
+# rows at a time, so memory grows with the strip size instead of the map
+# size. Returns a MapSource
+def open_map_source(image_path, strip_rows=None):
+    if strip_rows is None:
+        return map_source_from_array(load_image_array(image_path), image_path)
+    image_width, image_height = read_image_size(image_path)
+    image_array = None
+
+    def iter_strips(wanted=None):
+        return iter_map_strips(image_path, strip_rows, wanted)
+
+    def read_pixels(coordinates, expected_rgb):
+        return verify_pixels_in_strips(image_path, strip_rows, coordinates, expected_rgb)
+
+    def load_array():
+        nonlocal image_array
+        if image_array is None:
+            image_array = load_image_array(image_path)
+        return image_array
+
+    return MapSource(
+        image_path, image_width, image_height, strip_rows, iter_strips, read_pixels, load_array
+    )
+
+
+# Function to make a MapSource of a map already decoded into an RGB array
+def map_source_from_array(image_array, image_path=None):
+    image_height, image_width = image_array.shape[:2]
+
+    def iter_strips(wanted=None):
+        if wanted is None or 0 in wanted:
+            yield 0, image_array
+
+    def read_pixels(coordinates, expected_rgb):
+        return verify_pixels(image_array, coordinates, expected_rgb)
+
+    return MapSource(
+        image_path, image_width, image_height, None, iter_strips, read_pixels, lambda: image_array
+    )
+
+
+# Function to get the (width, height, channels) of a PNG that can be
+# decoded strip by strip, a non-interlaced 8-bit RGB or RGBA one, from its
+# IHDR chunk. Returns None for any other image
+def png_strip_layout(image_path):
+    with open(image_path, "rb") as file:
+        header = file.read(29)
+    if header[:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", header[16:29])
+    channels = {2: 3, 6: 4}.get(color_type)
+    if bit_depth != 8 or channels is None or interlace:
+        return None
+    return width, height, channels
+
+
+# Function to decode a PNG one strip of rows at a time, yielding the top
+# row and the RGB array of every strip. The image data is inflated
+# incrementally and every strip is unfiltered by the PNG decoder of
+# Pillow, after the last row of the strip before it, so the filters
+# that refer to the row above work across strips. Decoding stops after
+# the last strip in wanted (strip indexes), if given. The PNG must have a
+# png_strip_layout
+def iter_png_strips(image_path, strip_rows, wanted=None):
+    import numpy as np
+    from PIL import Image
+
+    image_width, image_height, channels = png_strip_layout(image_path)
+    mode = "RGB" if channels == 3 else "RGBA"
+    row_bytes = image_width * channels + 1
+    last_top = image_height - 1 if wanted is None else max(wanted, default=-1) * strip_rows
+    inflate = zlib.decompressobj()
+    pending = bytearray()
+    previous_row = b""
+    top = 0
+    with open(image_path, "rb") as file:
+        file.seek(8)
+        while top <= last_top:
+            chunk_header = file.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"Image data of '{image_path}' is truncated")
+            length, chunk_type = struct.unpack(">I4s", chunk_header)
+            data = file.read(length)
+            file.seek(4, os.SEEK_CUR)
+            if chunk_type == b"IEND":
+                raise ValueError(f"Image data of '{image_path}' is truncated")
+            if chunk_type != b"IDAT":
+                continue
+            while data and top <= last_top:
+                pending += inflate.decompress(data, strip_rows * row_bytes)
+                data = inflate.unconsumed_tail
+                while top <= last_top and len(pending) >= min(strip_rows, image_height - top) * row_bytes:
+                    rows = min(strip_rows, image_height - top)
+                    filtered = b"\0" + previous_row + pending[:rows * row_bytes] if previous_row else pending[:rows * row_bytes]
+                    del pending[:rows * row_bytes]
+                    strip_height = rows + bool(previous_row)
+                    strip = np.asarray(
+                        Image.frombytes(
+                            mode, (image_width, strip_height), zlib.compress(filtered, 0), "zip", mode
+                        )
+                    )
+                    previous_row = strip[-1].tobytes()
+                    if wanted is None or top // strip_rows in wanted:
+                        yield top, strip[strip_height - rows:, :, :3]
+                    top += rows
+
+
+# Function to get the .npy file of the map cache entry of a PNG, written
+# strip by strip when it is not up to date. Returns None if the map does
+# not fit into the cache
+def cache_map_in_strips(image_path, cache_folder, strip_rows):
+    import numpy as np
+
+    array_path, meta_path = map_cache_paths(image_path, cache_folder)
+    if is_map_cache_valid(image_path, array_path, meta_path):
+        return array_path
+    layout = png_strip_layout(image_path)
+    if layout is None:
+        print(f"Warning: '{image_path}' cannot be decoded in strips, decoding it as a whole")
+        load_cached_map(image_path, cache_folder)
+        return array_path if os.path.isfile(array_path) else None
+    image_width, image_height, _ = layout
+    if not make_map_cache_room(cache_folder, image_width * image_height * 3):
+        return None
+    os.makedirs(cache_folder, exist_ok=True)
+    with replace_file(array_path) as file:
+        np.lib.format.write_array_header_1_0(
+            file, {"descr": "|u1", "fortran_order": False, "shape": (image_height, image_width, 3)}
+        )
+        for _, strip in iter_png_strips(image_path, strip_rows):
+            file.write(np.ascontiguousarray(strip).tobytes())
+    write_map_cache_meta(image_path, meta_path)
+    print(f"Cached decoded map '{os.path.abspath(image_path)}' in '{array_path}'")
+    return array_path
+
+
+# Function to read an RGB array of a .npy file one strip of rows at a
+# time with plain reads, so only one strip is in memory, yielding the top
+# row and the array of every strip in wanted (all if None)
+def read_npy_strips(array_path, strip_rows, wanted=None):
+    import numpy as np
+
+    with open(array_path, "rb") as file:
+        if np.lib.format.read_magic(file) == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(file)
+        data_offset = file.tell()
+        image_height, image_width = shape[:2]
+        row_bytes = image_width * 3
+        for top in range(0, image_height, strip_rows):
+            if wanted is not None and top // strip_rows not in wanted:
+                continue
+            rows = min(strip_rows, image_height - top)
+            file.seek(data_offset + top * row_bytes)
+            strip = np.frombuffer(file.read(rows * row_bytes), dtype=np.uint8)
+            yield top, strip.reshape(rows, image_width, 3)
+
+
+# Function to read a map one strip of strip_rows rows at a time,
+# yielding the top row and the RGB array of every strip in wanted (strip
+# indexes, all if None). With the map cache, the strips are read from its
+# .npy file, otherwise the PNG is decoded on the fly
+def iter_map_strips(image_path, strip_rows, wanted=None):
+    array_path = None
+    if map_cache_settings["folder"] is not None:
+        array_path = cache_map_in_strips(image_path, map_cache_settings["folder"], strip_rows)
+    if array_path is not None:
+        yield from read_npy_strips(array_path, strip_rows, wanted)
+    elif png_strip_layout(image_path) is not None:
+        yield from iter_png_strips(image_path, strip_rows, wanted)
+    else:
+        print(f"Warning: '{image_path}' cannot be decoded in strips, decoding it as a whole")
+        image_array = decode_image(image_path)
+        for top in range(0, image_array.shape[0], strip_rows):
+            if wanted is None or top // strip_rows in wanted:
+                yield top, image_array[top:top + strip_rows]
+
+
+# Function to check many locator pixels at once: gathers the pixels at the
+# (x, y) coordinates and compares them with the expected RGB values.
+# Returns one status per locator and the RGB values actually found
+# (zeros for coordinates outside the image)
+@profiled("verify_pixels", count_items=lambda result: len(result[0]))
+def verify_pixels(image_array, coordinates, expected_rgb):
+    import numpy as np
+
+    coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 2)
+    expected_rgb = np.asarray(expected_rgb, dtype=np.int64).reshape(-1, 3)
+    image_height, image_width = image_array.shape[:2]
+    xs = coordinates[:, 0]
+    ys = coordinates[:, 1]
+
+    in_bounds = (xs >= 0) & (xs < image_width) & (ys >= 0) & (ys < image_height)
+    actual_rgb = np.zeros((len(coordinates), 3), dtype=np.uint8)
+    actual_rgb[in_bounds] = image_array[ys[in_bounds], xs[in_bounds]]
+
+    matches = (actual_rgb == expected_rgb).all(axis=1)
+    status = np.full(len(coordinates), PIXEL_OUT_OF_BOUNDS, dtype=np.uint8)
+    status[in_bounds] = np.where(matches[in_bounds], PIXEL_MATCH, PIXEL_MISMATCH)
+    return status, actual_rgb
+
+
+# Function to check locator pixels like verify_pixels, reading the map at
+# image_path in strips of strip_rows rows: the locators are sorted by
+# row, and only the strips holding any of them are read, each once
+@profiled("verify_pixels_in_strips", count_items=lambda result: len(result[0]))
+def verify_pixels_in_strips(image_path, strip_rows, coordinates, expected_rgb):
+    import numpy as np
+
+    coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 2)
+    expected_rgb = np.asarray(expected_rgb, dtype=np.int64).reshape(-1, 3)
+    image_width, image_height = read_image_size(image_path)
+    xs = coordinates[:, 0]
+    ys = coordinates[:, 1]
+
+    in_bounds = (xs >= 0) & (xs < image_width) & (ys >= 0) & (ys < image_height)
+    order = np.flatnonzero(in_bounds)
+    order = order[np.argsort(ys[order], kind="stable")]
+    strips = ys[order] // strip_rows
+    actual_rgb = np.zeros((len(coordinates), 3), dtype=np.uint8)
+    for top, strip in iter_map_strips(image_path, strip_rows, set(strips.tolist())):
+        start, end = np.searchsorted(strips, [top // strip_rows, top // strip_rows + 1])
+        rows = order[start:end]
+        actual_rgb[rows] = strip[ys[rows] - top, xs[rows]]
+
+    matches = (actual_rgb == expected_rgb).all(axis=1)
+    status = np.full(len(coordinates), PIXEL_OUT_OF_BOUNDS, dtype=np.uint8)
+    status[in_bounds] = np.where(matches[in_bounds], PIXEL_MATCH, PIXEL_MISMATCH)
+    return status, actual_rgb
+
+
+# Function to open the modded province map with open_map_source,
+# reporting its size
+def load_modded_image(image_path, strip_rows=None):
+    try:
+        modded_map = open_map_source(image_path, strip_rows)
+    except Exception:
+        print("Error loading image")
+        raise
+    if strip_rows is None:
+        print(f"Loaded image '{image_path}' with size {modded_map.width}x{modded_map.height}")
+    else:
+        print(
+            f"Reading image '{image_path}' with size {modded_map.width}x{modded_map.height} "
+            f"in strips of {strip_rows} rows"
+        )
+    return modded_map
+
+
+# Function to pack RGB values of shape (..., 3) into 24-bit integers
+def pack_rgb(rgb):
+    import numpy as np
+
+    rgb = np.asarray(rgb)
+    packed = rgb[..., 0].astype(np.uint32) << 16
+    packed |= rgb[..., 1].astype(np.uint32) << 8
+    packed |= rgb[..., 2].astype(np.uint32)
+    return packed
+
+
+# Function to unpack a 24-bit color into an (R, G, B) tuple
+def unpack_rgb(packed):
+    packed = int(packed)
+    return (packed >> 16, (packed >> 8) & 255, packed & 255)
+
+
+# Function to find the runs of equal values along the rows of a flattened
+# array with rows of the given width. Returns the index of the first
+# value of every run
+def find_row_runs(values, width):
+    import numpy as np
+
+    run_start_mask = np.empty(values.size, dtype=bool)
+    run_start_mask[0] = True
+    np.not_equal(values[1:], values[:-1], out=run_start_mask[1:])
+    run_start_mask[::width] = True
+    return np.flatnonzero(run_start_mask)
+
+
+# Every color of a province map, sorted by packed color, with its pixel
+# count, bounding box (left, top, right, bottom, all inclusive) and
+# centroid (x, y)
+ProvinceMapScan = namedtuple(
+    "ProvinceMapScan", ["colors", "pixel_counts", "bboxes", "centroids"]
+)
+
+
+# Function to scan a province map in one vectorized pass. Provinces are
+# long runs of one color along every row, so the statistics are summed
+# up per run instead of per pixel
+@profiled("scan_province_map", count_items=lambda scan: len(scan.colors))
+def scan_province_map(image_array):
+    import numpy as np
+
+    image_height, image_width = image_array.shape[:2]
+    packed = pack_rgb(image_array).ravel()
+
+    run_starts = find_row_runs(packed, image_width)
+    run_lengths = np.diff(run_starts, append=packed.size)
+    colors, run_colors = np.unique(packed[run_starts], return_inverse=True)
+
+    run_ys = run_starts // image_width
+    run_lefts = run_starts % image_width
+    run_rights = run_lefts + run_lengths - 1
+    color_count = len(colors)
+    pixel_counts = np.bincount(run_colors, weights=run_lengths, minlength=color_count)
+    x_sums = np.bincount(
+        run_colors, weights=(run_lefts + run_rights) * run_lengths / 2, minlength=color_count
+    )
+    y_sums = np.bincount(run_colors, weights=run_ys * run_lengths, minlength=color_count)
+
+    bboxes = np.empty((color_count, 4), dtype=np.int64)
+    bboxes[:, :2] = [image_width, image_height]
+    bboxes[:, 2:] = -1
+    np.minimum.at(bboxes[:, 0], run_colors, run_lefts)
+    np.minimum.at(bboxes[:, 1], run_colors, run_ys)
+    np.maximum.at(bboxes[:, 2], run_colors, run_rights)
+    np.maximum.at(bboxes[:, 3], run_colors, run_ys)
+
+    centroids = np.stack([x_sums, y_sums], axis=1) / pixel_counts[:, None]
+    return ProvinceMapScan(colors, pixel_counts.astype(np.int64), bboxes, centroids)
+
+
+# Function to update a map scan after the rows from top on changed from
+# old_rows to new_rows, scanning only those rows. Pixel counts and
+# centroids stay exact. Bounding boxes only grow: a province that lost
+# pixels keeps its old box
+def update_province_map_scan(scan, old_rows, new_rows, top):
+    import numpy as np
+
+    old_band = scan_province_map(old_rows)
+    new_band = scan_province_map(new_rows)
+    colors = np.union1d(scan.colors, new_band.colors)
+    rows = np.searchsorted(colors, scan.colors)
+    pixel_counts = np.zeros(len(colors), dtype=np.int64)
+    pixel_counts[rows] = scan.pixel_counts
+    sums = np.zeros((len(colors), 2))
+    sums[rows] = scan.centroids * scan.pixel_counts[:, None]
+    bboxes = np.empty((len(colors), 4), dtype=np.int64)
+    bboxes[:, :2] = np.iinfo(np.int64).max
+    bboxes[:, 2:] = -1
+    bboxes[rows] = scan.bboxes
+
+    for band, sign in ((old_band, -1), (new_band, 1)):
+        band_rows = np.searchsorted(colors, band.colors)
+        pixel_counts[band_rows] += sign * band.pixel_counts
+        band_sums = (band.centroids + [0, top]) * band.pixel_counts[:, None]
+        sums[band_rows] += sign * band_sums
+    band_rows = np.searchsorted(colors, new_band.colors)
+    band_bboxes = new_band.bboxes + [0, top, 0, top]
+    bboxes[band_rows, :2] = np.minimum(bboxes[band_rows, :2], band_bboxes[:, :2])
+    bboxes[band_rows, 2:] = np.maximum(bboxes[band_rows, 2:], band_bboxes[:, 2:])
+
+    keep = pixel_counts > 0
+    centroids = sums[keep] / pixel_counts[keep, None]
+    return ProvinceMapScan(colors[keep], pixel_counts[keep], bboxes[keep], centroids)
+
+
+# Function to combine the scans of the strips of a map into the scan of
+# the whole map. bands holds the top row and the scan of every strip
+def merge_province_map_scans(bands):
+    import numpy as np
+
+    if len(bands) == 1 and bands[0][0] == 0:
+        return bands[0][1]
+    tops = np.concatenate(
+        [np.full(len(band.colors), top, dtype=np.int64) for top, band in bands]
+    )
+    colors, rows = np.unique(
+        np.concatenate([band.colors for _, band in bands]), return_inverse=True
+    )
+    band_counts = np.concatenate([band.pixel_counts for _, band in bands])
+    band_centroids = np.concatenate([band.centroids for _, band in bands])
+    band_bboxes = np.concatenate([band.bboxes for _, band in bands])
+    band_bboxes[:, 1] += tops
+    band_bboxes[:, 3] += tops
+
+    pixel_counts = np.bincount(rows, weights=band_counts, minlength=len(colors))
+    x_sums = np.bincount(rows, weights=band_centroids[:, 0] * band_counts, minlength=len(colors))
+    y_sums = np.bincount(
+        rows, weights=(band_centroids[:, 1] + tops) * band_counts, minlength=len(colors)
+    )
+    bboxes = np.empty((len(colors), 4), dtype=np.int64)
+    bboxes[:, :2] = np.iinfo(np.int64).max
+    bboxes[:, 2:] = -1
+    np.minimum.at(bboxes[:, 0], rows, band_bboxes[:, 0])
+    np.minimum.at(bboxes[:, 1], rows, band_bboxes[:, 1])
+    np.maximum.at(bboxes[:, 2], rows, band_bboxes[:, 2])
+    np.maximum.at(bboxes[:, 3], rows, band_bboxes[:, 3])
+
+    centroids = np.stack([x_sums, y_sums], axis=1) / pixel_counts[:, None]
+    return ProvinceMapScan(colors, pixel_counts.astype(np.int64), bboxes, centroids)
+
+
+# Function to scan a MapSource strip by strip
+def scan_map(map_source):
+    return merge_province_map_scans(
+        [(top, scan_province_map(strip)) for top, strip in map_source.iter_strips()]
+    )
+
+
+# Rows of the maps compared at a time
+MAP_DIFF_STRIP_ROWS = 256
+
+
+# Function to find the rows that differ between two maps of the same size,
+# comparing a strip of rows at a time
+def find_changed_rows(old_array, new_array):
+    import numpy as np
+
+    changed_rows = []
+    for top in range(0, new_array.shape[0], MAP_DIFF_STRIP_ROWS):
+        bottom = top + MAP_DIFF_STRIP_ROWS
+        changed = np.any(old_array[top:bottom] != new_array[top:bottom], axis=(1, 2))
+        changed_rows.extend((np.flatnonzero(changed) + top).tolist())
+    return changed_rows
+
+
+# Difference between two province maps: every packed color whose pixel
+# footprint changed, sorted, with the number of pixels it lost and gained,
+# and the number of pixels that changed in total
+MapDiff = namedtuple("MapDiff", ["colors", "pixels_lost", "pixels_gained", "changed_pixels"])
+
+
+# Function to diff two province maps, given as MapSources with the same
+# strip_rows. Maps of the same size are read in lockstep, one strip of
+# both at a time, and only the rows that differ are compared pixel by
+# pixel. Maps of different sizes are compared as if every pixel changed
+@profiled("diff_province_maps", count_items=lambda map_diff: len(map_diff.colors))
+def diff_province_maps(base_map, modded_map):
+    lost = []
+    gained = []
+    if (base_map.width, base_map.height) != (modded_map.width, modded_map.height):
+        lost.extend(pack_rgb(strip).ravel() for _, strip in base_map.iter_strips())
+        gained.extend(pack_rgb(strip).ravel() for _, strip in modded_map.iter_strips())
+        return map_diff_from_pixels(lost, gained)
+    for (_, base_strip), (_, modded_strip) in zip(
+        base_map.iter_strips(), modded_map.iter_strips()
+    ):
+        changed_rows = find_changed_rows(base_strip, modded_strip)
+        for start in range(0, len(changed_rows), MAP_DIFF_STRIP_ROWS):
+            rows = changed_rows[start:start + MAP_DIFF_STRIP_ROWS]
+            base_packed = pack_rgb(base_strip[rows])
+            modded_packed = pack_rgb(modded_strip[rows])
+            changed = base_packed != modded_packed
+            lost.append(base_packed[changed])
+            gained.append(modded_packed[changed])
+    return map_diff_from_pixels(lost, gained)
+
+
+# Function to count the pixels every color lost and gained, from the
+# packed colors of all changed pixels before (lost) and after (gained),
+# as lists of arrays
+def map_diff_from_pixels(lost, gained):
+    import numpy as np
+
+    lost = np.concatenate(lost) if lost else np.zeros(0, dtype=np.uint32)
+    gained = np.concatenate(gained) if gained else np.zeros(0, dtype=np.uint32)
+
+    lost_colors, lost_counts = np.unique(lost, return_counts=True)
+    gained_colors, gained_counts = np.unique(gained, return_counts=True)
+    colors = np.union1d(lost_colors, gained_colors)
+    pixels_lost = np.zeros(len(colors), dtype=np.int64)
+    pixels_lost[np.searchsorted(colors, lost_colors)] = lost_counts
+    pixels_gained = np.zeros(len(colors), dtype=np.int64)
+    pixels_gained[np.searchsorted(colors, gained_colors)] = gained_counts
+    return MapDiff(colors, pixels_lost, pixels_gained, len(lost))
+
+
+# Function to get the provinces whose pixel footprint changed, with the
+# number of pixels they lost and gained. Colors that were lost are looked
+# up in the definition of the base map, colors that were gained in the
+# one of the modded map, both as returned by definition_colors. Colors
+# without a definition entry are left out
+def changed_map_provinces(map_diff, base_definition, modded_definition):
+    changed = {}
+    for definition, pixel_counts in (
+        (base_definition, map_diff.pixels_lost),
+        (modded_definition, map_diff.pixels_gained),
+    ):
+        province_by_color = {
+            (r << 16) | (g << 8) | b: province_id
+            for province_id, ((r, g, b), _) in definition.items()
+            if province_id != 0
+        }
+        for color, pixel_count in zip(map_diff.colors.tolist(), pixel_counts.tolist()):
+            province_id = province_by_color.get(color)
+            if pixel_count and province_id is not None:
+                changed[province_id] = changed.get(province_id, 0) + pixel_count
+    return changed
+
+
+# Function to write the map diff to a CSV file: one row per changed color
+# with the province it belongs to in the base and the modded definition
+def write_map_diff_csv(output_path, map_diff, base_definition, modded_definition):
+    base_provinces = {rgb: province_id for province_id, (rgb, _) in base_definition.items()}
+    modded_provinces = {rgb: province_id for province_id, (rgb, _) in modded_definition.items()}
+    with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
+        csv_writer = csv.writer(csvfile, delimiter=";")
+        csv_writer.writerow(
+            ["R", "G", "B", "BaseProvinceID", "ModdedProvinceID", "PixelsLost", "PixelsGained"]
+        )
+        for color, pixels_lost, pixels_gained in zip(
+            map_diff.colors.tolist(), map_diff.pixels_lost.tolist(), map_diff.pixels_gained.tolist()
+        ):
+            rgb = unpack_rgb(color)
+            csv_writer.writerow(
+                list(rgb)
+                + [base_provinces.get(rgb, ""), modded_provinces.get(rgb, "")]
+                + [pixels_lost, pixels_gained]
+            )
+
+
+# Function to find the provinces the mods repainted: diffs provinces.png
+# of the base game against the modded map and looks the changed colors up
+# in definition.csv of the base game and of the last mod. map_diff.csv is
+# written to the output folder when write_output is on. With strip_rows,
+# both maps are read in strips of that many rows. Returns the changed
+# pixel count of every changed ProvinceID (ints)
+def find_repainted_provinces(
+    base_game_folder, mod_folders, image_path, write_output=True, output_dir=None, strip_rows=None
+):
+    layers = load_order_layers(base_game_folder, mod_folders)
+    base_definition = definition_colors(
+        read_definition_csv(os.path.join(base_game_folder, "map_data", "definition.csv"))
+    )
+    if layers[-1].definition_folder == base_game_folder:
+        modded_definition = base_definition
+    else:
+        modded_definition = definition_colors(
+            read_definition_csv(
+                os.path.join(layers[-1].definition_folder, "map_data", "definition.csv")
+            )
+        )
+    base_map = open_map_source(
+        os.path.join(base_game_folder, "map_data", "provinces.png"), strip_rows
+    )
+    map_diff = diff_province_maps(base_map, load_modded_image(image_path, strip_rows))
+    changed = changed_map_provinces(map_diff, base_definition, modded_definition)
+    print(
+        f"{map_diff.changed_pixels} pixels changed on the modded map, "
+        f"{len(changed)} provinces repainted"
+    )
+    if write_output:
+        output_folder = os.path.join(output_dir or os.getcwd(), "output")
+        os.makedirs(output_folder, exist_ok=True)
+        output_path = os.path.join(output_folder, "map_diff.csv")
+        write_map_diff_csv(output_path, map_diff, base_definition, modded_definition)
+        print(f"Map diff written to '{output_path}'")
+    return changed
+
+
+# Function to get the color and name of every province of a province
+# table, keyed by ProvinceID (int)
+def definition_colors(table):
+    return {
+        province_id: (tuple(rgb), table.names[name_index])
+        for province_id, rgb, name_index in zip(
+            table.ids.tolist(), table.rgb.tolist(), table.name_indices.tolist()
+        )
+    }
+
+
+# Function to get the color and name of every province with a locator
+# from the mapdata of every layer, when definition.csv of the mod is not
+# available. Entries of later layers take precedence
+def definition_colors_from_mapdata(mapdata_layers):
+    definition = {}
+    for mapdata in mapdata_layers:
+        for table in mapdata.values():
+            definition.update(definition_colors(table))
+    return definition
+
+
+# Index of the modded province map: the map scan, the province of every
+# defined color (packed color -> ProvinceID), the scan row of every
+# color, the definition it was built from ({ProvinceID: ((R, G, B),
+# name)}), the ProvinceIDs that are not on the map and the scan rows of
+# the colors on the map that are not in the definition. The color of
+# ProvinceID 0, the placeholder line at the top of definition.csv, is
+# defined but never missing from the map. complete is False when the
+# definition only covers provinces with locators
+ProvinceColorIndex = namedtuple(
+    "ProvinceColorIndex",
+    [
+        "scan",
+        "province_by_color",
+        "row_by_color",
+        "definition",
+        "missing_provinces",
+        "undefined_colors",
+        "complete",
+    ],
+)
+
+
+# Function to join a map scan with the province definitions
+def build_province_color_index(scan, definition, complete=True):
+    province_by_color = {
+        (r << 16) | (g << 8) | b: province_id
+        for province_id, ((r, g, b), _) in definition.items()
+    }
+    row_by_color = {color: row for row, color in enumerate(scan.colors.tolist())}
+
+    missing_provinces = sorted(
+        province_id
+        for color, province_id in province_by_color.items()
+        if color not in row_by_color and province_id != 0
+    )
+    undefined_colors = []
+    if complete:
+        undefined_colors = [
+            row for color, row in row_by_color.items() if color not in province_by_color
+        ]
+    return ProvinceColorIndex(
+        scan,
+        province_by_color,
+        row_by_color,
+        definition,
+        missing_provinces,
+        undefined_colors,
+        complete,
+    )
+
+
+# Function to describe the province of a color on the modded map
+def describe_color(color_index, rgb):
+    province_id = color_index.province_by_color.get(int(pack_rgb(rgb)))
+    if province_id is None:
+        return "a color not in definition.csv"
+    return f"ProvinceID {province_id} ({color_index.definition[province_id][1]})"
+
+
+# Function to write the findings of the map itself: provinces of the
+# definition that are not on the map, and colors on the map that are not
+# in the definition. They are also passed to report, if given. Returns
+# the number of findings
+def report_map_findings(color_index, output_file, report=None):
+    scan = color_index.scan
+    for province_id in color_index.missing_provinces:
+        rgb, province_name = color_index.definition[province_id]
+        output_file.write(f"ProvinceID {province_id} ({province_name}) is not on the modded map\n")
+        if report is not None:
+            report(
+                Finding(
+                    province_id=province_id,
+                    province_name=province_name,
+                    kind=FINDING_NOT_ON_MAP,
+                    expected_rgb=rgb,
+                )
+            )
+    for row in color_index.undefined_colors:
+        left, top, right, bottom = scan.bboxes[row].tolist()
+        x, y = scan.centroids[row].tolist()
+        rgb = unpack_rgb(scan.colors[row])
+        output_file.write(
+            f"RGB {rgb} is on the modded map ({scan.pixel_counts[row]} pixels "
+            f"in ({left}, {top})-({right}, {bottom}), centroid ({x:.0f}, {y:.0f})) but not in definition.csv\n"
+        )
+        if report is not None:
+            report(
+                Finding(kind=FINDING_UNDEFINED_COLOR, actual_rgb=rgb, x=round(x), y=round(y))
+            )
+    finding_count = len(color_index.missing_provinces) + len(color_index.undefined_colors)
+    print(
+        f"{len(color_index.missing_provinces)} provinces not on the modded map, "
+        f"{len(color_index.undefined_colors)} map colors not in definition.csv"
+    )
+    if not color_index.complete:
+        print("No definition.csv of the mod given, map colors were not checked against it")
+    return finding_count
+
+
+# Ways to move a mismatched locator into its province: to the nearest
+# pixel at least RELOCATION_MARGIN pixels inside the province, or to its
+# center, the point farthest from its border
+FIX_MODES = ("nearest", "center")
+RELOCATION_MARGIN = 3
+
+
+# Function to get the distance of every True pixel of a mask to the
+# nearest False pixel or edge of the mask along its row, 0 for False pixels
+def row_run_distance(mask):
+    import numpy as np
+
+    height, width = mask.shape
+    flat = mask.ravel()
+    run_starts = find_row_runs(flat, width)
+    run_ends = np.append(run_starts[1:], flat.size) - 1
+    run_ids = np.repeat(np.arange(len(run_starts)), np.diff(run_starts, append=flat.size))
+    indices = np.arange(flat.size)
+    distance = np.minimum(indices - run_starts[run_ids], run_ends[run_ids] - indices) + 1
+    distance[~flat] = 0
+    return distance.reshape(height, width)
+
+
+# Function to get the interior distance of every pixel of a province on
+# its bounding box: the distance to the border along the row or column,
+# whichever is shorter. Its maximum approximates the pole of
+# inaccessibility of the province
+def province_interior_distance(image_array, scan, row):
+    import numpy as np
+
+    left, top, right, bottom = scan.bboxes[row].tolist()
+    mask = pack_rgb(image_array[top:bottom + 1, left:right + 1]) == scan.colors[row]
+    return np.minimum(row_run_distance(mask), row_run_distance(mask.T).T)
+
+
+# Function to make the function moving mismatched locators for
+# check_locator_blocks. It takes the expected RGB and the (x, y) image
+# coordinates of a locator and returns the new coordinates inside the
+# province of that color, or None if the color is not on the map. The
+# interior distance of a province is computed once, on first use.
+# get_image_array returns the modded map, so it is only decoded when
+# there is something to move
+def make_locator_relocator(get_image_array, color_index, fix_mode):
+    import numpy as np
+
+    scan = color_index.scan
+    interior_distances = {}
+
+    def relocate(expected_rgb, x, y):
+        row = color_index.row_by_color.get(int(pack_rgb(expected_rgb)))
+        if row is None:
+            return None
+        if row not in interior_distances:
+            interior_distances[row] = province_interior_distance(get_image_array(), scan, row)
+        distance = interior_distances[row]
+        left, top = scan.bboxes[row, :2].tolist()
+        if fix_mode == "center":
+            y_offset, x_offset = np.unravel_index(np.argmax(distance), distance.shape)
+        else:
+            ys, xs = np.nonzero(distance >= min(RELOCATION_MARGIN, distance.max()))
+            nearest = np.argmin((xs + left - x) ** 2 + (ys + top - y) ** 2)
+            y_offset, x_offset = ys[nearest], xs[nearest]
+        return (left + int(x_offset), top + int(y_offset))
+
+    return relocate
+
+
+# Number of locators whose window is gathered at once by
+# border_distance_classes, to bound the memory of large margins
+BORDER_BATCH_SIZE = 1 << 16
+
+
+# Function to get the distance-to-border class of every locator: the ring
+# of the (2 * margin + 1) sized square window around its pixel holding the
+# nearest pixel of a foreign color, 0 if the pixel itself has a foreign
+# color or is out of bounds, and margin + 1 if the whole window has the
+# expected color. The window is clamped to the image, as the map edge is
+# not a province border. The windows of a batch of locators are read with
+# one gather over the flattened image
+def border_distance_classes(image_array, coordinates, expected_rgb, margin):
+    import numpy as np
+
+    coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 2)
+    expected_rgb = np.asarray(expected_rgb, dtype=np.uint8).reshape(-1, 3)
+    image_height, image_width = image_array.shape[:2]
+    pixels = image_array.reshape(-1, 3)
+    offsets = np.arange(-margin, margin + 1)
+    window_size = len(offsets)
+    rings = np.maximum(np.abs(offsets)[:, None], np.abs(offsets)[None, :]).ravel()
+    rings = rings.astype(np.int16)
+
+    classes = np.zeros(len(coordinates), dtype=np.int16)
+    for start in range(0, len(coordinates), BORDER_BATCH_SIZE):
+        xs = coordinates[start:start + BORDER_BATCH_SIZE, 0]
+        ys = coordinates[start:start + BORDER_BATCH_SIZE, 1]
+        in_bounds = (xs >= 0) & (xs < image_width) & (ys >= 0) & (ys < image_height)
+        row_starts = np.clip(ys[in_bounds, None] + offsets, 0, image_height - 1) * image_width
+        columns = np.clip(xs[in_bounds, None] + offsets, 0, image_width - 1)
+        indices = (row_starts[:, :, None] + columns[:, None, :]).reshape(-1, window_size**2)
+        window = np.take(pixels, indices, axis=0)
+        expected = expected_rgb[start:start + BORDER_BATCH_SIZE][in_bounds, None, :]
+        foreign = window[:, :, 0] != expected[:, :, 0]
+        foreign |= window[:, :, 1] != expected[:, :, 1]
+        foreign |= window[:, :, 2] != expected[:, :, 2]
+        batch_classes = np.where(foreign, rings, np.int16(margin + 1)).min(axis=1)
+        classes[start:start + BORDER_BATCH_SIZE][in_bounds] = batch_classes
+    return classes
+
+
+# position={ x height z } of a locator block
+LOCATOR_POSITION_PATTERN = re.compile(
+    rb"(position\s*=\s*\{\s*)([^\s{}]+)(\s+[^\s{}]+\s+)([^\s{}]+)"
+)
+
+
+# Function to set the position of a locator block to the (x, y) image
+# coordinates. z is inverted with the image height the way
+# read_locator_file reads it. Both values are offset by half a pixel, so
+# reading the block back gives the same coordinates. The height is kept
+def move_locator_block(block_bytes, x, y, image_height):
+    position = (b"%.6f" % (x + 0.5), b"%.6f" % (image_height - y + 0.5))
+    return LOCATOR_POSITION_PATTERN.sub(
+        lambda match: match.group(1) + position[0] + match.group(3) + position[1],
+        block_bytes,
+        count=1,
+    )
+
+
+# Function to hash the content of a file
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Function to get the folder of the script, or of the executable when
+# running as a PyInstaller executable
+def get_script_dir():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+# Structured report of the findings, next to output.txt: one record per
+# finding as JSON lines and as CSV, and a summary per province
+FINDINGS_JSONL_FILE = "findings.jsonl"
+FINDINGS_CSV_FILE = "findings.csv"
+FINDINGS_SUMMARY_FILE = "findings_by_province.csv"
+LOCATOR_COVERAGE_FILE = "locator_coverage.csv"
+
+# Kinds of findings
+FINDING_MISSING_LOCATOR_FILE = "locator_file_not_in_mapdata"
+FINDING_MISSING_PROVINCE = "province_not_in_mapdata"
+FINDING_OUT_OF_BOUNDS = "out_of_bounds"
+FINDING_MISMATCH = "mismatch"
+FINDING_NOT_ON_MAP = "province_not_on_map"
+FINDING_UNDEFINED_COLOR = "color_not_in_definition"
+FINDING_TOO_CLOSE = "too_close"
+FINDING_DUPLICATE_ID = "duplicate_id"
+FINDING_NEAR_BORDER = "near_border"
+FINDING_NO_LOCATOR = "no_locator"
+FINDING_NOT_IN_DEFINITION = "province_not_in_definition"
+
+# One finding. Fields that do not apply to a kind are None: the map
+# findings have no locator file, and the coordinates of a map color are
+# its centroid. All fields default to None. action is "removed", "moved"
+# (to new_position) or None when the locator file is not changed.
+# found_province_id is the province the locator is actually in, for
+# mismatches, or the province of the other locator, for locators too
+# close to each other. layer is the layer of the load order the id block
+# was last taken from, 0 for the base game. border_distance is the
+# distance-to-border class of a locator near a foreign color (see
+# border_distance_classes)
+Finding = namedtuple(
+    "Finding",
+    [
+        "locator_file",
+        "province_id",
+        "province_name",
+        "kind",
+        "expected_rgb",
+        "actual_rgb",
+        "x",
+        "y",
+        "is_modded",
+        "action",
+        "new_position",
+        "found_province_id",
+        "layer",
+        "border_distance",
+    ],
+    defaults=(None,) * 14,
+)
+FINDING_CSV_HEADER = [
+    "LocatorFile",
+    "ProvinceID",
+    "ProvinceName",
+    "Kind",
+    "ExpectedR",
+    "ExpectedG",
+    "ExpectedB",
+    "ActualR",
+    "ActualG",
+    "ActualB",
+    "X",
+    "Y",
+    "Modded",
+    "Action",
+    "NewX",
+    "NewY",
+    "FoundProvinceID",
+    "Layer",
+    "BorderDistance",
+]
+
+
+def finding_to_csv_row(finding):
+    def columns(values, count):
+        return ["" if values is None else value for value in values or [None] * count]
+
+    return (
+        [finding.locator_file or "", finding.province_id, finding.province_name or "", finding.kind]
+        + columns(finding.expected_rgb, 3)
+        + columns(finding.actual_rgb, 3)
+        + columns([finding.x, finding.y], 2)
+        + ["" if finding.is_modded is None else int(finding.is_modded), finding.action or ""]
+        + columns(finding.new_position, 2)
+        + ["" if finding.found_province_id is None else finding.found_province_id]
+        + ["" if finding.layer is None else finding.layer]
+        + ["" if finding.border_distance is None else finding.border_distance]
+    )
+
+
+# Function to write the summary per province: the number of findings in
+# total, per kind, per action and per locator file
+def write_findings_summary(summary_path, summary):
+    kinds = sorted({kind for entry in summary.values() for kind in entry["kinds"]})
+    locator_files = sorted({name for entry in summary.values() for name in entry["locator_files"]})
+    with open(summary_path, "w", newline="", encoding="utf-8") as csvfile:
+        csv_writer = csv.writer(csvfile, delimiter=";")
+        csv_writer.writerow(
+            ["ProvinceID", "ProvinceName", "Findings", "Removed", "Moved"] + kinds + locator_files
+        )
+        for province_id in sorted(summary):
+            entry = summary[province_id]
+            csv_writer.writerow(
+                [province_id, entry["name"], entry["findings"]]
+                + [entry["actions"].get("removed", 0), entry["actions"].get("moved", 0)]
+                + [entry["kinds"].get(kind, 0) for kind in kinds]
+                + [entry["locator_files"].get(name, 0) for name in locator_files]
+            )
+
+
+# Function to open the structured report in output_dir. Yields the
+# function to report a Finding with, which writes it to the JSON lines
+# and CSV files right away. Only the counts per province are kept, for
+# the summary written at the end
+@contextlib.contextmanager
+def open_findings_report(output_dir):
+    summary = {}
+    with open(
+        os.path.join(output_dir, FINDINGS_JSONL_FILE),
+        "w",
+        encoding="utf-8",
+        buffering=REPORT_BUFFER_SIZE,
+    ) as jsonl_file, open(
+        os.path.join(output_dir, FINDINGS_CSV_FILE),
+        "w",
+        newline="",
+        encoding="utf-8",
+        buffering=REPORT_BUFFER_SIZE,
+    ) as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=";")
+        csv_writer.writerow(FINDING_CSV_HEADER)
+
+        def report(finding):
+            jsonl_file.write(json.dumps(finding._asdict()) + "\n")
+            csv_writer.writerow(finding_to_csv_row(finding))
+            if finding.province_id is None:
+                return
+            entry = summary.get(finding.province_id)
+            if entry is None:
+                entry = summary[finding.province_id] = {
+                    "name": finding.province_name or "",
+                    "findings": 0,
+                    "kinds": {},
+                    "actions": {},
+                    "locator_files": {},
+                }
+            entry["findings"] += 1
+            entry["kinds"][finding.kind] = entry["kinds"].get(finding.kind, 0) + 1
+            if finding.action:
+                entry["actions"][finding.action] = entry["actions"].get(finding.action, 0) + 1
+            if finding.locator_file:
+                entry["locator_files"][finding.locator_file] = (
+                    entry["locator_files"].get(finding.locator_file, 0) + 1
+                )
+
+        yield report
+    write_findings_summary(os.path.join(output_dir, FINDINGS_SUMMARY_FILE), summary)
+
+
+# The mapdata of their layers joined to the id blocks of a locator file,
+# one entry per block: rows is the row of the block's province in the
+# mapdata table of its layer, -1 if the province is missing there and -2
+# if the layer has no table for the locator file. rgb, x and y are the
+# expected color and the coordinates, names the province names (zeros
+# and None where the row is missing)
+MapdataJoin = namedtuple("MapdataJoin", ["rows", "rgb", "x", "y", "names"])
+
+
+# Function to join the id blocks of a locator file with the mapdata of
+# their layers, with one sorted search per layer
+def join_mapdata(mapdata_layers, locator_key, blocks):
+    import numpy as np
+
+    block_count = len(blocks)
+    province_ids = np.fromiter(
+        (block.province_id for block in blocks), dtype=np.int64, count=block_count
+    )
+    block_layers = np.fromiter((block.layer for block in blocks), dtype=np.int64, count=block_count)
+    rows = np.full(block_count, -2, dtype=np.int64)
+    rgb = np.zeros((block_count, 3), dtype=np.uint8)
+    x = np.zeros(block_count, dtype=np.int32)
+    y = np.zeros(block_count, dtype=np.int32)
+    names = [None] * block_count
+    for layer in np.unique(block_layers).tolist():
+        table = None
+        if layer < len(mapdata_layers):
+            table = mapdata_layers[layer].get(locator_key)
+        if table is None:
+            continue
+        indices = np.flatnonzero(block_layers == layer)
+        layer_rows = find_province_rows(table, province_ids[indices])
+        rows[indices] = layer_rows
+        found = layer_rows >= 0
+        indices = indices[found]
+        layer_rows = layer_rows[found]
+        rgb[indices] = table.rgb[layer_rows]
+        x[indices] = table.x[layer_rows]
+        y[indices] = table.y[layer_rows]
+        for block_index, name_index in zip(
+            indices.tolist(), table.name_indices[layer_rows].tolist()
+        ):
+            names[block_index] = table.names[name_index]
+    return MapdataJoin(rows, rgb, x, y, names)
+
+
+# Locators of one merged locator file as kept after step 4), for the
+# spacing checks: ProvinceID, layer, (x, y) and province name of every id
+# block with a known position, and the number of id blocks of every
+# ProvinceID that occurs more than once in the file
+LocatorPositions = namedtuple(
+    "LocatorPositions",
+    ["locator_file", "province_ids", "layers", "x", "y", "names", "duplicate_ids"],
+)
+
+
+# Function to get the positions of the id blocks of a merged locator file
+# from their mapdata join. The blocks_to_remove are left out and the
+# blocks_to_move are at their new position, as returned by
+# check_locator_blocks
+def kept_locator_positions(locator_file, blocks, join, blocks_to_remove=(), blocks_to_move=None):
+    import numpy as np
+
+    block_count = len(blocks)
+    province_ids = np.fromiter(
+        (block.province_id for block in blocks), dtype=np.int64, count=block_count
+    )
+    block_layers = np.fromiter((block.layer for block in blocks), dtype=np.int64, count=block_count)
+    unique_ids, counts = np.unique(province_ids, return_counts=True)
+    duplicate_ids = dict(zip(unique_ids[counts > 1].tolist(), counts[counts > 1].tolist()))
+
+    keep = join.rows >= 0
+    keep[np.asarray(blocks_to_remove, dtype=np.int64)] = False
+    x = join.x.astype(np.int64)
+    y = join.y.astype(np.int64)
+    for block_index, (new_x, new_y) in (blocks_to_move or {}).items():
+        x[block_index] = new_x
+        y[block_index] = new_y
+    indices = np.flatnonzero(keep)
+    return LocatorPositions(
+        locator_file,
+        province_ids[indices],
+        block_layers[indices],
+        x[indices],
+        y[indices],
+        [join.names[block_index] for block_index in indices.tolist()],
+        duplicate_ids,
+    )
+
+
+# Function to find all pairs of points closer than distance to each other
+# with a uniform grid of cells of that size: points are sorted by cell, and
+# only the points of the same and of the neighboring cells are compared.
+# Returns the indexes of both points of every pair and their distance
+def find_close_pairs(x, y, distance):
+    import numpy as np
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    no_pairs = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+    if len(x) < 2:
+        return no_pairs
+    cell_x = np.floor(x / distance).astype(np.int64)
+    cell_y = np.floor(y / distance).astype(np.int64)
+    cell_x -= cell_x.min()
+    cell_y -= cell_y.min() - 1
+    # Neighboring rows of cells never wrap into each other
+    stride = int(cell_y.max()) + 2
+    keys = cell_x * stride + cell_y
+    order = np.argsort(keys, kind="stable")
+    cells, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    firsts = []
+    seconds = []
+    # Every pair of neighboring cells is visited once
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        neighbors = cells + dx * stride + dy
+        positions = np.minimum(np.searchsorted(cells, neighbors), len(cells) - 1)
+        found = np.flatnonzero(cells[positions] == neighbors)
+        first_cells = found
+        second_cells = positions[found]
+        sizes = counts[first_cells] * counts[second_cells]
+        total = int(sizes.sum())
+        if total == 0:
+            continue
+        pair_cells = np.repeat(np.arange(len(sizes)), sizes)
+        offsets = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        second_counts = counts[second_cells][pair_cells]
+        first = starts[first_cells][pair_cells] + offsets // second_counts
+        second = starts[second_cells][pair_cells] + offsets % second_counts
+        if dx == 0 and dy == 0:
+            same = first < second
+            first = first[same]
+            second = second[same]
+        firsts.append(order[first])
+        seconds.append(order[second])
+    if not firsts:
+        return no_pairs
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    distances = np.hypot(x[first] - x[second], y[first] - y[second])
+    close = distances < distance
+    return first[close], second[close], distances[close]
+
+
+# Function to report the duplicate ids within every locator file and the
+# pairs of locators closer than min_distance pixels to each other: in
+# the same province across locator files, or of different provinces.
+# locator_positions holds the LocatorPositions of every file. Findings
+# are written to output_file and passed to report, as in
+# check_locator_blocks. Duplicate ids are left to the coverage report
+# without report_duplicates. Returns the number of findings
+def report_spacing_findings(
+    locator_positions,
+    min_distance,
+    output_file,
+    report=None,
+    layer_names=None,
+    report_duplicates=True,
+):
+    import numpy as np
+
+    duplicate_count = 0
+    for positions in locator_positions if report_duplicates else ():
+        for province_id, block_count in sorted(positions.duplicate_ids.items()):
+            duplicate_count += 1
+            output_file.write(
+                f"ProvinceID {province_id} has {block_count} id blocks in '{positions.locator_file}'\n"
+            )
+            if report is not None:
+                report(
+                    Finding(
+                        locator_file=positions.locator_file,
+                        province_id=province_id,
+                        kind=FINDING_DUPLICATE_ID,
+                    )
+                )
+
+    file_indices = np.repeat(
+        np.arange(len(locator_positions)),
+        [len(positions.province_ids) for positions in locator_positions],
+    )
+    province_ids = np.concatenate(
+        [positions.province_ids for positions in locator_positions] + [np.zeros(0, dtype=np.int64)]
+    )
+    xs = np.concatenate([positions.x for positions in locator_positions] + [np.zeros(0, dtype=np.int64)])
+    ys = np.concatenate([positions.y for positions in locator_positions] + [np.zeros(0, dtype=np.int64)])
+    layers = np.concatenate(
+        [positions.layers for positions in locator_positions] + [np.zeros(0, dtype=np.int64)]
+    )
+    names = [name for positions in locator_positions for name in positions.names]
+    first, second, distances = find_close_pairs(xs, ys, min_distance)
+    # Locators of one province in one file are duplicate ids, reported above
+    keep = (file_indices[first] != file_indices[second]) | (
+        province_ids[first] != province_ids[second]
+    )
+    first = first[keep]
+    second = second[keep]
+    distances = distances[keep]
+    # Report every pair once, in the order of the locator files
+    swap = first > second
+    first, second = np.where(swap, second, first), np.where(swap, first, second)
+    order = np.lexsort((second, first))
+
+    def describe(index):
+        locator_file = locator_positions[file_indices[index]].locator_file
+        in_file = f"'{locator_file}'"
+        if layer_names is not None:
+            in_file = f"'{locator_file}' of '{layer_names[layers[index]]}'"
+        return (
+            f"ProvinceID {province_ids[index]} ({names[index]}) in {in_file} "
+            f"at ({xs[index]}, {ys[index]})"
+        )
+
+    for i, j, distance in zip(
+        first[order].tolist(), second[order].tolist(), distances[order].tolist()
+    ):
+        output_file.write(
+            f"Locators {distance:.1f} pixels apart: {describe(i)} and {describe(j)}\n"
+        )
+        if report is not None:
+            report(
+                Finding(
+                    locator_file=locator_positions[file_indices[i]].locator_file,
+                    province_id=int(province_ids[i]),
+                    province_name=names[i],
+                    kind=FINDING_TOO_CLOSE,
+                    x=int(xs[i]),
+                    y=int(ys[i]),
+                    found_province_id=int(province_ids[j]),
+                    layer=int(layers[i]),
+                )
+            )
+    print(
+        f"{duplicate_count} duplicate ids in the locator files, "
+        f"{len(order)} pairs of locators closer than {min_distance} pixels"
+    )
+    return duplicate_count + len(order)
+
+
+# Presence of the provinces of definition.csv in the locator files:
+# province_ids are the sorted ProvinceIDs without the ignored provinces
+# (see should_ignore_province) and ProvinceID 0, and names their names.
+# counts holds the number of id blocks of every province (rows) in every
+# one of the locator_files (columns). orphaned holds the ProvinceIDs of
+# every file that are not in definition.csv at all and their numbers of
+# id blocks
+LocatorCoverage = namedtuple(
+    "LocatorCoverage", ["province_ids", "names", "locator_files", "counts", "orphaned"]
+)
+
+
+# Function to build the coverage of the locator files from definition.csv
+# of the mod (a province table, see read_definition_csv) and the
+# ProvinceIDs of the id blocks of every locator file, as a list of
+# (locator_file, province_ids)
+def locator_coverage(definition, file_province_ids):
+    import numpy as np
+
+    ignored_names = np.array(
+        [should_ignore_province(name) for name in definition.names], dtype=bool
+    )
+    # ProvinceID 0 is the placeholder line of definition.csv
+    kept = ~ignored_names[definition.name_indices] & (definition.ids > 0)
+    province_ids = definition.ids[kept].astype(np.int64)
+    name_indices = definition.name_indices[kept]
+    counts = np.zeros((len(province_ids), len(file_province_ids)), dtype=np.int32)
+    orphaned = []
+    for column, (_, block_ids) in enumerate(file_province_ids):
+        block_ids, block_counts = np.unique(
+            np.asarray(block_ids, dtype=np.int64), return_counts=True
+        )
+        rows = np.minimum(np.searchsorted(province_ids, block_ids), max(len(province_ids) - 1, 0))
+        found = np.zeros(len(block_ids), dtype=bool)
+        if len(province_ids):
+            found = province_ids[rows] == block_ids
+        counts[rows[found], column] = block_counts[found]
+        # Blocks of ignored provinces are neither covered nor orphaned
+        unknown = ~found & ~np.isin(block_ids, definition.ids)
+        orphaned.append((block_ids[unknown], block_counts[unknown]))
+    return LocatorCoverage(
+        province_ids,
+        [definition.names[name_index] for name_index in name_indices.tolist()],
+        [locator_file for locator_file, _ in file_province_ids],
+        counts,
+        orphaned,
+    )
+
+
+# Function to report the provinces of definition.csv without an id block
+# in a locator file, the ProvinceIDs of the locator files that are not in
+# definition.csv and the provinces with more than one id block in a file,
+# for every locator file of a LocatorCoverage. Findings are written to
+# output_file and passed to report, as in check_locator_blocks. Returns
+# the number of findings
+def report_coverage_findings(coverage, output_file, report=None):
+    import numpy as np
+
+    finding_count = 0
+    for column, locator_file in enumerate(coverage.locator_files):
+        counts = coverage.counts[:, column]
+        missing = np.flatnonzero(counts == 0)
+        duplicated = np.flatnonzero(counts > 1)
+        orphaned_ids, orphaned_counts = coverage.orphaned[column]
+        for row in missing.tolist():
+            province_id = int(coverage.province_ids[row])
+            output_file.write(
+                f"ProvinceID {province_id} ({coverage.names[row]}) has no id block in "
+                f"'{locator_file}'\n"
+            )
+            if report is not None:
+                report(
+                    Finding(
+                        locator_file=locator_file,
+                        province_id=province_id,
+                        province_name=coverage.names[row],
+                        kind=FINDING_NO_LOCATOR,
+                    )
+                )
+        for row in duplicated.tolist():
+            province_id = int(coverage.province_ids[row])
+            output_file.write(
+                f"ProvinceID {province_id} has {counts[row]} id blocks in '{locator_file}'\n"
+            )
+            if report is not None:
+                report(
+                    Finding(
+                        locator_file=locator_file,
+                        province_id=province_id,
+                        province_name=coverage.names[row],
+                        kind=FINDING_DUPLICATE_ID,
+                    )
+                )
+        for province_id, block_count in zip(orphaned_ids.tolist(), orphaned_counts.tolist()):
+            output_file.write(
+                f"ProvinceID {province_id} has {block_count} id blocks in '{locator_file}' "
+                "but is not in definition.csv\n"
+            )
+            if report is not None:
+                report(
+                    Finding(
+                        locator_file=locator_file,
+                        province_id=province_id,
+                        kind=FINDING_NOT_IN_DEFINITION,
+                    )
+                )
+        print(
+            f"'{locator_file}': {len(counts) - len(missing)} of {len(counts)} provinces covered, "
+            f"{len(missing)} missing, {len(orphaned_ids)} not in definition.csv, "
+            f"{len(duplicated)} duplicated"
+        )
+        finding_count += len(missing) + len(duplicated) + len(orphaned_ids)
+    return finding_count
+
+
+# Function to write the coverage of the locator files to the output
+# folder: the number of id blocks of every province in every locator file
+def write_coverage_csv(coverage, output_dir):
+    output_path = os.path.join(output_dir, LOCATOR_COVERAGE_FILE)
+    with open(
+        output_path, "w", newline="", encoding="utf-8", buffering=REPORT_BUFFER_SIZE
+    ) as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=";")
+        csv_writer.writerow(["ProvinceID", "ProvinceName"] + coverage.locator_files)
+        csv_writer.writerows(
+            [province_id, name] + row
+            for province_id, name, row in zip(
+                coverage.province_ids.tolist(), coverage.names, coverage.counts.tolist()
+            )
+        )
+    print(f"Locator coverage written to '{output_path}'")
+
+
+# Function to check the id blocks of the given locator files against the
+# image. locator_entries is a list of (locator_filename, id_blocks); every
+# block is checked with the mapdata of its layer out of mapdata_layers,
+# which are in load order. The findings are written to output_file.
+# Returns the indexes of the id blocks to remove for every locator file,
+# the number of findings and the number of mismatches: the findings
+# other than locators near a border. With a color_index, mismatches name the province the locator is actually in.
+# With relocate (see make_locator_relocator), mismatched and out of
+# bounds locators are moved instead of removed where possible; the new
+# (x, y) coordinates are returned for every locator file, keyed by id
+# block index. Every finding is also passed to report as a Finding, if
+# given (see open_findings_report). With layer_names, the names of the
+# layers, findings in output.txt name the layer their block comes from.
+# With changed_province_ids, the blocks of the base game are only
+# checked for these ProvinceIDs (ints). With a margin, matching locators
+# with a foreign color within margin pixels are reported as well, but
+# kept. The pixels are read from modded_map, a MapSource
+def check_locator_blocks(
+    modded_map,
+    mapdata_layers,
+    locator_entries,
+    output_file,
+    color_index=None,
+    relocate=None,
+    report=None,
+    layer_names=None,
+    changed_province_ids=None,
+    margin=None,
+):
+    # Join the id blocks of every locator file with their mapdata first,
+    # so all pixels can be checked in a single batch afterwards
+    import numpy as np
+
+    joins = []
+    skipped_by_file = []
+    pixel_indices_by_file = []
+    coordinates = []
+    expected_rgbs = []
+    pixel_count = 0
+    for locator_filename, id_blocks in locator_entries:
+        # Normalize locator filename
+        locator_key = os.path.basename(locator_filename).strip().lower()
+        join = join_mapdata(mapdata_layers, locator_key, id_blocks)
+        checked = join.rows >= 0
+        skipped = np.zeros(len(id_blocks), dtype=bool)
+        if changed_province_ids is not None:
+            skipped = np.fromiter(
+                (
+                    not block.layer and block.province_id not in changed_province_ids
+                    for block in id_blocks
+                ),
+                dtype=bool,
+                count=len(id_blocks),
+            )
+            checked &= ~skipped
+        pixel_indices = np.full(len(id_blocks), -1, dtype=np.int64)
+        checked_count = int(np.count_nonzero(checked))
+        pixel_indices[checked] = np.arange(pixel_count, pixel_count + checked_count)
+        pixel_count += checked_count
+        coordinates.append(np.stack([join.x[checked], join.y[checked]], axis=1))
+        expected_rgbs.append(join.rgb[checked])
+        joins.append(join)
+        skipped_by_file.append(skipped.tolist())
+        pixel_indices_by_file.append(pixel_indices.tolist())
+    coordinates = np.concatenate(coordinates + [np.zeros((0, 2), dtype=np.int32)])
+    expected_rgbs = np.concatenate(expected_rgbs + [np.zeros((0, 3), dtype=np.uint8)])
+
+    # Check all collected pixels at once
+    status, actual_rgbs = modded_map.read_pixels(coordinates, expected_rgbs)
+    border_classes = None
+    if margin is not None:
+        matched = np.flatnonzero(status == PIXEL_MATCH)
+        border_classes = np.full(len(status), margin + 1, dtype=np.int16)
+        border_classes[matched] = border_distance_classes(
+            modded_map.load_array(), coordinates[matched], expected_rgbs[matched], margin
+        )
+        class_counts = np.bincount(border_classes[matched], minlength=margin + 2).tolist()
+        print(
+            "Border distance of matching locators: "
+            + ", ".join(f"{ring} px: {class_counts[ring]}" for ring in range(1, margin + 1))
+            + f", clear: {class_counts[margin + 1]}"
+        )
+        border_classes = border_classes.tolist()
+    status = status.tolist()
+    actual_rgbs = actual_rgbs.tolist()
+
+    removals = []
+    relocations = []
+    finding_count = 0
+    border_count = 0
+    log_files = verbose(VERBOSITY_FILES)
+    log_blocks = verbose(VERBOSITY_BLOCKS)
+    console = []
+    for (locator_filename, id_blocks), join, skipped, pixel_indices in zip(
+        locator_entries, joins, skipped_by_file, pixel_indices_by_file
+    ):
+        rows = join.rows.tolist()
+        join_rgbs = join.rgb.tolist()
+        join_xs = join.x.tolist()
+        join_ys = join.y.tolist()
+        with profile_stage("check_locator_blocks", locator_filename) as record:
+            record["items"] = len(id_blocks)
+            locator_key = os.path.basename(locator_filename).strip().lower()
+            if log_files:
+                console.append(f"Processing locator file '{locator_filename}'")
+                console.append(f"Found {len(id_blocks)} id blocks in '{locator_filename}'")
+
+            # Process each id block
+            blocks_to_remove = []
+            blocks_to_move = {}
+            skipped_count = 0
+            in_file = f"'{locator_key}'"
+            for block_index, (block, pixel_index) in enumerate(zip(id_blocks, pixel_indices)):
+                if skipped[block_index]:
+                    skipped_count += 1
+                    continue
+                province_id = block.province_id
+                is_modded = block.is_modded
+                layer = block.layer
+                row = rows[block_index]
+                if layer_names is not None:
+                    in_file = f"'{locator_key}' of '{layer_names[layer]}'"
+
+                if log_blocks:
+                    if len(console) >= CONSOLE_BATCH_SIZE:
+                        print_lines(console)
+                    console.append(
+                        f"Processing ProvinceID {province_id} in '{locator_key}' (Modded: {is_modded})"
+                    )
+
+                if row == -2:
+                    finding_count += 1
+                    output_file.write(f"Locator key {in_file} not found in mapdata\n")
+                    if report is not None:
+                        report(
+                            Finding(
+                                locator_file=locator_key,
+                                province_id=block.province_id,
+                                kind=FINDING_MISSING_LOCATOR_FILE,
+                                is_modded=is_modded,
+                                layer=layer,
+                            )
+                        )
+                    if log_blocks:
+                        console.append(f"Locator key '{locator_key}' not found in mapdata")
+                    continue
+
+                if row == -1:
+                    output_file.write(
+                        f"ProvinceID {province_id} not found in mapdata for {in_file}\n"
+                    )
+                    if report is not None:
+                        report(
+                            Finding(
+                                locator_file=locator_key,
+                                province_id=block.province_id,
+                                kind=FINDING_MISSING_PROVINCE,
+                                is_modded=is_modded,
+                                layer=layer,
+                                action="removed",
+                            )
+                        )
+                    if log_blocks:
+                        console.append(
+                            f"ProvinceID {province_id} not found in mapdata for '{locator_key}'"
+                        )
+                    blocks_to_remove.append(block_index)
+                    continue
+
+                expected_rgb = tuple(join_rgbs[block_index])
+                x = join_xs[block_index]
+                y = join_ys[block_index]
+                province_name = join.names[block_index]
+
+                # Find a new position for locators that fail the check
+                new_position = None
+                if relocate is not None and status[pixel_index] != PIXEL_MATCH:
+                    new_position = relocate(expected_rgb, x, y)
+                if new_position is None:
+                    moved = ""
+                    action = "removed"
+                else:
+                    moved = f", moved to {new_position}"
+                    action = "moved"
+                    blocks_to_move[block_index] = new_position
+
+                # Check if coordinates are within image bounds
+                if status[pixel_index] == PIXEL_OUT_OF_BOUNDS:
+                    output_file.write(
+                        f"Coordinates out of bounds for ProvinceID {province_id} ({province_name}) in {in_file}{moved}\n"
+                    )
+                    if report is not None:
+                        report(
+                            Finding(
+                                locator_file=locator_key,
+                                province_id=block.province_id,
+                                province_name=province_name,
+                                kind=FINDING_OUT_OF_BOUNDS,
+                                expected_rgb=expected_rgb,
+                                x=x,
+                                y=y,
+                                is_modded=is_modded,
+                                layer=layer,
+                                action=action,
+                                new_position=new_position,
+                            )
+                        )
+                    if log_blocks:
+                        console.append(
+                            f"Coordinates out of bounds for ProvinceID {province_id} ({province_name}) in '{locator_key}'{moved}"
+                        )
+                    if new_position is None:
+                        blocks_to_remove.append(block_index)
+                    continue
+
+                # Compare RGB values
+                actual_rgb = tuple(actual_rgbs[pixel_index])
+                if status[pixel_index] == PIXEL_MISMATCH:
+                    found_in = ""
+                    found_province_id = None
+                    if color_index is not None:
+                        found_in = f", which is {describe_color(color_index, actual_rgb)}"
+                        found_province_id = color_index.province_by_color.get(
+                            int(pack_rgb(actual_rgb))
+                        )
+                    output_file.write(
+                        f"Mismatch in {in_file} for ProvinceID {province_id} ({province_name}): Expected RGB {expected_rgb}, got {actual_rgb}{found_in}{moved}\n"
+                    )
+                    if report is not None:
+                        report(
+                            Finding(
+                                locator_file=locator_key,
+                                province_id=block.province_id,
+                                province_name=province_name,
+                                kind=FINDING_MISMATCH,
+                                expected_rgb=expected_rgb,
+                                actual_rgb=actual_rgb,
+                                x=x,
+                                y=y,
+                                is_modded=is_modded,
+                                layer=layer,
+                                action=action,
+                                new_position=new_position,
+                                found_province_id=found_province_id,
+                            )
+                        )
+                    if log_blocks:
+                        console.append(
+                            f"Mismatch for ProvinceID {province_id} ({province_name}): Expected RGB {expected_rgb}, got {actual_rgb}{moved}"
+                        )
+                    if new_position is None:
+                        blocks_to_remove.append(block_index)
+                elif border_classes is not None and border_classes[pixel_index] <= margin:
+                    border_distance = border_classes[pixel_index]
+                    finding_count += 1
+                    border_count += 1
+                    output_file.write(
+                        f"ProvinceID {province_id} ({province_name}) in {in_file} is {border_distance} pixels from a foreign color at ({x}, {y})\n"
+                    )
+                    if report is not None:
+                        report(
+                            Finding(
+                                locator_file=locator_key,
+                                province_id=block.province_id,
+                                province_name=province_name,
+                                kind=FINDING_NEAR_BORDER,
+                                expected_rgb=expected_rgb,
+                                x=x,
+                                y=y,
+                                is_modded=is_modded,
+                                layer=layer,
+                                border_distance=border_distance,
+                            )
+                        )
+                    if log_blocks:
+                        console.append(
+                            f"ProvinceID {province_id} ({province_name}) matches expected RGB {expected_rgb}, {border_distance} pixels from a foreign color"
+                        )
+                elif log_blocks:
+                    console.append(
+                        f"ProvinceID {province_id} ({province_name}) matches expected RGB {expected_rgb}"
+                    )
+
+            if log_files:
+                if skipped_count:
+                    console.append(
+                        f"Skipped {skipped_count} base game id blocks of unchanged provinces"
+                    )
+                if blocks_to_remove:
+                    console.append(
+                        f"Removing {len(blocks_to_remove)} id blocks from '{locator_filename}'"
+                    )
+                else:
+                    console.append(f"No id blocks to remove from '{locator_filename}'")
+                if blocks_to_move:
+                    console.append(f"Moving {len(blocks_to_move)} id blocks in '{locator_filename}'")
+            print_lines(console)
+        removals.append(blocks_to_remove)
+        relocations.append(blocks_to_move)
+        finding_count += len(blocks_to_remove) + len(blocks_to_move)
+    return removals, relocations, finding_count, finding_count - border_count
+
+
+# 4) Iterate through the updated locator files, assign each ID their
+# R;G;B;X;Y value from the files from step 2), differentiating if the id
+# block is from base or from mod (latter is marked with a #Modded in the
+# updated locator file). Do another RGB check against the
+# provinces_modded.png map in the script directory. If the RGB matches
+# the expectations, do nothing. If there is a mismatch, write it in a
+# new output file and remove the ID block from the locator file, so it
+# can be re-generated by elvain using the map tool
+# When the merged locator files and the mapdata of every layer from
+# steps 2) and 3) are given, they are used directly and the updated
+# locator files are only written here, once, instead of being read back
+# from disk. Files are read from and written to output_dir, the
+# modded map is read from image_path (both default to the script
+# directory). definition holds the rows of the mod's definition.csv, to
+# find the provinces missing from the map and the map colors missing
+# from the definition. Without it, only the provinces of the mapdata are
+# known. With a fix_mode from FIX_MODES, mismatched locators are moved
+# into their province instead of removed. layer_names and
+# changed_province_ids are passed on to check_locator_blocks. With
+# min_distance, the locators kept in the updated files are also checked
+# for duplicate ids and for locators closer than min_distance pixels.
+# margin is passed on to check_locator_blocks. With coverage, the
+# ProvinceIDs kept in every updated file are compared with the
+# definition, see report_coverage_findings, and the coverage is written
+# to locator_coverage.csv. Moved locators get their Y-coordinate
+# inverted with base_image_height, the height of provinces.png of the
+# base game the coordinates were read with (see locator_image_height),
+# or else with the height of the modded map. With strip_rows, the modded
+# map is read in strips of that many rows. Returns a CheckResult
+@profiled("4 final", count_items=None)
+def final(
+    merged_files=None,
+    mapdata_layers=None,
+    output_dir=None,
+    image_path=None,
+    definition=None,
+    fix_mode=None,
+    layer_names=None,
+    changed_province_ids=None,
+    min_distance=None,
+    margin=None,
+    coverage=False,
+    base_image_height=None,
+    strip_rows=None,
+):
+    # Paths (adjust if necessary)
+    script_dir = get_script_dir()
+    output_dir = output_dir or script_dir
+    locator_dir = os.path.join(output_dir, "updated_locators")
+    mapdata_folder = os.path.join(output_dir, "output")
+    image_path = image_path or os.path.join(script_dir, "provinces_modded.png")
+    output_file_path = os.path.join(output_dir, "output.txt")
+
+    # Load the image
+    modded_map = load_modded_image(image_path, strip_rows)
+    scan = scan_map(modded_map)
+    image_height = modded_map.height
+
+    # Load mapdata files: the base game, the mod and any further mods
+    if mapdata_layers is None:
+        mapdata_layers = [
+            parse_mapdata(os.path.join(mapdata_folder, mapdata_file_name(layer_index)))
+            for layer_index in (0, 1)
+        ]
+        while os.path.isfile(os.path.join(mapdata_folder, mapdata_file_name(len(mapdata_layers)))):
+            mapdata_layers.append(
+                parse_mapdata(os.path.join(mapdata_folder, mapdata_file_name(len(mapdata_layers))))
+            )
+
+    if definition is None:
+        color_index = build_province_color_index(
+            scan, definition_colors_from_mapdata(mapdata_layers), complete=False
+        )
+    else:
+        color_index = build_province_color_index(scan, definition_colors(definition))
+
+    # The image may only be read in strips. Moving locators and the margin
+    # check need all of it
+    relocate = None
+    if fix_mode is not None:
+        relocate = make_locator_relocator(modded_map.load_array, color_index, fix_mode)
+    if margin is not None:
+        modded_map.load_array()
+
+    # The updated locator files of an earlier run are changed in place,
+    # as files merged without any mod blocks
+    in_place = merged_files is None
+    if in_place:
+        merged_files = [
+            merge_locator_file(os.path.join(locator_dir, locator_filename), {})
+            for locator_filename in find_locator_files(locator_dir)
+        ]
+
+    locator_entries = []
+    for merged in merged_files:
+        if not merged.blocks:
+            print(f"No id blocks found in '{merged.file_name}'")
+            continue
+        locator_entries.append((merged.file_name, merged.blocks))
+
+    with open(
+        output_file_path, "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE
+    ) as output_file, open_findings_report(output_dir) as report, profile_hot_loop():
+        removals, relocations, finding_count, mismatch_count = check_locator_blocks(
+            modded_map,
+            mapdata_layers,
+            locator_entries,
+            output_file,
+            color_index,
+            relocate,
+            report,
+            layer_names,
+            changed_province_ids,
+            margin,
+        )
+        if coverage and definition is None:
+            print("Locator coverage needs definition.csv of the mod, skipped")
+            coverage = False
+        if min_distance is not None or coverage:
+            locator_positions = [
+                kept_locator_positions(
+                    locator_filename,
+                    id_blocks,
+                    join_mapdata(
+                        mapdata_layers, os.path.basename(locator_filename).strip().lower(), id_blocks
+                    ),
+                    blocks_to_remove,
+                    blocks_to_move,
+                )
+                for (locator_filename, id_blocks), blocks_to_remove, blocks_to_move in zip(
+                    locator_entries, removals, relocations
+                )
+            ]
+        if coverage:
+            kept_province_ids = {
+                positions.locator_file: positions.province_ids for positions in locator_positions
+            }
+            locator_coverage_table = locator_coverage(
+                definition,
+                [
+                    (merged.file_name, kept_province_ids.get(merged.file_name, ()))
+                    for merged in merged_files
+                ],
+            )
+            finding_count += report_coverage_findings(locator_coverage_table, output_file, report)
+            write_coverage_csv(locator_coverage_table, output_dir)
+        if min_distance is not None:
+            finding_count += report_spacing_findings(
+                locator_positions,
+                min_distance,
+                output_file,
+                report,
+                layer_names,
+                report_duplicates=not coverage,
+            )
+        finding_count += report_map_findings(color_index, output_file, report)
+    removals = {
+        locator_filename: blocks_to_remove
+        for (locator_filename, _), blocks_to_remove in zip(locator_entries, removals)
+    }
+    relocations = {
+        locator_filename: blocks_to_move
+        for (locator_filename, _), blocks_to_move in zip(locator_entries, relocations)
+    }
+
+    # Write the merged locator files without the removed blocks. Files
+    # changed in place are only written again if blocks were removed or moved
+    os.makedirs(locator_dir, exist_ok=True)
+    for merged in merged_files:
+        blocks_to_remove = removals.get(merged.file_name, [])
+        blocks_to_move = relocations.get(merged.file_name, {})
+        if in_place and not blocks_to_remove and not blocks_to_move:
+            continue
+        removed_segments = {merged.blocks[i].segment_index for i in blocks_to_remove}
+        move_merged_blocks(merged, blocks_to_move, base_image_height or image_height)
+        write_merged_locator_file(
+            merged, os.path.join(locator_dir, merged.file_name), removed_segments
+        )
+    print(f"Updated locator files written to '{locator_dir}'")
+
+    print("Processing complete. Check 'output.txt' for details.")
+    return CheckResult(mismatch_count, finding_count)
+
+
+# Steps of the checker, numbered as in the README
+STAGES = (1, 2, 3, 4)
+
+# Result of step 4): the number of mismatched locators, i.e. locators
+# that were removed or moved or whose locator file is not in the mapdata,
+# and the number of all findings written to output.txt, including the
+# map, spacing, coverage and border findings
+CheckResult = namedtuple("CheckResult", ["mismatches", "findings"])
+
+
+# Function to run the selected steps, passing the data of every step
+# directly to the next one. new_definition.csv and the mapdata CSVs are
+# only written for reference when write_intermediate_files is on, or when
+# the step using them is not run, which then reads them from output_dir.
+# mod_folders is one mod folder or a list of mod folders in load order.
+# fix_mode is passed on to final. When step 3) runs, or with
+# changed_only, provinces.png of the base game is diffed against the
+# modded map: step 3) also merges the blocks of the repainted provinces,
+# and with changed_only step 4) only checks the base game blocks of
+# provinces that the mods changed or repainted. min_distance, margin and
+# coverage are passed on to final. With strip_rows, the maps are read in
+# strips of that many rows. Returns the CheckResult of step 4), with no
+# findings if it is not run
+@locator_index_scope()
+def run_pipeline(
+    base_game_folder,
+    mod_folders,
+    write_intermediate_files=True,
+    output_dir=None,
+    image_path=None,
+    stages=STAGES,
+    fix_mode=None,
+    changed_only=False,
+    min_distance=None,
+    margin=None,
+    coverage=False,
+    strip_rows=None,
+):
+    definition_diffs = None
+    mapdata_layers = None
+    merged_files = None
+    repainted_province_ids = set()
+    if 1 in stages:
+        definition_diffs = compare_definition(
+            base_game_folder,
+            mod_folders,
+            write_intermediate_files or 3 not in stages,
+            output_dir,
+        )
+    if 2 in stages:
+        mapdata_layers = get_rgb(
+            base_game_folder,
+            mod_folders,
+            write_intermediate_files or 4 not in stages,
+            output_dir,
+            strip_rows,
+        )
+    if mod_folders and (3 in stages or changed_only):
+        repainted = find_repainted_provinces(
+            base_game_folder,
+            mod_folders,
+            image_path or os.path.join(get_script_dir(), "provinces_modded.png"),
+            write_intermediate_files,
+            output_dir,
+            strip_rows,
+        )
+        repainted_province_ids = set(repainted)
+    if 3 in stages:
+        merged_files = locator_files(
+            base_game_folder,
+            mod_folders,
+            definition_diffs,
+            write_output=4 not in stages,
+            output_dir=output_dir,
+            repainted_province_ids=repainted_province_ids,
+        )
+    if 4 in stages:
+        definition = None
+        layer_names = None
+        changed_province_ids = None
+        if mod_folders:
+            layers = load_order_layers(base_game_folder, mod_folders)
+            mod_definition_path = os.path.join(
+                layers[-1].definition_folder, "map_data", "definition.csv"
+            )
+            if os.path.isfile(mod_definition_path):
+                definition = read_definition_csv(mod_definition_path)
+            if len(layers) > 2:
+                layer_names = [layer.name for layer in layers]
+            if changed_only:
+                province_ids_by_layer = read_layer_province_ids(
+                    layers, definition_diffs, output_dir
+                ) or [None]
+                changed_province_ids = set().union(
+                    repainted_province_ids, *province_ids_by_layer[1:]
+                )
+        return final(
+            merged_files,
+            mapdata_layers,
+            output_dir,
+            image_path,
+            definition,
+            fix_mode,
+            layer_names,
+            changed_province_ids,
+            min_distance,
+            margin,
+            coverage,
+            locator_image_height(base_game_folder),
+            strip_rows,
+        )
+    return CheckResult(0, 0)
+
+
+# Steps of a locator checker made by make_locator_checker
+LocatorChecker = namedtuple(
+    "LocatorChecker",
+    ["compare_definitions", "read_mapdata", "find_repainted", "merge_locators", "check", "forget"],
+)
+
+
+# Function to make a locator checker, to run the steps from other Python
+# code instead of the command line. Every step is a function of the
+# checker and returns what the matching step of run_pipeline returns:
+# compare_definitions step 1), read_mapdata step 2), find_repainted the
+# repainted ProvinceIDs (ints), merge_locators step 3) and check step
+# 4), which takes the options of final and returns a CheckResult. The
+# data of every step is loaded on first use and reused by later calls
+# and later steps, until forget drops it, e.g. after files changed.
+# NumPy and Pillow are only imported by the steps that need them, so
+# step 1) alone starts fast. Intermediate files are only written with
+# write_intermediate_files; the updated locator files and the reports
+# are always written by check. With strip_rows, the maps are read in
+# strips of that many rows
+def make_locator_checker(
+    base_game_folder,
+    mod_folders,
+    output_dir=None,
+    image_path=None,
+    write_intermediate_files=False,
+    strip_rows=None,
+):
+    image_path = image_path or os.path.join(get_script_dir(), "provinces_modded.png")
+    resources = {}
+
+    def load_definition():
+        layers = resource("layers")
+        mod_definition_path = os.path.join(
+            layers[-1].definition_folder, "map_data", "definition.csv"
+        )
+        if not os.path.isfile(mod_definition_path):
+            return None
+        return read_definition_csv(mod_definition_path)
+
+    loaders = {
+        "layers": lambda: load_order_layers(base_game_folder, mod_folders),
+        "definition_diffs": lambda: compare_definition(
+            base_game_folder, mod_folders, write_intermediate_files, output_dir
+        ),
+        "mapdata_layers": lambda: get_rgb(
+            base_game_folder, mod_folders, write_intermediate_files, output_dir, strip_rows
+        ),
+        "repainted_province_ids": lambda: set(
+            find_repainted_provinces(
+                base_game_folder,
+                mod_folders,
+                image_path,
+                write_intermediate_files,
+                output_dir,
+                strip_rows,
+            )
+        ),
+        "merged_files": lambda: locator_files(
+            base_game_folder,
+            mod_folders,
+            resource("definition_diffs"),
+            write_output=False,
+            output_dir=output_dir,
+            repainted_province_ids=resource("repainted_province_ids"),
+        ),
+        "definition": load_definition,
+    }
+
+    # Block indexes of the locator files, shared by the steps like the
+    # other data until forget
+    locator_indexes = {}
+
+    def resource(name):
+        if name not in resources:
+            with locator_index_scope(locator_indexes):
+                resources[name] = loaders[name]()
+        return resources[name]
+
+    def forget():
+        resources.clear()
+        locator_indexes.clear()
+
+    def check(fix_mode=None, changed_only=False, min_distance=None, margin=None, coverage=False):
+        layers = resource("layers")
+        layer_names = [layer.name for layer in layers] if len(layers) > 2 else None
+        changed_province_ids = None
+        if changed_only:
+            province_ids_by_layer = read_layer_province_ids(
+                layers, resource("definition_diffs"), output_dir
+            ) or [None]
+            changed_province_ids = set().union(
+                resource("repainted_province_ids"), *province_ids_by_layer[1:]
+            )
+        return final(
+            resource("merged_files"),
+            resource("mapdata_layers"),
+            output_dir,
+            image_path,
+            resource("definition"),
+            fix_mode,
+            layer_names,
+            changed_province_ids,
+            min_distance,
+            margin,
+            coverage,
+            locator_image_height(base_game_folder),
+            strip_rows,
+        )
+
+    return LocatorChecker(
+        compare_definitions=lambda: resource("definition_diffs"),
+        read_mapdata=lambda: resource("mapdata_layers"),
+        find_repainted=lambda: resource("repainted_province_ids"),
+        merge_locators=lambda: resource("merged_files"),
+        check=check,
+        forget=forget,
+    )
+
+
+# Data shared with the locator file workers, set up by init_locator_worker
+worker_context = {}
+
+
+# Function to set up a worker process: memory-maps the modded province
+# map from the map cache, or else attaches to the shared memory holding
+# it, so every worker reads the same copy
+def init_locator_worker(context, image_memory_name, image_shape):
+    import numpy as np
+
+    worker_context.update(context)
+    # Forked workers inherit the profile of the main process
+    del profile_stack[:]
+    del profile_records[:]
+    profile_settings.update(context["profile_settings"])
+    profile_settings["cprofile_path"] = None
+    console_settings.update(context["console_settings"])
+    if profile_settings["trace_memory"]:
+        tracemalloc.start()
+    if context["image_cache_path"] is not None:
+        worker_context["image_array"] = np.load(context["image_cache_path"], mmap_mode="r")
+        return
+    from multiprocessing import shared_memory
+
+    image_memory = shared_memory.SharedMemory(name=image_memory_name)
+    worker_context["image_memory"] = image_memory
+    worker_context["image_array"] = np.ndarray(
+        image_shape, dtype=np.uint8, buffer=image_memory.buf
+    )
+
+
+# Result of one locator file processed by a worker: the coordinates read
+# from the locator file of every layer (None where it has none), the
+# lines for output.txt, the findings for the structured report, the
+# console output, the profile records of the worker, for the spacing
+# and coverage checks the LocatorPositions of the updated file (None
+# without them) and the number of mismatches (see CheckResult)
+LocatorFileResult = namedtuple(
+    "LocatorFileResult",
+    [
+        "locator_file",
+        "province_info_by_layer",
+        "report",
+        "findings",
+        "console",
+        "profile",
+        "positions",
+        "mismatches",
+    ],
+)
+
+
+# Function to run steps 2) to 4) for a single locator file in a worker
+@locator_index_scope()
+def process_locator_file(locator_file):
+    context = worker_context
+    layer_file_paths = [
+        os.path.join(locator_dir, locator_file) for locator_dir in context["layer_locator_dirs"]
+    ]
+    base_file_path = layer_file_paths[0]
+    report = io.StringIO()
+    findings = []
+    console = io.StringIO()
+    province_info_by_layer = [None] * len(layer_file_paths)
+    positions = None
+    mismatches = 0
+    del profile_records[:]
+
+    with contextlib.redirect_stdout(console), profile_stage("process_locator_file", locator_file):
+        for layer_index, locator_path in enumerate(layer_file_paths):
+            if os.path.exists(locator_path):
+                province_info_by_layer[layer_index] = read_locator_file(
+                    locator_path, context["image_height"]
+                )
+
+        if province_info_by_layer[0] is None:
+            print(f"Base locator file not found: {base_file_path}")
+        else:
+            mod_id_blocks, mod_layers = extract_layer_id_blocks(
+                layer_file_paths,
+                context["province_ids_by_layer"],
+                context["repainted_province_ids"],
+            )
+            merged = merge_locator_file(base_file_path, mod_id_blocks, mod_layers)
+
+            removed_segments = set()
+            relocate = None
+            if context["fix_mode"] is not None:
+                relocate = make_locator_relocator(
+                    lambda: context["image_array"], context["color_index"], context["fix_mode"]
+                )
+            if merged.blocks:
+                mapdata_layers = [
+                    build_mapdata(province_data, {locator_file: province_info or {}})
+                    for province_data, province_info in zip(
+                        context["province_data_by_layer"], province_info_by_layer
+                    )
+                ]
+                removals, relocations, _, mismatches = check_locator_blocks(
+                    map_source_from_array(context["image_array"]),
+                    mapdata_layers,
+                    [(locator_file, merged.blocks)],
+                    report,
+                    color_index=context["color_index"],
+                    relocate=relocate,
+                    report=findings.append,
+                    layer_names=context["layer_names"],
+                    changed_province_ids=context["changed_province_ids"],
+                    margin=context["margin"],
+                )
+                blocks_to_remove = removals[0]
+                if context["min_distance"] is not None or context["coverage"]:
+                    positions = kept_locator_positions(
+                        locator_file,
+                        merged.blocks,
+                        join_mapdata(mapdata_layers, locator_file.strip().lower(), merged.blocks),
+                        blocks_to_remove,
+                        relocations[0],
+                    )
+                removed_segments = {merged.blocks[i].segment_index for i in blocks_to_remove}
+                move_merged_blocks(merged, relocations[0], context["image_height"])
+            else:
+                print(f"No id blocks found in '{locator_file}'")
+            write_merged_locator_file(
+                merged, os.path.join(context["locator_dir"], locator_file), removed_segments
+            )
+
+    return LocatorFileResult(
+        locator_file,
+        province_info_by_layer,
+        report.getvalue(),
+        findings,
+        console.getvalue(),
+        list(profile_records),
+        positions,
+        mismatches,
+    )
+
+
+# Function to run the pipeline with every locator file processed in its
+# own worker process. The results are collected in the order of the
+# locator files, so output.txt is the same as with run_pipeline. The
+# spacing checks with min_distance and the coverage span all locator
+# files, so they run once all workers are done. Returns a CheckResult
+def run_pipeline_parallel(
+    base_game_folder,
+    mod_folders,
+    jobs,
+    write_intermediate_files=True,
+    output_dir=None,
+    image_path=None,
+    fix_mode=None,
+    changed_only=False,
+    min_distance=None,
+    margin=None,
+    coverage=False,
+):
+    import multiprocessing
+    import numpy as np
+
+    layers = load_order_layers(base_game_folder, mod_folders)
+    script_dir = get_script_dir()
+    image_path = image_path or os.path.join(script_dir, "provinces_modded.png")
+    definition_diffs = compare_definition(
+        base_game_folder, mod_folders, write_intermediate_files, output_dir
+    )
+    repainted = find_repainted_provinces(
+        base_game_folder, mod_folders, image_path, write_intermediate_files, output_dir
+    )
+    repainted_province_ids = frozenset(repainted)
+    changed_province_ids = set(repainted_province_ids)
+    province_ids_by_layer = [None]
+    for layer, definition_diff in zip(layers[1:], definition_diffs):
+        province_ids = definition_diff.province_ids
+        changed_province_ids |= province_ids
+        province_ids_by_layer.append(province_ids)
+        print(
+            f"Total province IDs to process from '{layer.name}': "
+            f"{len(province_ids | repainted_province_ids)}"
+        )
+
+    province_data_by_layer = read_layer_definitions(layers)
+    locator_files = discover_locator_files(layers)
+    image_height = locator_image_height(base_game_folder)
+
+    output_dir = output_dir or script_dir
+    locator_dir = os.path.join(output_dir, "updated_locators")
+    output_file_path = os.path.join(output_dir, "output.txt")
+    os.makedirs(locator_dir, exist_ok=True)
+
+    # Load the image. The workers memory-map it from the map cache, or
+    # else read it from shared memory
+    image_array = load_modded_image(image_path).load_array()
+    color_index = build_province_color_index(
+        scan_province_map(image_array), definition_colors(province_data_by_layer[-1])
+    )
+    image_cache_path = image_array.filename if isinstance(image_array, np.memmap) else None
+    image_memory = None
+    image_memory_name = None
+    if image_cache_path is None:
+        from multiprocessing import shared_memory
+
+        image_memory = shared_memory.SharedMemory(create=True, size=image_array.nbytes)
+        shared_image = np.ndarray(image_array.shape, dtype=np.uint8, buffer=image_memory.buf)
+        shared_image[:] = image_array
+        image_memory_name = image_memory.name
+        del shared_image
+    image_shape = image_array.shape
+    del image_array
+    try:
+        context = {
+            "layer_locator_dirs": [locator_folder(layer.folder) for layer in layers],
+            "locator_dir": locator_dir,
+            "image_height": image_height,
+            "province_ids_by_layer": province_ids_by_layer,
+            "repainted_province_ids": repainted_province_ids,
+            "province_data_by_layer": province_data_by_layer,
+            "layer_names": [layer.name for layer in layers] if len(layers) > 2 else None,
+            "changed_province_ids": changed_province_ids if changed_only else None,
+            "color_index": color_index,
+            "fix_mode": fix_mode,
+            "min_distance": min_distance,
+            "margin": margin,
+            "coverage": coverage,
+            "image_cache_path": image_cache_path,
+            "profile_settings": profile_settings,
+            "console_settings": console_settings,
+        }
+        processes = max(1, min(jobs, len(locator_files)))
+        print(f"Processing {len(locator_files)} locator files with {processes} workers")
+        with profile_stage("2-4 locator file workers") as record, multiprocessing.Pool(
+            processes,
+            initializer=init_locator_worker,
+            initargs=(context, image_memory_name, image_shape),
+        ) as pool:
+            results = pool.map(process_locator_file, locator_files)
+            record["items"] = len(results)
+    finally:
+        if image_memory is not None:
+            image_memory.close()
+            image_memory.unlink()
+
+    finding_count = 0
+    mismatch_count = 0
+    with open(
+        output_file_path, "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE
+    ) as output_file, open_findings_report(output_dir) as report:
+        for result in results:
+            print(result.console, end="")
+            output_file.write(result.report)
+            for finding in result.findings:
+                report(finding)
+            for worker_record in result.profile:
+                worker_record["depth"] += 1
+                profile_records.append(worker_record)
+            finding_count += result.report.count("\n")
+            mismatch_count += result.mismatches
+        if coverage:
+            locator_coverage_table = locator_coverage(
+                province_data_by_layer[-1],
+                [
+                    (
+                        result.locator_file,
+                        () if result.positions is None else result.positions.province_ids,
+                    )
+                    for result in results
+                    if result.province_info_by_layer[0] is not None
+                ],
+            )
+            finding_count += report_coverage_findings(locator_coverage_table, output_file, report)
+            write_coverage_csv(locator_coverage_table, output_dir)
+        if min_distance is not None:
+            finding_count += report_spacing_findings(
+                [result.positions for result in results if result.positions is not None],
+                min_distance,
+                output_file,
+                report,
+                context["layer_names"],
+                report_duplicates=not coverage,
+            )
+        finding_count += report_map_findings(color_index, output_file, report)
+
+    if write_intermediate_files:
+        province_info_by_layer = [
+            {
+                result.locator_file: result.province_info_by_layer[layer.index]
+                for result in results
+                if result.province_info_by_layer[layer.index] is not None
+            }
+            for layer in layers
+        ]
+        mapdata_layers = sample_layer_maps(
+            layers,
+            open_map_source(os.path.join(base_game_folder, "map_data", "provinces.png")),
+            [
+                build_mapdata(province_data, province_info)
+                for province_data, province_info in zip(
+                    province_data_by_layer, province_info_by_layer
+                )
+            ],
+        )
+        write_mapdata_csvs(mapdata_layers, output_dir)
+    print(f"Updated locator files written to '{locator_dir}'")
+    print("Processing complete. Check 'output.txt' for details.")
+    return CheckResult(mismatch_count, finding_count)
+
+
+# Polling interval of --watch in seconds
+WATCH_INTERVAL = 0.2
+
+
+# Function to get the size and modification time of the given files and
+# of the files in the given folders, keyed by path
+def snapshot_files(paths):
+    snapshot = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for entry in os.scandir(path):
+                if entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        elif os.path.isfile(path):
+            stat = os.stat(path)
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+# Function to get the key of a finding that stays the same between two
+# checks: the id block of a locator finding, or the province or color of
+# a map finding
+def finding_key(finding):
+    if finding.locator_file is None:
+        return (None, finding.province_id, None, finding.actual_rgb)
+    return (finding.locator_file, finding.province_id, finding.layer, None)
+
+
+# Function to keep checking the locators of a load order while the mods
+# and the modded map are edited (--watch). The definitions, the merged
+# id blocks of every locator file and the decoded map stay in memory.
+# The blocks of repainted provinces are merged as in step 3), with the
+# provinces repainted when the definitions were last read. The map_data
+# and gfx/map/map_object_data folders of every mod and the modded map
+# are polled every interval seconds. A changed definition.csv rechecks
+# everything, a changed locator file only that file, and a changed map
+# only the locators on pixels that differ from the map in memory. With
+# coverage, the id blocks of every changed locator file are also
+# compared with the definition, see report_coverage_findings. The
+# findings that appear or disappear are printed, the output files are
+# left as the run before wrote them. Runs until interrupted
+@locator_index_scope()
+def watch_locators(
+    base_game_folder, mod_folders, image_path=None, interval=WATCH_INTERVAL, coverage=False
+):
+    import numpy as np
+
+    layers = load_order_layers(base_game_folder, mod_folders)
+    image_path = os.path.abspath(
+        image_path or os.path.join(get_script_dir(), "provinces_modded.png")
+    )
+    layer_names = [layer.name for layer in layers] if len(layers) > 2 else None
+    locator_files = discover_locator_files(layers)
+    image_height = locator_image_height(base_game_folder)
+    # province_ids_by_layer, repainted_province_ids, province_data_by_layer,
+    # image_array, scan, color_index, and for every locator file its merged
+    # id blocks, mapdata of every layer and (x, y) of every block, -1 where
+    # unknown
+    state = {"locator_files": {}}
+    findings = {}  # line of output.txt of every finding, see finding_key
+
+    def load_definitions():
+        definition_diffs = compare_definition(base_game_folder, mod_folders, write_output=False)
+        state["province_ids_by_layer"] = [None] + [
+            definition_diff.province_ids for definition_diff in definition_diffs
+        ]
+        state["repainted_province_ids"] = frozenset(
+            find_repainted_provinces(base_game_folder, mod_folders, image_path, write_output=False)
+        )
+        state["province_data_by_layer"] = read_layer_definitions(layers)
+
+    def load_locator_file(locator_file):
+        layer_file_paths = [
+            os.path.join(locator_folder(layer.folder), locator_file) for layer in layers
+        ]
+        if not os.path.isfile(layer_file_paths[0]):
+            state["locator_files"].pop(locator_file, None)
+            return
+        mod_id_blocks, mod_layers = extract_layer_id_blocks(
+            layer_file_paths, state["province_ids_by_layer"], state["repainted_province_ids"]
+        )
+        merged = merge_locator_file(layer_file_paths[0], mod_id_blocks, mod_layers)
+        mapdata_layers = []
+        for province_data, locator_path in zip(state["province_data_by_layer"], layer_file_paths):
+            province_info = {}
+            if os.path.isfile(locator_path):
+                province_info = read_locator_file(locator_path, image_height)
+            mapdata_layers.append(build_mapdata(province_data, {locator_file: province_info}))
+        join = join_mapdata(mapdata_layers, locator_file.lower(), merged.blocks)
+        positions = np.stack([join.x, join.y], axis=1).astype(np.int64)
+        positions[join.rows < 0] = -1
+        state["locator_files"][locator_file] = (merged.blocks, mapdata_layers, positions)
+
+    def load_map(image_array):
+        state["image_array"] = image_array
+        state["scan"] = scan_province_map(image_array)
+
+    def index_colors():
+        state["color_index"] = build_province_color_index(
+            state["scan"], definition_colors(state["province_data_by_layer"][-1])
+        )
+
+    # Functions to check some id blocks of a locator file or the map
+    # itself, returning the new findings
+    def check_blocks(locator_file, blocks):
+        mapdata_layers = state["locator_files"][locator_file][1]
+        output = io.StringIO()
+        reported = []
+        check_locator_blocks(
+            map_source_from_array(state["image_array"]),
+            mapdata_layers,
+            [(locator_file, blocks)],
+            output,
+            color_index=state["color_index"],
+            report=reported.append,
+            layer_names=layer_names,
+        )
+        return dict(zip(map(finding_key, reported), output.getvalue().splitlines()))
+
+    # Function to compare the merged id blocks of some locator files with
+    # the definition of the mod
+    def check_coverage(locator_files_to_check):
+        if not coverage:
+            return {}
+        output = io.StringIO()
+        reported = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            report_coverage_findings(
+                locator_coverage(
+                    state["province_data_by_layer"][-1],
+                    [
+                        (locator_file.lower(), [block.province_id for block in blocks])
+                        for locator_file, (blocks, _, _) in state["locator_files"].items()
+                        if locator_file in locator_files_to_check
+                    ],
+                ),
+                output,
+                reported.append,
+            )
+        return dict(zip(map(finding_key, reported), output.getvalue().splitlines()))
+
+    def check_map():
+        output = io.StringIO()
+        reported = []
+        report_map_findings(state["color_index"], output, reported.append)
+        return dict(zip(map(finding_key, reported), output.getvalue().splitlines()))
+
+    def check_all():
+        new_findings = {}
+        for locator_file, (blocks, _, _) in state["locator_files"].items():
+            new_findings.update(check_blocks(locator_file, blocks))
+        new_findings.update(check_coverage(list(state["locator_files"])))
+        new_findings.update(check_map())
+        return [(lambda key: True, new_findings)]
+
+    def reload_all():
+        load_definitions()
+        state["locator_files"].clear()
+        for locator_file in locator_files:
+            load_locator_file(locator_file)
+        index_colors()
+        return check_all()
+
+    # Function to recheck after a change of the modded map, returns the
+    # scope and new findings of every check. Only the rows that changed
+    # are compared pixel by pixel and scanned again
+    def reload_map():
+        old_array = state["image_array"]
+        image_array = decode_image(image_path)
+        if image_array.shape != old_array.shape:
+            load_map(image_array)
+            index_colors()
+            return check_all()
+        changed_rows = find_changed_rows(old_array, image_array)
+        if not changed_rows:
+            return []
+        top = changed_rows[0]
+        bottom = changed_rows[-1] + 1
+        changed = np.any(image_array[top:bottom] != old_array[top:bottom], axis=2)
+        state["scan"] = update_province_map_scan(
+            state["scan"], old_array[top:bottom], image_array[top:bottom], top
+        )
+        state["image_array"] = image_array
+        index_colors()
+        columns = np.flatnonzero(changed.any(axis=0))
+        messages.append(
+            f"{int(np.count_nonzero(changed))} pixels changed in "
+            f"({columns[0]}, {top})-({columns[-1]}, {bottom - 1})"
+        )
+        checks = [(lambda key: key[0] is None, check_map())]
+        for locator_file, (blocks, _, positions) in state["locator_files"].items():
+            xs = positions[:, 0]
+            ys = positions[:, 1]
+            in_band = (xs >= 0) & (xs < image_array.shape[1]) & (ys >= top) & (ys < bottom)
+            block_indices = np.flatnonzero(in_band)
+            block_indices = block_indices[changed[ys[block_indices] - top, xs[block_indices]]]
+            if len(block_indices) == 0:
+                continue
+            changed_blocks = [blocks[i] for i in block_indices.tolist()]
+            locator_key = locator_file.lower()
+            scope = {
+                (locator_key, block.province_id, block.layer, None) for block in changed_blocks
+            }
+            checks.append((scope.__contains__, check_blocks(locator_file, changed_blocks)))
+        return checks
+
+    # Function to recheck after a change of a locator file
+    def reload_locator_file(locator_file):
+        load_locator_file(locator_file)
+        locator_key = locator_file.lower()
+        new_findings = {}
+        if locator_file in state["locator_files"]:
+            new_findings = check_blocks(locator_file, state["locator_files"][locator_file][0])
+            new_findings.update(check_coverage([locator_file]))
+        return [(lambda key: key[0] == locator_key, new_findings)]
+
+    # Function to apply new findings to the findings in scope, returns
+    # the lines of the findings that appeared and disappeared
+    def apply(scope, new_findings):
+        gone = [line for key, line in findings.items() if scope(key) and key not in new_findings]
+        for key in [key for key in findings if scope(key) and key not in new_findings]:
+            del findings[key]
+        appeared = [line for key, line in new_findings.items() if findings.get(key) != line]
+        findings.update(new_findings)
+        return appeared, gone
+
+    watched_paths = [image_path]
+    for layer in layers[1:]:
+        watched_paths.append(os.path.join(layer.folder, "map_data"))
+        watched_paths.append(locator_folder(layer.folder))
+    locator_paths = {
+        os.path.join(locator_folder(layer.folder), locator_file): locator_file
+        for layer in layers[1:]
+        for locator_file in locator_files
+    }
+    messages = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_map(load_image_array(image_path))
+        for scope, new_findings in reload_all():
+            apply(scope, new_findings)
+    snapshot = snapshot_files(watched_paths)
+    pending_paths = set()
+    print(
+        f"\nWatching {len(watched_paths)} paths for changes with {len(findings)} findings, "
+        "press Ctrl+C to stop"
+    )
+
+    try:
+        while True:
+            time.sleep(interval)
+            new_snapshot = snapshot_files(watched_paths)
+            changed_paths = {
+                path
+                for path in set(snapshot) | set(new_snapshot)
+                if snapshot.get(path) != new_snapshot.get(path)
+            }
+            snapshot = new_snapshot
+            if changed_paths:
+                # Wait for the files to stop changing, as they may be
+                # written in several steps
+                pending_paths |= changed_paths
+                continue
+            if not pending_paths:
+                continue
+            changed_paths = pending_paths
+            pending_paths = set()
+            start = time.perf_counter()
+            checks = []
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if image_path in changed_paths:
+                        checks += reload_map()
+                    if any(os.path.basename(path) == "definition.csv" for path in changed_paths):
+                        checks = reload_all()
+                    else:
+                        for locator_file in sorted(
+                            {locator_paths[path] for path in changed_paths if path in locator_paths}
+                        ):
+                            checks += reload_locator_file(locator_file)
+            except Exception as e:
+                print(f"Error while rechecking, waiting for the next change: {e}")
+                continue
+            finally:
+                del profile_records[:]
+            if not checks:
+                continue
+
+            appeared = []
+            gone = []
+            for scope, new_findings in checks:
+                check_appeared, check_gone = apply(scope, new_findings)
+                appeared += check_appeared
+                gone += check_gone
+            changed_names = ", ".join(sorted(os.path.basename(path) for path in changed_paths))
+            print(f"\n{time.strftime('%H:%M:%S')} {changed_names} changed")
+            print_lines(messages)
+            print_lines([f"Fixed: {line}" for line in gone])
+            print_lines([f"New: {line}" for line in appeared])
+            print(
+                f"{len(findings)} findings ({len(appeared)} new, {len(gone)} fixed), "
+                f"rechecked in {time.perf_counter() - start:.2f}s"
+            )
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+# Exit codes of the command line
+EXIT_CLEAN = 0
+EXIT_MISMATCHES = 1
+EXIT_ERROR = 2
+EXIT_FINDINGS = 3
+
+
+# Function to check that a folder exists and, if needs_definition is on,
+# has a map_data/definition.csv. Returns an error message or None
+def check_folder_path(path, needs_definition=True):
+    if not os.path.isdir(path):
+        return f"Error: Invalid directory '{path}'."
+    if not needs_definition:
+        return None
+    definition_path = os.path.join(path, "map_data", "definition.csv")
+    if not os.path.isfile(definition_path):
+        return f"Error: 'definition.csv' not found in {os.path.join(path, 'map_data')}"
+    return None
+
+
+def parse_stages(value):
+    import argparse
+
+    try:
+        stages = {int(stage) for stage in value.split(",") if stage.strip()}
+    except ValueError:
+        stages = set()
+    if not stages or not stages <= set(STAGES):
+        raise argparse.ArgumentTypeError(
+            f"expected comma separated steps out of {','.join(map(str, STAGES))}, got '{value}'"
+        )
+    return stages
+
+
+def parse_positive_int(value):
+    import argparse
+
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got '{value}'")
+    return int(value)
+
+
+def parse_arguments(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compares your modded locators against reference expectation "
+        "on the modded province map. Without folders, asks for them interactively.",
+        epilog="Exit codes: 0 no findings, 1 mismatched locators found, 2 error, "
+        "3 only other findings (map, spacing, coverage or border findings).",
+    )
+    parser.add_argument(
+        "base_folder",
+        nargs="?",
+        help=r"reference folder, e.g. G:\Steam\steamapps\common\Crusader Kings III\game",
+    )
+    parser.add_argument(
+        "mod_folders",
+        nargs="*",
+        metavar="mod_folder",
+        help="mod folder. Several mod folders are checked as one load order, every mod "
+        "overriding the ones before it; mods after the first may leave out definition.csv",
+    )
+    parser.add_argument(
+        "--modded-map",
+        help="modded province map (default: provinces_modded.png in the script directory)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="folder for output.txt, updated_locators and the other output files "
+        "(default: the script directory)",
+    )
+    parser.add_argument(
+        "--stages",
+        type=parse_stages,
+        default=set(STAGES),
+        help="comma separated steps to run, e.g. 3,4 (default: 1,2,3,4). Steps "
+        "that are not run are replaced by the files of an earlier run",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=parse_positive_int,
+        default=1,
+        help="number of worker processes for the locator files (default: 1)",
+    )
+    parser.add_argument(
+        "--fix",
+        choices=FIX_MODES,
+        help="move mismatched locators into their province instead of removing them: "
+        "to the nearest point well inside the province, or to its center",
+    )
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="only check the base game locators of provinces the mods changed in "
+        "definition.csv or repainted on the modded map, besides all mod locators",
+    )
+    parser.add_argument(
+        "--min-distance",
+        type=parse_positive_int,
+        metavar="PIXELS",
+        help="also report duplicate ids within a locator file and locators closer "
+        "than PIXELS to each other, across all locator files",
+    )
+    parser.add_argument(
+        "--margin",
+        type=parse_positive_int,
+        metavar="PIXELS",
+        help="also report matching locators with a foreign color within PIXELS "
+        "of them, which break after small repaints",
+    )
+    parser.add_argument(
+        "--coverage",
+        action="store_true",
+        help="also report provinces of definition.csv without an id block in a locator "
+        "file, ids not in definition.csv and duplicate ids, and write locator_coverage.csv",
+    )
+    parser.add_argument(
+        "--strip-rows",
+        type=parse_positive_int,
+        metavar="ROWS",
+        help="read the maps in strips of ROWS rows instead of as a whole, so the map "
+        "buffer grows with ROWS instead of the map size",
+    )
+    parser.add_argument(
+        "--map-cache-size",
+        type=parse_positive_int,
+        default=MAP_CACHE_MAX_MB,
+        metavar="MB",
+        help="size limit of the decoded maps in the map_cache folder of the output "
+        f"directory, least recently used maps are removed first (default: {MAP_CACHE_MAX_MB})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="decode every map instead of reusing the decoded maps of earlier runs",
+    )
+    parser.add_argument(
+        "--verbosity",
+        type=int,
+        choices=(VERBOSITY_STEPS, VERBOSITY_FILES, VERBOSITY_BLOCKS),
+        default=VERBOSITY_BLOCKS,
+        help="console output: 0 only the steps, warnings and the summary, "
+        "1 also every locator file, 2 also every id block (default: 2)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after the run, keep watching the mod folders and the modded map and "
+        "recheck the locators affected by every change until interrupted",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="measure the memory peak of every stage with tracemalloc (slower)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="write a cProfile dump of the locator check loop to PATH",
+    )
+    parser.add_argument(
+        "--no-intermediate-files",
+        action="store_true",
+        help="do not write new_definition.csv and the mapdata CSVs",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    # Step 4) alone only works on the files of an earlier run
+    needs_folders = bool(args.stages - {4}) or args.watch or args.changed_only
+    interactive = needs_folders and args.base_folder is None
+    if interactive and not sys.stdin.isatty():
+        print("Error: No base game and mod folder given.")
+        return EXIT_ERROR
+    if needs_folders and not interactive and not args.mod_folders:
+        print("Error: No mod folder given.")
+        return EXIT_ERROR
+
+    exit_code = EXIT_ERROR
+    try:
+        if interactive:
+            base_game_folder, mod_folder = get_folder_paths()
+            mod_folders = [mod_folder]
+        else:
+            base_game_folder, mod_folders = args.base_folder, args.mod_folders
+            folders = [base_game_folder] + mod_folders if needs_folders else []
+            for index, folder in enumerate(folders):
+                error = check_folder_path(folder, needs_definition=index < 2)
+                if error:
+                    print(error)
+                    return EXIT_ERROR
+        output_dir = args.output_dir or get_script_dir()
+        os.makedirs(output_dir, exist_ok=True)
+        if args.modded_map and not os.path.isfile(args.modded_map):
+            print(f"Error: Modded map '{args.modded_map}' not found.")
+            return EXIT_ERROR
+
+        write_intermediate_files = not args.no_intermediate_files
+        console_settings["verbosity"] = args.verbosity
+        profile_settings["trace_memory"] = args.trace_memory
+        profile_settings["cprofile_path"] = args.cprofile
+        if args.trace_memory:
+            tracemalloc.start()
+        if not args.no_cache:
+            map_cache_settings["folder"] = os.path.join(output_dir, MAP_CACHE_FOLDER)
+            map_cache_settings["max_bytes"] = args.map_cache_size << 20
+        run_start = time.perf_counter()
+        if args.jobs > 1 and args.stages == set(STAGES) and not args.strip_rows:
+            result = run_pipeline_parallel(
+                base_game_folder,
+                mod_folders,
+                args.jobs,
+                write_intermediate_files,
+                output_dir,
+                args.modded_map,
+                args.fix,
+                args.changed_only,
+                args.min_distance,
+                args.margin,
+                args.coverage,
+            )
+        else:
+            if args.jobs > 1 and args.strip_rows:
+                print("--jobs shares whole maps between workers, running in a single process")
+            elif args.jobs > 1:
+                print("--jobs needs all steps, running in a single process")
+            result = run_pipeline(
+                base_game_folder,
+                mod_folders,
+                write_intermediate_files,
+                output_dir,
+                args.modded_map,
+                args.stages,
+                args.fix,
+                args.changed_only,
+                args.min_distance,
+                args.margin,
+                args.coverage,
+                args.strip_rows,
+            )
+        if result.mismatches:
+            exit_code = EXIT_MISMATCHES
+        elif result.findings:
+            exit_code = EXIT_FINDINGS
+        else:
+            exit_code = EXIT_CLEAN
+
+        total_wall_time = time.perf_counter() - run_start
+        print_profile_summary(total_wall_time)
+        write_profile(os.path.join(output_dir, PROFILE_FILE), total_wall_time)
+        if args.watch:
+            watch_locators(
+                base_game_folder, mod_folders, args.modded_map, coverage=args.coverage
+            )
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        if interactive:
+            input("\nPress Enter to exit...")
+    return exit_code
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    # Needed for worker processes of the PyInstaller executable on Windows
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,17 @@
+# PyInstaller build of CK3_locator_checker.exe: pyinstaller CK3_locator_checker.spec
+# NumPy, Pillow, multiprocessing and argparse are only imported inside the
+# functions that use them, so they are listed as hidden imports
+a = Analysis(
+    ["CK3_locator_checker.py"],
+    hiddenimports=["argparse", "multiprocessing", "numpy", "PIL.Image"],
+)
+pyz = PYZ(a.pure)
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name="CK3_locator_checker",
+    console=True,
+)
+coll = COLLECT(exe, a.binaries, a.datas, name="CK3_locator_checker")
@@ -0,0 +1,479 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from CK3_locator_checker import (
+    EXIT_CLEAN,
+    EXIT_FINDINGS,
+    EXIT_MISMATCHES,
+    LOCATOR_FILES,
+    VERBOSITY_STEPS,
+    PIXEL_MATCH,
+    PIXEL_MISMATCH,
+    PIXEL_OUT_OF_BOUNDS,
+    compare_definition,
+    console_settings,
+    final,
+    get_rgb,
+    index_locator_stream,
+    locator_files,
+    read_definition_csv,
+    verify_pixels,
+)
+
+
+# Function to build a random province-like map and a set of locator queries.
+# Roughly a quarter of the expected colors are wrong and a few coordinates
+# fall outside the map, like in a real mod with broken locators
+def make_pixel_queries(width, height, count, seed=0):
+    rng = np.random.default_rng(seed)
+    # Blocky map so that neighbouring pixels share colors like provinces do
+    cells = rng.integers(0, 256, size=(height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8)
+    image_array = np.repeat(np.repeat(cells, 16, axis=0), 16, axis=1)[:height, :width]
+    image_array = np.ascontiguousarray(image_array)
+
+    xs = rng.integers(-8, width + 8, size=count)
+    ys = rng.integers(-8, height + 8, size=count)
+    coordinates = np.stack([xs, ys], axis=1)
+
+    expected_rgb = np.zeros((count, 3), dtype=np.int64)
+    in_bounds = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    expected_rgb[in_bounds] = image_array[ys[in_bounds], xs[in_bounds]]
+    broken = rng.random(count) < 0.25
+    expected_rgb[broken] = (expected_rgb[broken] + 1) % 256
+    return image_array, coordinates, expected_rgb
+
+
+# Reference implementation: the per-pixel getpixel loop final() used before
+# the batch verifier
+def verify_pixels_per_pixel(image, coordinates, expected_rgb):
+    image_width, image_height = image.size
+    status = []
+    for (x, y), expected in zip(coordinates.tolist(), expected_rgb.tolist()):
+        if not (0 <= x < image_width and 0 <= y < image_height):
+            status.append(PIXEL_OUT_OF_BOUNDS)
+            continue
+        actual_rgb = image.getpixel((x, y))
+        if isinstance(actual_rgb, int):
+            actual_rgb = (actual_rgb, actual_rgb, actual_rgb)
+        elif len(actual_rgb) == 4:
+            actual_rgb = actual_rgb[:3]
+        status.append(PIXEL_MATCH if actual_rgb == tuple(expected) else PIXEL_MISMATCH)
+    return status
+
+
+def benchmark_pixel_verification(width=8192, height=4096, count=60000):
+    print(f"Pixel verification: {width}x{height} map, {count} locators")
+    image_array, coordinates, expected_rgb = make_pixel_queries(width, height, count)
+    image = Image.fromarray(image_array)
+
+    start = time.perf_counter()
+    per_pixel_status = verify_pixels_per_pixel(image, coordinates, expected_rgb)
+    per_pixel_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_status, _ = verify_pixels(image_array, coordinates, expected_rgb)
+    batch_time = time.perf_counter() - start
+
+    if batch_status.tolist() != per_pixel_status:
+        print("Error: batch and per-pixel results differ")
+        return False
+
+    print(f"  per-pixel getpixel: {per_pixel_time:.3f}s")
+    print(f"  batch verify_pixels: {batch_time:.3f}s")
+    print(f"  speedup: {per_pixel_time / max(batch_time, 1e-9):.1f}x")
+    return True
+
+
+# Function to write a locator file in CK3's format. blocks are
+# (province_id, x, z) positions
+def write_locator_file(path, blocks):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('game_object_locator={\n\tname="buildings"\n\tinstances={\n')
+        for province_id, x, z in blocks:
+            file.write(
+                f"\t\t{{\n\t\t\tid={province_id}\n"
+                f"\t\t\tposition={{ {x:.6f} 0.000000 {z:.6f} }}\n"
+                "\t\t\trotation={ 0.000000 0.000000 0.000000 1.000000 }\n"
+                "\t\t\tscale={ 1.000000 1.000000 1.000000 }\n\t\t}\n"
+            )
+        file.write("\t}\n}\n")
+
+
+# Reference implementation: the separate passes that used to parse one
+# locator file (line scan, two block regexes and the brace scan of final())
+def parse_locator_file_multi_pass(path):
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith("id="):
+                line.split("=")[1].strip()
+            elif line.startswith("position={"):
+                line.split("{")[1].split("}")[0].strip().split()
+    with open(path, "r", encoding="utf-8") as file:
+        content = file.read()
+    id_block_pattern = re.compile(r"\{\s*id=(\d+)(.*?)\}", re.DOTALL)
+    for _ in range(2):
+        block_count = sum(1 for _ in id_block_pattern.finditer(content))
+    instances_match = re.search(r"instances\s*=\s*{", content)
+    index = instances_match.end()
+    brace_count = 1
+    while index < len(content) and brace_count > 0:
+        if content[index] == "{":
+            brace_count += 1
+        elif content[index] == "}":
+            brace_count -= 1
+        index += 1
+    return block_count
+
+
+def benchmark_locator_parsing(block_count=100000):
+    print(f"Locator parsing: {block_count} id blocks")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "building_locators.txt")
+        write_locator_file(
+            path,
+            ((province_id, province_id % 8192, province_id % 4096) for province_id in range(1, block_count + 1)),
+        )
+
+        start = time.perf_counter()
+        multi_pass_count = parse_locator_file_multi_pass(path)
+        multi_pass_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(path, "rb") as file:
+            index = index_locator_stream(file)
+        index_time = time.perf_counter() - start
+
+    if len(index.province_ids) != multi_pass_count:
+        print("Error: block counts differ")
+        return False
+
+    print(f"  regex and brace-scan passes: {multi_pass_time:.3f}s")
+    print(f"  single-pass index: {index_time:.3f}s")
+    print(f"  speedup: {multi_pass_time / max(index_time, 1e-9):.1f}x")
+    return True
+
+
+# Function to get a distinct color for every province id. Multiplying by
+# an odd number is a permutation of the 24-bit color space, so colors of
+# different ids never collide and look random. offset gives a second set
+# of colors, distinct from the first, for recolored provinces
+def province_colors(province_ids, offset=0):
+    packed = ((np.asarray(province_ids, dtype=np.int64) + offset) * 2654435761) % (1 << 24)
+    return np.stack([packed >> 16, (packed >> 8) & 255, packed & 255], axis=1).astype(np.uint8)
+
+
+def write_definition_file(path, province_ids, colors, names):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("0;0;0;0;x;x;\n")
+        for province_id, (r, g, b) in zip(province_ids, colors.tolist()):
+            file.write(f"{province_id};{r};{g};{b};{names[province_id]};x;\n")
+
+
+def write_locator_files(folder, positions, image_height, cell_size):
+    locator_folder = os.path.join(folder, "gfx", "map", "map_object_data")
+    os.makedirs(locator_folder, exist_ok=True)
+    for file_index, locator_file in enumerate(LOCATOR_FILES):
+        # Every locator file gets its own small offset from the cell center
+        shift = (file_index - 2.5) * cell_size / 16
+        write_locator_file(
+            os.path.join(locator_folder, locator_file),
+            (
+                (province_id, x + shift, image_height - y)
+                for province_id, (x, y) in sorted(positions.items())
+            ),
+        )
+
+
+# Function to generate a synthetic base game and mod folder plus a modded
+# province map. Provinces are cells of a brick-like grid with a locator
+# near their center. Of the provinces, changed_fraction are changed by
+# the mod: half are recolored, a quarter get their locators moved into a
+# neighbouring province and a quarter are partly repainted without any
+# definition change. A few new provinces are carved out of existing ones.
+# Returns the base folder, the mod folder and the modded map path
+def generate_synthetic_map(root, province_count, width=8192, height=4096, changed_fraction=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = max(1, round(math.sqrt(province_count * width / height)))
+    rows = math.ceil(province_count / columns)
+    cell_width = width / columns
+    cell_height = height / rows
+
+    # Province id of every pixel, with every other row shifted by half a cell
+    ys = np.arange(height)
+    xs = np.arange(width)
+    cell_rows = ys * rows // height
+    shift = np.where(cell_rows % 2 == 1, cell_width / 2, 0)
+    cell_columns = (((xs[None, :] + shift[:, None]) // cell_width) % columns).astype(np.int64)
+    id_map = cell_rows[:, None] * columns + cell_columns + 1
+    id_map[id_map > province_count] = 0
+
+    province_ids = np.arange(1, province_count + 1)
+    colors = np.zeros((province_count + 1, 3), dtype=np.uint8)
+    colors[1:] = province_colors(province_ids)
+    names = {}
+    for province_id in province_ids.tolist():
+        if province_id % 50 == 0:
+            names[province_id] = f"river_{province_id}"
+        elif province_id % 97 == 0:
+            names[province_id] = f"impassable_mountains_{province_id}"
+        else:
+            names[province_id] = f"province_{province_id}"
+
+    # Cell centers as locator positions, in image coordinates
+    positions = {}
+    for province_id in province_ids.tolist():
+        row, column = divmod(province_id - 1, columns)
+        x = ((column + 0.5) * cell_width - (cell_width / 2 if row % 2 else 0)) % width
+        y = (row + 0.5) * cell_height
+        positions[province_id] = (x, y)
+
+    base_folder = os.path.join(root, "base")
+    mod_folder = os.path.join(root, "mod")
+    for folder in (base_folder, mod_folder):
+        os.makedirs(os.path.join(folder, "map_data"), exist_ok=True)
+    Image.fromarray(colors[id_map]).save(os.path.join(base_folder, "map_data", "provinces.png"))
+    write_definition_file(
+        os.path.join(base_folder, "map_data", "definition.csv"), province_ids, colors[1:], names
+    )
+    write_locator_files(base_folder, positions, height, min(cell_width, cell_height))
+
+    # Mod variant
+    changed = rng.choice(province_ids, size=int(province_count * changed_fraction), replace=False)
+    recolored = changed[: len(changed) // 2]
+    moved = changed[len(changed) // 2 : len(changed) * 3 // 4]
+    repainted = changed[len(changed) * 3 // 4 :]
+    mod_colors = colors.copy()
+    mod_colors[recolored] = province_colors(recolored, offset=province_count)
+    mod_names = dict(names)
+    mod_positions = dict(positions)
+    for province_id in moved.tolist():
+        mod_names[province_id] += "_moved"
+        x, y = positions[province_id]
+        mod_positions[province_id] = ((x + cell_width) % width, y)
+    mod_id_map = id_map.copy()
+
+    # New provinces take the top half of a few repainted cells, the rest of
+    # the repainted cells lose their bottom quarter to the neighbour below
+    new_count = max(1, len(repainted) // 4)
+    new_ids = np.arange(province_count + 1, province_count + 1 + new_count)
+    for province_id, new_id in zip(repainted[:new_count].tolist(), new_ids.tolist()):
+        x, y = positions[province_id]
+        top = int(y - cell_height / 2)
+        mask = mod_id_map[top : int(y), :] == province_id
+        mod_id_map[top : int(y), :][mask] = new_id
+        mod_positions[new_id] = (x, y - cell_height / 4)
+        mod_names[new_id] = f"new_province_{new_id}"
+    for province_id in repainted[new_count:].tolist():
+        x, y = positions[province_id]
+        bottom = int(y + cell_height / 4)
+        below = min(province_id + columns, province_count)
+        band = mod_id_map[bottom : int(y + cell_height / 2) + 1, :]
+        band[band == province_id] = below
+    all_colors = np.concatenate([mod_colors, province_colors(new_ids, offset=2 * province_count)])
+
+    modded_map_path = os.path.join(root, "provinces_modded.png")
+    Image.fromarray(all_colors[mod_id_map]).save(modded_map_path)
+    shutil.copyfile(modded_map_path, os.path.join(mod_folder, "map_data", "provinces.png"))
+    mod_ids = np.concatenate([province_ids, new_ids])
+    write_definition_file(
+        os.path.join(mod_folder, "map_data", "definition.csv"), mod_ids, all_colors[1:], mod_names
+    )
+    write_locator_files(mod_folder, mod_positions, height, min(cell_width, cell_height))
+    return base_folder, mod_folder, modded_map_path
+
+
+# Function to time every step of the pipeline on synthetic maps of the
+# given sizes. Returns one result per size
+def benchmark_pipeline(sizes, width=8192, height=4096, changed_fraction=0.05):
+    results = []
+    # Time the work, not the console output
+    console_settings["verbosity"] = VERBOSITY_STEPS
+    print(f"Pipeline: {width}x{height} map, {changed_fraction:.0%} changed provinces")
+    print(f"{'Provinces':>10}{'Generate':>10}{'Step 1':>10}{'Step 2':>10}{'Step 3':>10}{'Step 4':>10}{'Total':>10}{'Findings':>10}")
+    for province_count in sizes:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.perf_counter()
+            base_folder, mod_folder, modded_map_path = generate_synthetic_map(
+                temp_dir, province_count, width, height, changed_fraction
+            )
+            generate_time = time.perf_counter() - start
+            output_dir = os.path.join(temp_dir, "output_dir")
+            os.makedirs(output_dir)
+
+            step_times = []
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                definition_diffs = compare_definition(base_folder, mod_folder, True, output_dir)
+                step_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                mapdata_layers = get_rgb(base_folder, mod_folder, True, output_dir)
+                step_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                merged_files = locator_files(
+                    base_folder, mod_folder, definition_diffs, write_output=False, output_dir=output_dir
+                )
+                step_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                finding_count = final(
+                    merged_files,
+                    mapdata_layers,
+                    output_dir=output_dir,
+                    image_path=modded_map_path,
+                    definition=read_definition_csv(
+                        os.path.join(mod_folder, "map_data", "definition.csv")
+                    ),
+                ).findings
+                step_times.append(time.perf_counter() - start)
+
+        total_time = sum(step_times)
+        print(
+            f"{province_count:>10}{generate_time:>9.2f}s"
+            + "".join(f"{step_time:>9.2f}s" for step_time in step_times)
+            + f"{total_time:>9.2f}s{finding_count:>10}"
+        )
+        results.append(
+            {
+                "provinces": province_count,
+                "width": width,
+                "height": height,
+                "changed_fraction": changed_fraction,
+                "generate_time": generate_time,
+                "step_times": step_times,
+                "total_time": total_time,
+                "findings": finding_count,
+            }
+        )
+    return results
+
+
+# Function to time the start of a fresh interpreter running the checker:
+# the import alone, --help and step 1) on a small synthetic map, which
+# should not import NumPy or Pillow. The checker is imported as a module,
+# so its compiled bytecode is used like in the executable, instead of
+# compiling the script on every start. Every command is run runs times
+# and the fastest run is kept. Exit codes of findings count as success
+def benchmark_startup(runs=5):
+    print(f"Startup: fastest of {runs} runs")
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    run_checker = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import CK3_locator_checker; "
+        "sys.exit(CK3_locator_checker.main(sys.argv[2:]))"
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        base_folder, mod_folder, _ = generate_synthetic_map(temp_dir, 1000, 1024, 512)
+        output_dir = os.path.join(temp_dir, "output_dir")
+        commands = {
+            # Python itself, for reference
+            "python": ["-c", "pass"],
+            "import": ["-c", "import sys; sys.path.insert(0, sys.argv[1]); import CK3_locator_checker", script_folder],
+            "--help": ["-c", run_checker, script_folder, "--help"],
+            "step 1": [
+                "-c", run_checker, script_folder, base_folder, mod_folder, "--stages", "1", "--output-dir", output_dir
+            ],
+        }
+        for name, arguments in commands.items():
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                completed = subprocess.run([sys.executable] + arguments, capture_output=True)
+                times.append(time.perf_counter() - start)
+                if completed.returncode not in (EXIT_CLEAN, EXIT_MISMATCHES, EXIT_FINDINGS):
+                    print(f"Error: '{name}' exited with {completed.returncode}")
+                    return False
+            print(f"  {name}: {min(times):.3f}s")
+    return True
+
+
+BENCHMARKS = ["pixels", "parsing", "pipeline", "startup"]
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the CK3 locator checker.")
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        metavar="BENCHMARK",
+        help="benchmarks to run: pixels, parsing, pipeline, startup (default: all)",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=[10000, 30000, 100000],
+        help="comma separated province counts for the pipeline benchmark (default: 10000,30000,100000)",
+    )
+    parser.add_argument("--width", type=int, default=8192, help="map width (default: 8192)")
+    parser.add_argument("--height", type=int, default=4096, help="map height (default: 4096)")
+    parser.add_argument(
+        "--changed",
+        type=float,
+        default=0.05,
+        help="fraction of provinces changed by the mod (default: 0.05)",
+    )
+    parser.add_argument(
+        "--results",
+        metavar="PATH",
+        help="append the pipeline results to this JSON file to track them over time",
+    )
+    parser.add_argument(
+        "--keep",
+        metavar="DIR",
+        help="only generate a synthetic map with the first size into DIR and exit",
+    )
+    args = parser.parse_args()
+
+    if args.keep:
+        base_folder, mod_folder, modded_map_path = generate_synthetic_map(
+            args.keep, args.sizes[0], args.width, args.height, args.changed
+        )
+        print(f"Base folder: {base_folder}")
+        print(f"Mod folder: {mod_folder}")
+        print(f"Modded map: {modded_map_path}")
+        return
+
+    benchmarks = args.benchmarks or BENCHMARKS
+    for benchmark in benchmarks:
+        if benchmark not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{benchmark}', choose from {', '.join(BENCHMARKS)}")
+    ok = True
+    if "pixels" in benchmarks:
+        ok = benchmark_pixel_verification(args.width, args.height) and ok
+    if "parsing" in benchmarks:
+        ok = benchmark_locator_parsing() and ok
+    if "startup" in benchmarks:
+        ok = benchmark_startup() and ok
+    if "pipeline" in benchmarks:
+        results = benchmark_pipeline(args.sizes, args.width, args.height, args.changed)
+        if args.results:
+            history = []
+            if os.path.isfile(args.results):
+                with open(args.results, "r", encoding="utf-8") as file:
+                    history = json.load(file)
+            history.append({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results})
+            with open(args.results, "w", encoding="utf-8") as file:
+                json.dump(history, file, indent=2)
+            print(f"Results appended to '{args.results}'")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import numpy as np
+
+from CK3_locator_checker import (
+    build_province_color_index,
+    definition_colors,
+    describe_color,
+    read_definition_csv,
+    scan_province_map,
+)
+
+
+def write_definition(tmp_path, lines):
+    definition_path = tmp_path / "definition.csv"
+    definition_path.write_text("".join(f"{line}\n" for line in lines))
+    return definition_colors(read_definition_csv(str(definition_path)))
+
+
+def test_placeholder_color_is_defined(tmp_path):
+    definition = write_definition(
+        tmp_path, ["0;0;0;0;x;x;", "1;10;20;30;province_1;x;", "2;40;50;60;province_2;x;"]
+    )
+    image_array = np.zeros((4, 6, 3), dtype=np.uint8)
+    image_array[:, :3] = (10, 20, 30)
+    image_array[:2, 3:] = (40, 50, 60)
+
+    color_index = build_province_color_index(scan_province_map(image_array), definition)
+
+    assert color_index.undefined_colors == []
+    assert color_index.missing_provinces == []
+    assert describe_color(color_index, (0, 0, 0)) == "ProvinceID 0 (x)"
+
+
+def test_placeholder_is_never_missing(tmp_path):
+    definition = write_definition(
+        tmp_path, ["0;0;0;0;x;x;", "1;10;20;30;province_1;x;", "2;40;50;60;province_2;x;"]
+    )
+    image_array = np.full((4, 4, 3), (10, 20, 30), dtype=np.uint8)
+    image_array[0, 0] = (1, 2, 3)
+
+    color_index = build_province_color_index(scan_province_map(image_array), definition)
+
+    assert color_index.missing_provinces == [2]
+    undefined = [int(color_index.scan.colors[row]) for row in color_index.undefined_colors]
+    assert undefined == [(1 << 16) | (2 << 8) | 3]
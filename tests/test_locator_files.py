@@ -0,0 +1,155 @@
+import io
+
+import numpy as np
+
+from CK3_locator_checker import (
+    index_locator_stream,
+    merge_locator_file,
+    read_locator_file,
+    write_merged_locator_file,
+)
+
+
+def locator_block(province_id, x, marker=""):
+    return (
+        f"\t\t{{\n\t\t\tid={province_id}{marker}\n"
+        f"\t\t\tposition={{ {x}.000000 0.000000 1.000000 }}\n\t\t}}"
+    ).encode()
+
+
+def write_locator_file(tmp_path, blocks, name="building_locators.txt"):
+    locator_path = tmp_path / name
+    locator_path.write_bytes(
+        b"game_object_locator={\n\tinstances={\n" + b"\n".join(blocks) + b"\n\t}\n}\n"
+    )
+    return str(locator_path)
+
+
+def test_index_reads_blocks_line_by_line():
+    content = (
+        b'game_object_locator={\n\tname="buildings"\n\tinstances={\n'
+        + locator_block(1, 4)
+        + b"\n"
+        + locator_block(2, 12, " #Modded:2")
+        + b"\n\t}\n}\n"
+    )
+
+    index = index_locator_stream(io.BytesIO(content))
+
+    assert index.province_ids.tolist() == [1, 2]
+    assert index.is_modded.tolist() == [False, True]
+    assert index.layers.tolist() == [0, 2]
+    assert index.positions.tolist() == [4, 0, 1, 12, 0, 1]
+    assert index.position_offsets.tolist() == [0, 3, 6]
+    first_block = content[index.starts[0]:index.ends[0]]
+    assert first_block == locator_block(1, 4).strip()
+
+
+def test_index_reads_blocks_split_across_lines():
+    content = (
+        b"game_object_locator={ instances={ { id=7 position={ 1 2 3 } } # { id=8 }\n"
+        b"\t{ id =\n 9 #Modded\n position={ 4\n5 6 }\n scale={ 2 2 2 } }\n"
+        b"\t{ position={ 0 0 0 } }\n} }\n"
+    )
+
+    index = index_locator_stream(io.BytesIO(content))
+
+    assert index.province_ids.tolist() == [7, 9]
+    assert index.is_modded.tolist() == [False, True]
+    assert index.layers.tolist() == [0, 1]
+    assert index.positions.tolist() == [1, 2, 3, 4, 5, 6]
+    assert index.scale_offsets.tolist() == [0, 0, 3]
+    assert content[index.starts[0]:index.ends[0]] == b"{ id=7 position={ 1 2 3 } }"
+
+
+def test_read_locator_file_inverts_y(tmp_path):
+    locator_path = write_locator_file(tmp_path, [locator_block(1, 4), locator_block(2, 12)])
+
+    assert read_locator_file(locator_path, 10) == {1: (4, 9), 2: (12, 9)}
+
+
+def merge_and_write(tmp_path, base_blocks, mod_id_blocks):
+    base_path = write_locator_file(tmp_path, base_blocks)
+    merged = merge_locator_file(base_path, mod_id_blocks)
+    output_path = tmp_path / "merged.txt"
+    write_merged_locator_file(merged, str(output_path))
+    return merged, output_path.read_bytes()
+
+
+def test_merge_replaces_blocks(tmp_path):
+    merged, content = merge_and_write(
+        tmp_path,
+        [locator_block(1, 1), locator_block(2, 2)],
+        {2: locator_block(2, 20, " #Modded").strip()},
+    )
+
+    assert [(block.province_id, block.is_modded) for block in merged.blocks] == [
+        (1, False),
+        (2, True),
+    ]
+    assert content == (
+        b"game_object_locator={\n\tinstances={\n"
+        + locator_block(1, 1)
+        + b"\n"
+        + locator_block(2, 20, " #Modded")
+        + b"\n\t}\n}\n"
+    )
+
+
+def test_merge_inserts_blocks_in_order(tmp_path):
+    merged, content = merge_and_write(
+        tmp_path,
+        [locator_block(3, 3), locator_block(5, 5)],
+        {
+            1: locator_block(1, 10, " #Modded").strip(),
+            4: locator_block(4, 40, " #Modded").strip(),
+            7: locator_block(7, 70, " #Modded").strip(),
+        },
+    )
+
+    assert [block.province_id for block in merged.blocks] == [1, 3, 4, 5, 7]
+    assert content == (
+        b"game_object_locator={\n\tinstances={\n"
+        + b"\n".join(
+            [
+                locator_block(1, 10, " #Modded"),
+                locator_block(3, 3),
+                locator_block(4, 40, " #Modded"),
+                locator_block(5, 5),
+                locator_block(7, 70, " #Modded"),
+            ]
+        )
+        + b"\n\t}\n}\n"
+    )
+
+
+def test_merge_deletes_blocks(tmp_path):
+    merged, content = merge_and_write(
+        tmp_path,
+        [locator_block(1, 1), locator_block(2, 2), locator_block(3, 3)],
+        {1: None, 3: None},
+    )
+
+    assert [block.province_id for block in merged.blocks] == [2]
+    assert content == (
+        b"game_object_locator={\n\tinstances={\n" + locator_block(2, 2) + b"\n\t}\n}\n"
+    )
+
+
+def test_merge_without_mod_blocks_copies_the_file(tmp_path):
+    base_blocks = [locator_block(1, 1), locator_block(2, 2)]
+    _, content = merge_and_write(tmp_path, base_blocks, {})
+
+    assert content == (tmp_path / "building_locators.txt").read_bytes()
+
+
+def test_merged_blocks_index_like_the_written_file(tmp_path):
+    merged, content = merge_and_write(
+        tmp_path,
+        [locator_block(2, 2), locator_block(4, 4)],
+        {1: locator_block(1, 10, " #Modded").strip(), 4: None},
+    )
+
+    index = index_locator_stream(io.BytesIO(content))
+    assert index.province_ids.tolist() == [block.province_id for block in merged.blocks]
+    assert np.array_equal(index.is_modded, [block.is_modded for block in merged.blocks])
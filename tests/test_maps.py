@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from CK3_locator_checker import (
+    PIXEL_MATCH,
+    PIXEL_MISMATCH,
+    PIXEL_OUT_OF_BOUNDS,
+    border_distance_classes,
+    diff_province_maps,
+    iter_png_strips,
+    map_source_from_array,
+    open_map_source,
+    pack_rgb,
+    scan_map,
+)
+
+
+def random_map(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    image_array = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    # Runs of equal pixels as well as noise, so the encoder picks
+    # different filters for different rows
+    image_array[::3, : shape[1] // 2] = image_array[::3, :1]
+    return image_array
+
+
+def save_png(tmp_path, image_array, name="provinces.png"):
+    image_path = tmp_path / name
+    Image.fromarray(image_array).save(image_path)
+    return str(image_path)
+
+
+def province_map(tmp_path, name, colors, height=12, width=16):
+    image_array = np.zeros((height, width, 3), dtype=np.uint8)
+    for top, color in enumerate(colors):
+        image_array[top * height // len(colors):] = color
+    return save_png(tmp_path, image_array, name), image_array
+
+
+@pytest.mark.parametrize("channels", [3, 4])
+@pytest.mark.parametrize("strip_rows", [1, 7, 64, 500])
+def test_png_strips_match_pillow(tmp_path, channels, strip_rows):
+    # Large enough for several IDAT chunks
+    image_array = random_map((301, 257, channels))
+    image_path = save_png(tmp_path, image_array)
+
+    strips = list(iter_png_strips(image_path, strip_rows))
+
+    assert [top for top, _ in strips] == list(range(0, 301, strip_rows))
+    decoded = np.concatenate([strip for _, strip in strips])
+    assert np.array_equal(decoded, np.asarray(Image.open(image_path).convert("RGB")))
+
+
+def test_png_strips_stop_after_wanted(tmp_path):
+    image_array = random_map((100, 40, 3))
+    image_path = save_png(tmp_path, image_array)
+
+    strips = list(iter_png_strips(image_path, 16, wanted={1, 3}))
+
+    assert [top for top, _ in strips] == [16, 48]
+    assert np.array_equal(strips[1][1], image_array[48:64])
+
+
+@pytest.mark.parametrize("strip_rows", [None, 5])
+def test_map_sources_read_the_same_pixels(tmp_path, strip_rows):
+    image_array = random_map((30, 20, 3))
+    map_source = open_map_source(save_png(tmp_path, image_array), strip_rows)
+    coordinates = np.array([[0, 0], [19, 29], [5, 12], [20, 3], [-1, 4], [7, 30]])
+    expected_rgb = image_array[[0, 29, 12, 3, 4, 0], [0, 19, 5, 0, 0, 0]]
+    expected_rgb[2] ^= 1
+
+    status, actual_rgb = map_source.read_pixels(coordinates, expected_rgb)
+
+    assert status.tolist() == [PIXEL_MATCH, PIXEL_MATCH, PIXEL_MISMATCH] + [PIXEL_OUT_OF_BOUNDS] * 3
+    assert np.array_equal(actual_rgb[2], image_array[12, 5])
+    assert not actual_rgb[3:].any()
+
+
+def test_map_scan_in_strips_matches_whole_map(tmp_path):
+    image_path, image_array = province_map(
+        tmp_path, "provinces.png", [(10, 20, 30), (40, 50, 60), (10, 20, 30), (70, 80, 90)]
+    )
+
+    whole = scan_map(map_source_from_array(image_array))
+    in_strips = scan_map(open_map_source(image_path, 5))
+
+    assert np.array_equal(whole.colors, in_strips.colors)
+    assert np.array_equal(whole.pixel_counts, in_strips.pixel_counts)
+    assert np.array_equal(whole.bboxes, in_strips.bboxes)
+    assert np.allclose(whole.centroids, in_strips.centroids)
+
+
+@pytest.mark.parametrize("strip_rows", [None, 5])
+def test_diff_counts_changed_pixels(tmp_path, strip_rows):
+    base_path, base_array = province_map(tmp_path, "base.png", [(10, 20, 30), (40, 50, 60)])
+    modded_array = base_array.copy()
+    modded_array[2:4, 3:8] = (70, 80, 90)
+    modded_array[9, :4] = (10, 20, 30)
+    modded_path = save_png(tmp_path, modded_array, "modded.png")
+
+    map_diff = diff_province_maps(
+        open_map_source(base_path, strip_rows), open_map_source(modded_path, strip_rows)
+    )
+
+    assert map_diff.changed_pixels == 14
+    assert map_diff.colors.tolist() == pack_rgb([(10, 20, 30), (40, 50, 60), (70, 80, 90)]).tolist()
+    assert map_diff.pixels_lost.tolist() == [10, 4, 0]
+    assert map_diff.pixels_gained.tolist() == [4, 0, 10]
+
+
+def test_diff_of_maps_of_different_sizes(tmp_path):
+    base_array = np.zeros((4, 4, 3), dtype=np.uint8)
+    modded_array = np.zeros((6, 4, 3), dtype=np.uint8)
+
+    map_diff = diff_province_maps(
+        map_source_from_array(base_array), map_source_from_array(modded_array)
+    )
+
+    assert map_diff.pixels_lost.tolist() == [16]
+    assert map_diff.pixels_gained.tolist() == [24]
+
+
+def test_border_distance_classes():
+    image_array = np.zeros((9, 9, 3), dtype=np.uint8)
+    image_array[:, 6:] = (1, 2, 3)
+    coordinates = [[0, 0], [4, 4], [5, 4], [6, 4], [2, 8], [9, 0]]
+    expected_rgb = [(0, 0, 0)] * 6
+
+    classes = border_distance_classes(image_array, coordinates, expected_rgb, 2)
+
+    # The map edge is no border, only the other color is
+    assert classes.tolist() == [3, 2, 1, 0, 3, 0]
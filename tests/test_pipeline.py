@@ -0,0 +1,87 @@
+import os
+import shutil
+
+import pytest
+
+from CK3_locator_checker import (
+    EXIT_CLEAN,
+    EXIT_ERROR,
+    EXIT_FINDINGS,
+    EXIT_MISMATCHES,
+    main,
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# Written by the original single-pass script for the fixture folders
+EXPECTED = os.path.join(FIXTURES, "expected")
+LOCATOR_FILES = ["building_locators.txt", "special_building_locators.txt"]
+
+
+def run_checker(output_dir, fixtures=FIXTURES, *options):
+    return main(
+        [
+            os.path.join(fixtures, "base"),
+            os.path.join(fixtures, "mod"),
+            "--modded-map",
+            os.path.join(fixtures, "provinces_modded.png"),
+            "--output-dir",
+            str(output_dir),
+            "--no-cache",
+            "--verbosity",
+            "0",
+            *options,
+        ]
+    )
+
+
+def read_file(*path_parts):
+    with open(os.path.join(*path_parts), "rb") as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("options", [(), ("--strip-rows", "5"), ("--jobs", "2")])
+def test_output_matches_original_script(tmp_path, options):
+    assert run_checker(tmp_path, FIXTURES, *options) == EXIT_MISMATCHES
+
+    for locator_file in LOCATOR_FILES:
+        assert read_file(tmp_path, "updated_locators", locator_file) == read_file(
+            EXPECTED, "updated_locators", locator_file
+        )
+    assert read_file(tmp_path, "new_definition.csv") == read_file(EXPECTED, "new_definition.csv")
+    # Mismatches now also name the province the locator is in
+    lines = read_file(tmp_path, "output.txt").decode().splitlines()
+    expected_lines = read_file(EXPECTED, "output.txt").decode().splitlines()
+    assert len(lines) == len(expected_lines)
+    for line, expected_line in zip(lines, expected_lines):
+        assert line.startswith(expected_line)
+
+
+@pytest.fixture
+def clean_fixtures(tmp_path):
+    fixtures = tmp_path / "fixtures"
+    shutil.copytree(FIXTURES, fixtures)
+    locator_folder = fixtures / "base" / "gfx" / "map" / "map_object_data"
+    shutil.copyfile(locator_folder / LOCATOR_FILES[1], locator_folder / LOCATOR_FILES[0])
+    return str(fixtures)
+
+
+def test_exit_code_without_findings(tmp_path, clean_fixtures):
+    assert run_checker(tmp_path / "output", clean_fixtures) == EXIT_CLEAN
+
+
+def test_exit_code_with_other_findings_only(tmp_path, clean_fixtures):
+    assert run_checker(tmp_path / "output", clean_fixtures, "--min-distance", "3") == EXIT_FINDINGS
+
+
+def test_exit_code_of_a_missing_map(tmp_path):
+    assert main(
+        [
+            os.path.join(FIXTURES, "base"),
+            os.path.join(FIXTURES, "mod"),
+            "--modded-map",
+            str(tmp_path / "missing.png"),
+            "--output-dir",
+            str(tmp_path),
+            "--no-cache",
+        ]
+    ) == EXIT_ERROR
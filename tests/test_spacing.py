@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from CK3_locator_checker import find_close_pairs
+
+
+def brute_force_pairs(x, y, distance):
+    pairs = set()
+    for first in range(len(x)):
+        for second in range(first + 1, len(x)):
+            if np.hypot(x[first] - x[second], y[first] - y[second]) < distance:
+                pairs.add((first, second))
+    return pairs
+
+
+@pytest.mark.parametrize("distance", [1, 3, 10])
+def test_close_pairs_match_brute_force(distance):
+    rng = np.random.default_rng(distance)
+    x = rng.uniform(-20, 60, size=300)
+    y = rng.uniform(0, 40, size=300)
+    # Points on the same spot and on cell edges
+    x[:4] = [9, 9, 10, 12.9]
+    y[:4] = [30, 30, 30, 30]
+
+    first, second, distances = find_close_pairs(x, y, distance)
+
+    found = {tuple(sorted(pair)) for pair in zip(first.tolist(), second.tolist())}
+    assert len(found) == len(first)
+    assert found == brute_force_pairs(x, y, distance)
+    assert np.allclose(distances, np.hypot(x[first] - x[second], y[first] - y[second]))
+
+
+def test_close_pairs_leave_out_the_distance_itself():
+    first, second, _ = find_close_pairs([0, 3, 0], [0, 0, 2.9], 3)
+
+    assert list(zip(first.tolist(), second.tolist())) == [(0, 2)]
+
+
+@pytest.mark.parametrize("count", [0, 1])
+def test_close_pairs_of_too_few_points(count):
+    first, second, distances = find_close_pairs([5] * count, [5] * count, 3)
+
+    assert len(first) == len(second) == len(distances) == 0